@@ -0,0 +1,52 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# easing_np_test.py
+
+import unittest
+import numpy as np
+from bezier_curve_easing import easing
+from bezier_curve_easing.easing_np import *
+
+
+class EasingNpTest(unittest.TestCase):
+
+    def setUp(self) -> None:
+        self.grid = np.linspace(0.0, 1.0, 10_001)
+        self.methods = dir(Easing())
+        self.scalar = easing.Easing()  # a few of its methods are not static
+
+    def test_matches_scalar_easing(self):
+        """ every method gives what easing.Easing gives for every value of the grid """
+        self.assertEqual(31, len(self.methods))
+        self.assertEqual(sorted(dir(easing.Easing())), sorted(self.methods))
+        for name in self.methods:
+            scalar = getattr(self.scalar, name)
+            expected = np.array([scalar(float(n)) for n in self.grid])
+            result = getattr(Easing, name)(self.grid)
+            self.assertIsInstance(result, np.ndarray, name)
+            np.testing.assert_allclose(result, expected, rtol=0, atol=1e-9, err_msg=name)
+
+    def test_scalars_and_shapes(self):
+        """ a float or int gives a float, the shape of an array is kept """
+        values = self.grid[::1000].reshape(11, 1)
+        for name in self.methods:
+            method = getattr(Easing, name)
+            for n in (0, 0.25, 1):
+                result = method(n)
+                self.assertIsInstance(result, float, name)
+                self.assertAlmostEqual(getattr(self.scalar, name)(n), result, places=9, msg=name)
+            self.assertEqual((11, 1), method(values).shape, name)
+            self.assertEqual((2, 2), method([[0.0, 0.5], [0.75, 1.0]]).shape, name)
+            self.assertEqual((0,), method(np.array([])).shape, name)
+
+    def test_out_of_range(self):
+        """ a value outside 0.0 to 1.0 anywhere in the array is refused """
+        for name in self.methods:
+            method = getattr(Easing, name)
+            for n in (-0.1, 1.1, [0.0, 0.5, 1.0001], np.array([[0.5], [-1e-9]])):
+                with self.assertRaises(AssertionError, msg=name):
+                    method(n)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,463 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# easing_np.py
+
+# https://easings.net/
+# https://en.wikipedia.org/wiki/Inbetweening
+
+# The easing functions of easing.py for numpy arrays
+# the range is checked once per array, branches are evaluated with np.where / np.select / np.piecewise
+# a float or int still returns a float
+
+import math
+from typing import Union
+import numpy as np
+
+__all__ = ["Easing"]
+
+
+def _as_array(n) -> np.ndarray:
+    """ n as float array, the range of all values is checked at once """
+    n = np.asarray(n, dtype=float)
+    assert n.size == 0 or (n.min() >= 0.0 and n.max() <= 1.0), \
+        "Values must be between 0.0 and 1.0. Received: {0} to {1}".format(n.min(), n.max())
+    return n
+
+
+def _result(n: np.ndarray) -> Union[float, np.ndarray]:
+    """ a float for a scalar, else the array """
+    return n.item() if n.ndim == 0 else n
+
+
+def _out_elastic(n: np.ndarray, amplitude, period) -> np.ndarray:
+    if amplitude < 1:
+        amplitude = 1
+        s = period / 4
+    else:
+        s = period / (2 * math.pi) * math.asin(1 / amplitude)
+    return amplitude * 2 ** (-10 * n) * np.sin((n - s) * (2 * math.pi / period)) + 1
+
+
+def _out_bounce(n: np.ndarray) -> np.ndarray:
+    return np.select(
+        [n < (1 / 2.75), n < (2 / 2.75), n < (2.5 / 2.75)],
+        [7.5625 * n * n,
+         7.5625 * (n - 1.5 / 2.75) ** 2 + 0.75,
+         7.5625 * (n - 2.25 / 2.75) ** 2 + 0.9375],
+        7.5625 * (n - 2.65 / 2.75) ** 2 + 0.984375)
+
+
+class Easing:
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+
+    def __dir__(self):
+        """ return all the easing methods in this class if dir(Easing()) is used """
+        _dir = ["linear",
+                "ease_in_quad",    "ease_out_quad",    "ease_in_out_quad",
+                "ease_in_sine",    "ease_out_sine",    "ease_in_out_sine",
+                "ease_in_expo",    "ease_out_expo",    "ease_in_out_expo",
+                "ease_in_circ",    "ease_out_circ",    "ease_in_out_circ",
+                "ease_in_back",    "ease_out_back",    "ease_in_out_back",
+                "ease_in_cubic",   "ease_out_cubic",   "ease_in_out_cubic",
+                "ease_in_quart",   "ease_out_quart",   "ease_in_out_quart",
+                "ease_in_quint",   "ease_out_quint",   "ease_in_out_quint",
+                "ease_in_bounce",  "ease_out_bounce",  "ease_in_out_bounce",
+                "ease_in_elastic", "ease_out_elastic", "ease_in_out_elastic"]
+        return _dir
+
+    @staticmethod
+    def linear(n, *args, **kwargs) -> Union[float, np.ndarray]:
+        """
+        Returns what is given
+        :param n: (float or array) between 0.0 and 1.0
+        :param args: to prevent TypeError
+        :param kwargs: to prevent TypeError
+        :return: (float or numpy ndarray)
+        """
+        return _result(_as_array(n).copy())
+
+    @staticmethod
+    def ease_in_quad(n, *args, **kwargs) -> Union[float, np.ndarray]:
+        """
+        https://easings.net/en#easeInQuad
+        :param n: (float or array) between 0.0 and 1.0
+        :param args: to prevent TypeError
+        :param kwargs: to prevent TypeError
+        :return: (float or numpy ndarray)
+        """
+        n = _as_array(n)
+        return _result(n ** 2)
+
+    @staticmethod
+    def ease_out_quad(n, *args, **kwargs) -> Union[float, np.ndarray]:
+        """
+        https://easings.net/en#easeOutQuad
+        :param n: (float or array) between 0.0 and 1.0
+        :param args: to prevent TypeError
+        :param kwargs: to prevent TypeError
+        :return: (float or numpy ndarray)
+        """
+        n = _as_array(n)
+        return _result(-n * (n - 2))
+
+    @staticmethod
+    def ease_in_out_quad(n, *args, **kwargs) -> Union[float, np.ndarray]:
+        """
+        https://easings.net/en#easeInOutQuad
+        :param n: (float or array) between 0.0 and 1.0
+        :param args: to prevent TypeError
+        :param kwargs: to prevent TypeError
+        :return: (float or numpy ndarray)
+        """
+        n = _as_array(n)
+        m = n * 2 - 1
+        return _result(np.where(n < 0.5, 2 * n ** 2, -0.5 * (m * (m - 2) - 1)))
+
+    @staticmethod
+    def ease_in_cubic(n, *args, **kwargs) -> Union[float, np.ndarray]:
+        """
+        https://easings.net/en#easeInCubic
+        :param n: (float or array) between 0.0 and 1.0
+        :param args: to prevent TypeError
+        :param kwargs: to prevent TypeError
+        :return: (float or numpy ndarray)
+        """
+        n = _as_array(n)
+        return _result(n ** 3)
+
+    @staticmethod
+    def ease_out_cubic(n, *args, **kwargs) -> Union[float, np.ndarray]:
+        """
+        https://easings.net/en#easeOutCubic
+        :param n: (float or array) between 0.0 and 1.0
+        :param args: to prevent TypeError
+        :param kwargs: to prevent TypeError
+        :return: (float or numpy ndarray)
+        """
+        n = _as_array(n)
+        return _result((n - 1) ** 3 + 1)
+
+    @staticmethod
+    def ease_in_out_cubic(n, *args, **kwargs) -> Union[float, np.ndarray]:
+        """
+        https://easings.net/en#easeInOutCubic
+        :param n: (float or array) between 0.0 and 1.0
+        :param args: to prevent TypeError
+        :param kwargs: to prevent TypeError
+        :return: (float or numpy ndarray)
+        """
+        n = 2 * _as_array(n)
+        return _result(np.where(n < 1, 0.5 * n ** 3, 0.5 * ((n - 2) ** 3 + 2)))
+
+    @staticmethod
+    def ease_in_quart(n, *args, **kwargs) -> Union[float, np.ndarray]:
+        """
+        https://easings.net/en#easeInQuart
+        :param n: (float or array) between 0.0 and 1.0
+        :param args: to prevent TypeError
+        :param kwargs: to prevent TypeError
+        :return: (float or numpy ndarray)
+        """
+        n = _as_array(n)
+        return _result(n ** 4)
+
+    @staticmethod
+    def ease_out_quart(n, *args, **kwargs) -> Union[float, np.ndarray]:
+        """
+        https://easings.net/en#easeOutQuart
+        :param n: (float or array) between 0.0 and 1.0
+        :param args: to prevent TypeError
+        :param kwargs: to prevent TypeError
+        :return: (float or numpy ndarray)
+        """
+        n = _as_array(n)
+        return _result(-((n - 1) ** 4 - 1))
+
+    @staticmethod
+    def ease_in_out_quart(n, *args, **kwargs) -> Union[float, np.ndarray]:
+        """
+        https://easings.net/en#easeInOutQuart
+        :param n: (float or array) between 0.0 and 1.0
+        :param args: to prevent TypeError
+        :param kwargs: to prevent TypeError
+        :return: (float or numpy ndarray)
+        """
+        n = 2 * _as_array(n)
+        return _result(np.where(n < 1, 0.5 * n ** 4, -0.5 * ((n - 2) ** 4 - 2)))
+
+    @staticmethod
+    def ease_in_quint(n, *args, **kwargs) -> Union[float, np.ndarray]:
+        """
+        https://easings.net/en#easeInQuint
+        :param n: (float or array) between 0.0 and 1.0
+        :param args: to prevent TypeError
+        :param kwargs: to prevent TypeError
+        :return: (float or numpy ndarray)
+        """
+        n = _as_array(n)
+        return _result(n ** 5)
+
+    @staticmethod
+    def ease_out_quint(n, *args, **kwargs) -> Union[float, np.ndarray]:
+        """
+        https://easings.net/en#easeOutQuint
+        :param n: (float or array) between 0.0 and 1.0
+        :param args: to prevent TypeError
+        :param kwargs: to prevent TypeError
+        :return: (float or numpy ndarray)
+        """
+        n = _as_array(n)
+        return _result((n - 1) ** 5 + 1)
+
+    @staticmethod
+    def ease_in_out_quint(n, *args, **kwargs) -> Union[float, np.ndarray]:
+        """
+        https://easings.net/en#easeInOutQuint
+        :param n: (float or array) between 0.0 and 1.0
+        :param args: to prevent TypeError
+        :param kwargs: to prevent TypeError
+        :return: (float or numpy ndarray)
+        """
+        n = 2 * _as_array(n)
+        return _result(np.where(n < 1, 0.5 * n ** 5, 0.5 * ((n - 2) ** 5 + 2)))
+
+    @staticmethod
+    def ease_in_sine(n, *args, **kwargs) -> Union[float, np.ndarray]:
+        """
+        https://easings.net/en#easeInSine
+        :param n: (float or array) between 0.0 and 1.0
+        :param args: to prevent TypeError
+        :param kwargs: to prevent TypeError
+        :return: (float or numpy ndarray)
+        """
+        n = _as_array(n)
+        return _result(-1 * np.cos(n * math.pi / 2) + 1)
+
+    @staticmethod
+    def ease_out_sine(n, *args, **kwargs) -> Union[float, np.ndarray]:
+        """
+        https://easings.net/en#easeOutSine
+        :param n: (float or array) between 0.0 and 1.0
+        :param args: to prevent TypeError
+        :param kwargs: to prevent TypeError
+        :return: (float or numpy ndarray)
+        """
+        n = _as_array(n)
+        return _result(np.sin(n * math.pi / 2))
+
+    @staticmethod
+    def ease_in_out_sine(n, *args, **kwargs) -> Union[float, np.ndarray]:
+        """
+        https://easings.net/en#easeInOutSine
+        :param n: (float or array) between 0.0 and 1.0
+        :param args: to prevent TypeError
+        :param kwargs: to prevent TypeError
+        :return: (float or numpy ndarray)
+        """
+        n = _as_array(n)
+        return _result(-0.5 * (np.cos(math.pi * n) - 1))
+
+    @staticmethod
+    def ease_in_expo(n, *args, **kwargs) -> Union[float, np.ndarray]:
+        """
+        https://easings.net/en#easeInExpo
+        :param n: (float or array) between 0.0 and 1.0
+        :param args: to prevent TypeError
+        :param kwargs: to prevent TypeError
+        :return: (float or numpy ndarray)
+        """
+        n = _as_array(n)
+        return _result(np.where(n == 0, 0.0, 2 ** (10 * (n - 1))))
+
+    @staticmethod
+    def ease_out_expo(n, *args, **kwargs) -> Union[float, np.ndarray]:
+        """
+        https://easings.net/en#easeOutExpo
+        :param n: (float or array) between 0.0 and 1.0
+        :param args: to prevent TypeError
+        :param kwargs: to prevent TypeError
+        :return: (float or numpy ndarray)
+        """
+        n = _as_array(n)
+        return _result(np.where(n == 1, 1.0, -(2 ** (-10 * n)) + 1))
+
+    @staticmethod
+    def ease_in_out_expo(n, *args, **kwargs) -> Union[float, np.ndarray]:
+        """
+        https://easings.net/en#easeInOutExpo
+        :param n: (float or array) between 0.0 and 1.0
+        :param args: to prevent TypeError
+        :param kwargs: to prevent TypeError
+        :return: (float or numpy ndarray)
+        """
+        n = _as_array(n)
+        m = n * 2
+        return _result(np.select(
+            [n == 0, n == 1, m < 1],
+            [0.0, 1.0, 0.5 * 2 ** (10 * (m - 1))],
+            0.5 * (-1 * (2 ** (-10 * (m - 1))) + 2)))
+
+    @staticmethod
+    def ease_in_circ(n, *args, **kwargs) -> Union[float, np.ndarray]:
+        """
+        https://easings.net/en#easeInCirc
+        :param n: (float or array) between 0.0 and 1.0
+        :param args: to prevent TypeError
+        :param kwargs: to prevent TypeError
+        :return: (float or numpy ndarray)
+        """
+        n = _as_array(n)
+        return _result(-1 * (np.sqrt(1 - n * n) - 1))
+
+    @staticmethod
+    def ease_out_circ(n, *args, **kwargs) -> Union[float, np.ndarray]:
+        """
+        https://easings.net/en#easeOutCirc
+        :param n: (float or array) between 0.0 and 1.0
+        :param args: to prevent TypeError
+        :param kwargs: to prevent TypeError
+        :return: (float or numpy ndarray)
+        """
+        n = _as_array(n) - 1
+        return _result(np.sqrt(1 - (n * n)))
+
+    @staticmethod
+    def ease_in_out_circ(n, *args, **kwargs) -> Union[float, np.ndarray]:
+        """
+        https://easings.net/en#easeInOutCirc
+        the square root of one branch is negative on the other half, np.piecewise only evaluates its own half
+        :param n: (float or array) between 0.0 and 1.0
+        :param args: to prevent TypeError
+        :param kwargs: to prevent TypeError
+        :return: (float or numpy ndarray)
+        """
+        n = _as_array(n) * 2
+        return _result(np.piecewise(n, [n < 1], [lambda m: -0.5 * (np.sqrt(1 - m ** 2) - 1),
+                                                 lambda m: 0.5 * (np.sqrt(1 - (m - 2) ** 2) + 1)]))
+
+    @staticmethod
+    def ease_in_elastic(n, amplitude=1, period=0.3, *args, **kwargs) -> Union[float, np.ndarray]:
+        """
+        https://easings.net/en#easeInElastic
+        :param n: (float or array) between 0.0 and 1.0
+        :param amplitude: (float)
+        :param period: (float)
+        :param args: to prevent TypeError
+        :param kwargs: to prevent TypeError
+        :return: (float or numpy ndarray)
+        """
+        n = _as_array(n)
+        return _result(1 - _out_elastic(1 - n, amplitude, period))
+
+    @staticmethod
+    def ease_out_elastic(n, amplitude=1, period=0.3, *args, **kwargs) -> Union[float, np.ndarray]:
+        """
+        https://easings.net/en#easeOutElastic
+        :param n: (float or array) between 0.0 and 1.0
+        :param amplitude: (float)
+        :param period: (float)
+        :param args: to prevent TypeError
+        :param kwargs: to prevent TypeError
+        :return: (float or numpy ndarray)
+        """
+        n = _as_array(n)
+        return _result(_out_elastic(n, amplitude, period))
+
+    @staticmethod
+    def ease_in_out_elastic(n, amplitude=1, period=0.5, *args, **kwargs) -> Union[float, np.ndarray]:
+        """
+        https://easings.net/en#easeInOutElastic
+        :param n: (float or array) between 0.0 and 1.0
+        :param amplitude: (float)
+        :param period: (float)
+        :param args: to prevent TypeError
+        :param kwargs: to prevent TypeError
+        :return: (float or numpy ndarray)
+        """
+        n = _as_array(n) * 2
+        return _result(np.where(n < 1,
+                                (1 - _out_elastic(1 - n, amplitude, period)) / 2,
+                                _out_elastic(n - 1, amplitude, period) / 2 + 0.5))
+
+    @staticmethod
+    def ease_in_back(n, s=1.70158, *args, **kwargs) -> Union[float, np.ndarray]:
+        """
+        https://easings.net/en#easeInBack
+        :param n: (float or array) between 0.0 and 1.0
+        :param s: (float) overshoot  10%: 1.70154198866824  100%: 8.443535601593252
+        :param args: to prevent TypeError
+        :param kwargs: to prevent TypeError
+        :return: (float or numpy ndarray)
+        """
+        n = _as_array(n)
+        return _result(n * n * ((s + 1) * n - s))
+
+    @staticmethod
+    def ease_out_back(n, s=1.70158, *args, **kwargs) -> Union[float, np.ndarray]:
+        """
+        https://easings.net/en#easeOutBack
+        :param n: (float or array) between 0.0 and 1.0
+        :param s: (float) overshoot  10%: 1.70154198866824  100%: 8.443535601593252
+        :param args: to prevent TypeError
+        :param kwargs: to prevent TypeError
+        :return: (float or numpy ndarray)
+        """
+        n = _as_array(n) - 1
+        return _result(n * n * ((s + 1) * n + s) + 1)
+
+    @staticmethod
+    def ease_in_out_back(n, s=1.70158, *args, **kwargs) -> Union[float, np.ndarray]:
+        """
+        https://easings.net/en#easeInOutBack
+        :param n: (float or array) between 0.0 and 1.0
+        :param s: (float) overshoot  10%: 1.70154198866824  100%: 8.443535601593252
+        :param args: to prevent TypeError
+        :param kwargs: to prevent TypeError
+        :return: (float or numpy ndarray)
+        """
+        n = _as_array(n) * 2
+        s *= 1.525
+        m = n - 2
+        return _result(np.where(n < 1,
+                                0.5 * (n * n * ((s + 1) * n - s)),
+                                0.5 * (m * m * ((s + 1) * m + s) + 2)))
+
+    @staticmethod
+    def ease_in_bounce(n, *args, **kwargs) -> Union[float, np.ndarray]:
+        """
+        https://easings.net/en#easeInBounce
+        :param n: (float or array) between 0.0 and 1.0
+        :param args: to prevent TypeError
+        :param kwargs: to prevent TypeError
+        :return: (float or numpy ndarray)
+        """
+        n = _as_array(n)
+        return _result(1 - _out_bounce(1 - n))
+
+    @staticmethod
+    def ease_out_bounce(n, *args, **kwargs) -> Union[float, np.ndarray]:
+        """
+        https://easings.net/en#easeOutBounce
+        :param n: (float or array) between 0.0 and 1.0
+        :param args: to prevent TypeError
+        :param kwargs: to prevent TypeError
+        :return: (float or numpy ndarray)
+        """
+        n = _as_array(n)
+        return _result(_out_bounce(n))
+
+    @staticmethod
+    def ease_in_out_bounce(n, *args, **kwargs) -> Union[float, np.ndarray]:
+        """
+        https://easings.net/en#easeInOutBounce
+        :param n: (float or array) between 0.0 and 1.0
+        :param args: to prevent TypeError
+        :param kwargs: to prevent TypeError
+        :return: (float or numpy ndarray)
+        """
+        n = _as_array(n)
+        return _result(np.where(n < 0.5,
+                                (1 - _out_bounce(1 - n * 2)) * 0.5,
+                                _out_bounce(n * 2 - 1) * 0.5 + 0.5))
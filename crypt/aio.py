@@ -0,0 +1,132 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# aio.py
+
+# Awaitable versions of the public functions of rsa.py, ecc.py and pwd.py
+# The work runs on a bounded executor so the event loop stays responsive
+#
+#   from crypt import aio
+#   aio.configure(max_workers=8, limit=16)
+#   signature = await aio.rsa.sign_message(message, private_key)
+#   token = await aio.pwd.pwd_encrypt(message, pwd)
+
+import asyncio
+import functools
+import inspect
+import os
+import threading
+import weakref
+from concurrent.futures import Executor, ThreadPoolExecutor
+from types import ModuleType
+from typing import Callable
+
+from . import ecc as _ecc, pwd as _pwd, rsa as _rsa
+
+# functions that return a lazy iterator, the work would happen on the event loop while iterating
+SKIPPED = frozenset({'pwd_encrypt_iter', 'pwd_decrypt_iter'})
+
+_lock = threading.Lock()
+_executor = None  # see configure, made on first use
+_owns_executor = False
+_limit = None  # amount of calls running at once per event loop
+_semaphores = weakref.WeakKeyDictionary()  # event loop -> asyncio.Semaphore
+
+
+def configure(executor: Executor = None, max_workers: int = None, limit: int = None) -> None:
+    """
+    Set the executor and the concurrency limit of the awaitable functions
+    The previous executor is shut down if it was made by this module.
+    A ProcessPoolExecutor only works for functions whose arguments can be pickled, key objects can't.
+    :param executor: Executor  pool to run on, it is not shut down by this module
+    :param max_workers: int  size of the thread pool made when no executor is given, None for the amount of cores
+    :param limit: int  calls running at once per event loop, the others wait without taking a worker,
+                       None for max_workers
+    :return: None
+    """
+    global _executor, _owns_executor, _limit
+    max_workers = max_workers or os.cpu_count() or 1
+    owned = executor is None
+    if owned:
+        executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='crypt.aio')
+    with _lock:
+        previous = _executor if _owns_executor else None
+        _executor, _owns_executor, _limit = executor, owned, limit or max_workers
+        _semaphores.clear()
+    if previous is not None:
+        previous.shutdown(wait=False)  # running calls finish
+
+
+def shutdown(wait: bool = True) -> None:
+    """
+    Shut down the executor if it was made by this module, the next call makes a new one
+    :param wait: bool  wait for the running calls
+    :return: None
+    """
+    global _executor, _owns_executor
+    with _lock:
+        executor = _executor if _owns_executor else None
+        _executor, _owns_executor = None, False
+        _semaphores.clear()
+    if executor is not None:
+        executor.shutdown(wait=wait)
+
+
+def _get_executor() -> (Executor, asyncio.Semaphore):
+    """ the executor and the semaphore of the running event loop, the default executor is made on first use """
+    global _executor, _owns_executor, _limit
+    loop = asyncio.get_running_loop()
+    with _lock:
+        if _executor is None:
+            _limit = os.cpu_count() or 1
+            _executor = ThreadPoolExecutor(max_workers=_limit, thread_name_prefix='crypt.aio')
+            _owns_executor = True
+        semaphore = _semaphores.get(loop)
+        if semaphore is None:
+            semaphore = _semaphores[loop] = asyncio.Semaphore(_limit)
+        return _executor, semaphore
+
+
+async def run(func: Callable, *args, **kwargs):
+    """
+    Run func(*args, **kwargs) on the executor, at most  limit  calls run at once
+    :param func: callable  blocking function
+    :return: what func returns, what func raises is raised
+    """
+    executor, semaphore = _get_executor()
+    async with semaphore:
+        return await asyncio.get_running_loop().run_in_executor(executor, functools.partial(func, *args, **kwargs))
+
+
+def wrap(func: Callable) -> Callable:
+    """
+    Make an awaitable version of a blocking function
+    :param func: callable
+    :return: coroutine function with the name and docstring of func
+    """
+    @functools.wraps(func)
+    async def wrapper(*args, **kwargs):
+        return await run(func, *args, **kwargs)
+    return wrapper
+
+
+class AsyncModule:
+    """ The public functions of a module as awaitable functions with the same names """
+
+    def __init__(self, module: ModuleType):
+        """
+        :param module: module  its public functions (not the imported ones) are wrapped
+        """
+        self.__name__ = module.__name__
+        self.__doc__ = module.__doc__
+        for name, value in vars(module).items():
+            if (inspect.isfunction(value) and not name.startswith('_') and name not in SKIPPED
+                    and value.__module__ == module.__name__):
+                setattr(self, name, wrap(value))
+
+    def __repr__(self) -> str:
+        return "<AsyncModule {0}>".format(self.__name__)
+
+
+rsa = AsyncModule(_rsa)
+ecc = AsyncModule(_ecc)
+pwd = AsyncModule(_pwd)
@@ -0,0 +1,107 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# batch.py
+
+import os
+from collections import namedtuple
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from functools import lru_cache
+from typing import Callable, Iterable
+
+from cryptography.hazmat.backends import default_backend
+from cryptography.hazmat.primitives import serialization
+
+# key objects can't be pickled, keys going to a process pool travel as DER and are loaded once per process
+SerializedKey = namedtuple('SerializedKey', ['der', 'private'])
+
+
+def serialize_key(key) -> SerializedKey:
+    """
+    Serialize a key object to DER so it can be send to another process
+    :param key: a private or public key object
+    :return: SerializedKey
+    """
+    if hasattr(key, 'private_bytes'):
+        der = key.private_bytes(
+            encoding=serialization.Encoding.DER,
+            format=serialization.PrivateFormat.PKCS8,
+            encryption_algorithm=serialization.NoEncryption())
+        return SerializedKey(der, True)
+    der = key.public_bytes(
+        encoding=serialization.Encoding.DER,
+        format=serialization.PublicFormat.SubjectPublicKeyInfo)
+    return SerializedKey(der, False)
+
+
+@lru_cache(maxsize=64)
+def __load_der(der: bytes, private: bool):
+    """ private function that loads a serialized key, once per process per key """
+    if private:
+        return serialization.load_der_private_key(der, None, default_backend())
+    return serialization.load_der_public_key(der, default_backend())
+
+
+def resolve_key(key):
+    """
+    Return the key object of a SerializedKey, key objects are returned as they are
+    :param key: key object or SerializedKey
+    :return: key object
+    """
+    if isinstance(key, SerializedKey):
+        return __load_der(key.der, key.private)
+    return key
+
+
+def _apply(job: tuple):
+    """ worker: run func on one item, an exception is returned as the result of that item """
+    func, item = job
+    try:
+        return func(item)
+    except Exception as error:
+        return error
+
+
+def run_batch(func: Callable, items: Iterable[tuple], key_positions: tuple = (),
+              executor: Executor = None, workers: int = None, return_exceptions: bool = False) -> list:
+    """
+    Run func over every item and return the results in input order
+    The whole batch runs even if an item raises, the first exception in input order is raised afterwards,
+    or with  return_exceptions  the exception is the result of that item.
+    :param func: callable  module level function that takes one item, calls  resolve_key  on its keys
+    :param items: iterable of tuples
+    :param key_positions: tuple  indexes of the key objects in an item, serialized once per distinct key
+                                 when the items go to a process pool
+    :param executor: Executor  thread or process pool to use, it is not shut down
+    :param workers: int  size of the thread pool made when no executor is given, 1 to run inline
+    :param return_exceptions: bool  return the exception of an item that raises instead of raising it
+    :return: list  results in the order of items
+    """
+    results = __run_batch(func, list(items), key_positions, executor, workers)
+    if not return_exceptions:
+        for result in results:
+            if isinstance(result, Exception):
+                raise result
+    return results
+
+
+def __run_batch(func: Callable, items: list, key_positions: tuple, executor: Executor, workers: int) -> list:
+    """ private function that runs the batch, the exception of an item is its result """
+    if executor is None and (workers == 1 or len(items) < 2):
+        return [_apply((func, item)) for item in items]
+
+    if isinstance(executor, ProcessPoolExecutor) and key_positions:
+        serialized = {}  # id(key) -> SerializedKey, every distinct key is serialized once
+        for item in items:
+            for position in key_positions:
+                if id(item[position]) not in serialized:
+                    serialized[id(item[position])] = serialize_key(item[position])
+        items = [tuple(serialized[id(value)] if position in key_positions else value
+                       for position, value in enumerate(item))
+                 for item in items]
+
+    jobs = [(func, item) for item in items]
+    if executor is not None:
+        chunksize = max(1, len(jobs) // ((os.cpu_count() or 1) * 4))  # ignored by thread pools
+        return list(executor.map(_apply, jobs, chunksize=chunksize))
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        return list(pool.map(_apply, jobs))
@@ -0,0 +1,262 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# bench.py
+
+# Reproducible benchmarks of the crypt package
+# python -m crypt.bench --output before.json
+# python -m crypt.bench --output after.json --compare before.json
+
+import argparse
+import json
+import math
+import os
+import platform
+import statistics
+import sys
+import time
+from collections import namedtuple
+from typing import Callable, Iterable, List
+
+import cryptography
+from cryptography.hazmat.primitives import serialization
+
+from . import ecc, pwd, rsa
+
+SIZES = (64, 4096, 1024 * 1024)  # payload sizes in bytes
+OAEP_OVERHEAD = 2 * 32 + 2  # OAEP with SHA256, the largest message is key bytes - overhead
+
+# func is called once per repetition, repetitions None uses the repetitions of the run
+Case = namedtuple('Case', ['name', 'size', 'func', 'repetitions'])
+BenchResult = namedtuple('BenchResult', ['name', 'size', 'repetitions', 'loops', 'median', 'p95', 'mean', 'minimum'])
+
+
+def percentile(samples: List[float], fraction: float) -> float:
+    """
+    Nearest rank percentile
+    :param samples: list  measured times
+    :param fraction: float  0.95 for the 95th percentile
+    :return: float
+    """
+    ordered = sorted(samples)
+    return ordered[max(0, math.ceil(fraction * len(ordered)) - 1)]
+
+
+def measure(name: str, func: Callable[[], object], size: int = 0,
+            warmup: int = 2, repetitions: int = 20, min_time: float = 0.001) -> BenchResult:
+    """
+    Time func, the warmup calls are not measured
+    Fast functions are called in a loop so one sample takes at least min_time, the sample is the time per call.
+    :param name: str  name of the benchmark
+    :param func: callable  called without arguments
+    :param size: int  payload size in bytes, 0 if the benchmark has no payload
+    :param warmup: int  calls before measuring
+    :param repetitions: int  measured samples
+    :param min_time: float  seconds a sample takes at least
+    :return: BenchResult  times per call in seconds
+    """
+    start = time.perf_counter()
+    for _ in range(max(1, warmup)):
+        func()
+    elapsed = (time.perf_counter() - start) / max(1, warmup)
+    loops = max(1, math.ceil(min_time / elapsed)) if elapsed else 1000
+    samples = []
+    for _ in range(max(1, repetitions)):
+        start = time.perf_counter()
+        for _ in range(loops):
+            func()
+        samples.append((time.perf_counter() - start) / loops)
+    return BenchResult(name, size, len(samples), loops, statistics.median(samples),
+                       percentile(samples, 0.95), statistics.fmean(samples), min(samples))
+
+
+def default_cases(sizes: Iterable[int] = SIZES, rsa_key_size: int = 4096,
+                  curve: str = None, iterations: int = 100_000) -> List[Case]:
+    """
+    Build the benchmarks of keygen, PEM save/load, sign/verify, OAEP, ECDH + HKDF, ChaCha20 and PBKDF2
+    :param sizes: iterable of int  payload sizes, OAEP only gets the sizes that fit in one block
+    :param rsa_key_size: int  bits of the RSA keys
+    :param curve: str  curve of the ecc keys, None for  ecc.default_curve
+    :param iterations: int  PBKDF2 iterations of the pwd benchmarks
+    :return: list of Case
+    """
+    curve = curve or ecc.default_curve
+    password = 'benchmark password'
+    rsa_key = rsa.get_private_key(key_size=rsa_key_size)
+    rsa_public_key = rsa_key.public_key()
+    rsa_pem, rsa_public_pem = rsa.get_private_pem(rsa_key), rsa.get_public_pem(rsa_public_key)
+    ecc_key, ecc_peer_key = ecc.get_private_key(curve), ecc.get_private_key(curve)
+    ecc_pem, ecc_public_pem = ecc.generate_private_pem(ecc_key), ecc.generate_public_pem(ecc_key.public_key())
+    derived_key = ecc.get_derived_key(os.urandom(32))
+    can_sign, can_exchange = curve != 'X25519', curve != 'Ed25519'
+
+    cases = [
+        Case('rsa.keygen', 0, lambda: rsa.get_private_key(key_size=rsa_key_size), 3),
+        Case('rsa.pem_save', 0, lambda: rsa.get_private_pem(rsa_key), None),
+        Case('rsa.pem_load', 0, lambda: serialization.load_pem_private_key(rsa_pem, None), None),
+        Case('rsa.public_pem_load', 0, lambda: serialization.load_pem_public_key(rsa_public_pem), None),
+        Case('ecc.keygen', 0, lambda: ecc.get_private_key(curve), None),
+        Case('ecc.pem_save', 0, lambda: ecc.generate_private_pem(ecc_key), None),
+        Case('ecc.pem_load', 0, lambda: serialization.load_pem_private_key(ecc_pem, None), None),
+        Case('ecc.public_pem_load', 0, lambda: serialization.load_pem_public_key(ecc_public_pem), None),
+    ]
+    if can_exchange:
+        peer_public_key = ecc_peer_key.public_key()
+        cases.append(Case('ecc.ecdh_hkdf', 0,
+                          lambda: ecc.get_derived_key(ecc.get_shared_key(ecc_key, peer_public_key)), None))
+
+    for size in sizes:
+        data = os.urandom(size)
+        rsa_signature = rsa.sign_message(data, rsa_key)
+        cases += [
+            Case('rsa.sign', size, lambda data=data: rsa.sign_message(data, rsa_key), None),
+            Case('rsa.verify', size,
+                 lambda data=data, signature=rsa_signature:
+                 rsa.verify_signed_message(signature, data, rsa_public_key), None),
+        ]
+        if size <= rsa_key_size // 8 - OAEP_OVERHEAD:
+            encrypted = rsa.rsa_encrypt(data, rsa_public_key)
+            cases += [
+                Case('rsa.oaep_encrypt', size, lambda data=data: rsa.rsa_encrypt(data, rsa_public_key), None),
+                Case('rsa.oaep_decrypt', size, lambda encrypted=encrypted: rsa.rsa_decrypt(encrypted, rsa_key), None),
+            ]
+        if can_sign:
+            ecc_signature = ecc.sign_data(data, ecc_key)
+            cases += [
+                Case('ecc.sign', size, lambda data=data: ecc.sign_data(data, ecc_key), None),
+                Case('ecc.verify', size,
+                     lambda data=data, signature=ecc_signature:
+                     ecc.verify_signed_data(signature, data, ecc_key.public_key()), None),
+            ]
+        encrypted = ecc.encrypt_with_derived_key(data, derived_key)
+        token = pwd.pwd_encrypt(data, password, iterations, raw=True)
+        cases += [
+            Case('ecc.chacha20_encrypt', size, lambda data=data: ecc.encrypt_with_derived_key(data, derived_key), None),
+            Case('ecc.chacha20_decrypt', size,
+                 lambda encrypted=encrypted: ecc.decrypt_with_derived_key(encrypted, derived_key), None),
+            Case('pwd.pbkdf2_encrypt', size, lambda data=data: pwd.pwd_encrypt(data, password, iterations, True), 5),
+            Case('pwd.pbkdf2_decrypt', size, lambda token=token: pwd.pwd_decrypt(token, password), 5),
+        ]
+    return cases
+
+
+def run(cases: Iterable[Case], warmup: int = 2, repetitions: int = 20, select: str = None,
+        report: Callable[[BenchResult], None] = None, min_time: float = 0.001) -> List[BenchResult]:
+    """
+    Measure every case
+    :param cases: iterable of Case
+    :param warmup: int  calls before measuring
+    :param repetitions: int  measured calls of a case without its own repetitions
+    :param select: str  only run the cases whose name contains this text
+    :param report: callable  called with every result as soon as it is measured
+    :param min_time: float  seconds a sample takes at least
+    :return: list of BenchResult
+    """
+    results = []
+    for case in cases:
+        if select and select not in case.name:
+            continue
+        result = measure(case.name, case.func, case.size, warmup,
+                         repetitions if case.repetitions is None else min(case.repetitions, repetitions), min_time)
+        if report is not None:
+            report(result)
+        results.append(result)
+    return results
+
+
+def environment() -> dict:
+    """ The versions the results depend on, stored with the results """
+    return {'python': platform.python_version(), 'cryptography': cryptography.__version__,
+            'platform': platform.platform(), 'machine': platform.machine(), 'cpus': os.cpu_count()}
+
+
+def save(results: Iterable[BenchResult], path: str, settings: dict = None) -> None:
+    """
+    Write the results as JSON, sorted and indented so two runs can be diffed
+    :param results: iterable of BenchResult
+    :param path: str  file to write
+    :param settings: dict  the settings of the run, stored next to the environment
+    :return: None
+    """
+    document = {'environment': environment(), 'settings': settings or {},
+                'results': sorted((result._asdict() for result in results),
+                                  key=lambda result: (result['name'], result['size']))}
+    with open(path, 'w') as open_file:
+        json.dump(document, open_file, indent=2, sort_keys=True)
+        open_file.write('\n')
+
+
+def load(path: str) -> List[BenchResult]:
+    """
+    Read results written by  save
+    :param path: str
+    :return: list of BenchResult
+    """
+    with open(path) as open_file:
+        return [BenchResult(**result) for result in json.load(open_file)['results']]
+
+
+def compare(old: Iterable[BenchResult], new: Iterable[BenchResult], threshold: float = 0.10) -> List[tuple]:
+    """
+    Find the benchmarks whose median got slower than threshold
+    :param old: iterable of BenchResult  the baseline
+    :param new: iterable of BenchResult
+    :param threshold: float  0.10 reports medians that are more than 10% slower
+    :return: list of (name, size, old median, new median, ratio), slowest first
+    """
+    baseline = {(result.name, result.size): result for result in old}
+    regressions = []
+    for result in new:
+        before = baseline.get((result.name, result.size))
+        if before is None or not before.median:
+            continue
+        ratio = result.median / before.median
+        if ratio > 1 + threshold:
+            regressions.append((result.name, result.size, before.median, result.median, ratio))
+    return sorted(regressions, key=lambda regression: regression[-1], reverse=True)
+
+
+def __format(result: BenchResult) -> str:
+    """ private function that formats one result as a line of the report """
+    return "{0:<22} {1:>9} {2:>4}x{3:<6} median {4:>12,.2f} us  p95 {5:>12,.2f} us  {6:>12,.1f} ops/s".format(
+        result.name, result.size, result.repetitions, result.loops, result.median * 1e6, result.p95 * 1e6,
+        1 / result.median if result.median else 0.0)
+
+
+def main(argv: list = None) -> int:
+    """
+    Command line interface
+    :param argv: list  arguments, None for sys.argv
+    :return: int  exit code, 1 if --compare found a regression
+    """
+    parser = argparse.ArgumentParser(prog='python -m crypt.bench', description="Benchmark the crypt package")
+    parser.add_argument('--output', metavar='FILE', help="write the results as JSON")
+    parser.add_argument('--compare', metavar='FILE', help="JSON of an earlier run, report slower medians")
+    parser.add_argument('--threshold', type=float, default=0.10, help="slowdown reported by --compare")
+    parser.add_argument('--warmup', type=int, default=2)
+    parser.add_argument('--repetitions', type=int, default=20)
+    parser.add_argument('--min-time', type=float, default=0.001, help="seconds a sample takes at least")
+    parser.add_argument('--sizes', default=','.join(map(str, SIZES)), help="comma separated payload sizes")
+    parser.add_argument('--select', metavar='TEXT', help="only run benchmarks whose name contains TEXT")
+    parser.add_argument('--rsa-key-size', type=int, default=4096)
+    parser.add_argument('--curve', default=None, help="ecc curve, default: ecc.default_curve")
+    parser.add_argument('--iterations', type=int, default=100_000, help="PBKDF2 iterations")
+    args = parser.parse_args(argv)
+
+    sizes = [int(size) for size in args.sizes.split(',') if size]
+    cases = default_cases(sizes, args.rsa_key_size, args.curve, args.iterations)
+    results = run(cases, args.warmup, args.repetitions, args.select,
+                  lambda result: print(__format(result)), args.min_time)
+    if args.output:
+        settings = {key: value for key, value in vars(args).items() if key not in ('output', 'compare')}
+        save(results, args.output, settings)
+
+    if not args.compare:
+        return 0
+    regressions = compare(load(args.compare), results, args.threshold)
+    for name, size, before, after, ratio in regressions:
+        print("slower: {0} {1}  {2:.6f} s -> {3:.6f} s  ({4:+.0%})".format(name, size, before, after, ratio - 1))
+    return 1 if regressions else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
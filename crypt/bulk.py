@@ -0,0 +1,217 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# bulk.py
+
+# Encrypt or decrypt a whole directory tree with the pwd stream format on all cores
+# python -m crypt.pwd encrypt-tree SRC DST
+# python -m crypt.pwd decrypt-tree SRC DST
+
+import argparse
+import getpass
+import os
+import secrets
+import time
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor
+from typing import List
+
+from .cache import LRUCache, hash_key
+from .chunked import CHUNK_SIZE
+from .pwd import HEADER_SIZE, check_kdf_params, derive_key, key_decrypt_stream, key_encrypt_stream
+
+SUFFIX = '.pwd'
+
+# keys a decrypt worker derived, a batch with one shared salt derives once per worker process
+_worker_keys = LRUCache(maxsize=64, ttl=300.0)
+
+FileResult = namedtuple('FileResult', ['path', 'size', 'error'])
+
+
+class TreeReport(namedtuple('TreeReport', ['results', 'seconds'])):
+    """ Per file results in path order and the wall time of the batch """
+
+    @property
+    def files(self) -> int:
+        return len(self.results)
+
+    @property
+    def size(self) -> int:
+        """ bytes of plaintext that went through """
+        return sum(result.size for result in self.results)
+
+    @property
+    def errors(self) -> List[FileResult]:
+        return [result for result in self.results if result.error is not None]
+
+    @property
+    def mb_per_second(self) -> float:
+        return self.size / 1e6 / self.seconds if self.seconds else 0.0
+
+    @property
+    def files_per_second(self) -> float:
+        return self.files / self.seconds if self.seconds else 0.0
+
+
+def __walk(directory: str, suffix: str = '') -> List[str]:
+    """ private function that lists the files under directory as sorted relative paths """
+    paths = []
+    for root, dirs, files in os.walk(directory):
+        dirs.sort()
+        for name in sorted(files):
+            if name.endswith(suffix):
+                paths.append(os.path.relpath(os.path.join(root, name), directory))
+    return paths
+
+
+def __write_atomic(target: str, write) -> int:
+    """ private function that writes through a temporary file, target only appears when write succeeds """
+    os.makedirs(os.path.dirname(target), exist_ok=True)
+    temporary = '{0}.{1}.tmp'.format(target, secrets.token_hex(4))
+    try:
+        with open(temporary, 'wb') as dst:
+            size = write(dst)
+        os.replace(temporary, target)
+    except BaseException:
+        if os.path.exists(temporary):
+            os.remove(temporary)
+        raise
+    return size
+
+
+def _encrypt_file(job: tuple) -> FileResult:
+    """ worker: encrypt one file, with the batch key or with its own salt and key """
+    path, source, target, pwd, key, zout, i, chunk_size = job
+    try:
+        if key is None:  # per file salt
+            zout = secrets.token_bytes(16)
+            key = derive_key(pwd, zout, i)
+        with open(source, 'rb') as src:
+            __write_atomic(target, lambda dst: key_encrypt_stream(src, dst, key, zout, i, chunk_size))
+            return FileResult(path, src.tell(), None)
+    except Exception as error:
+        return FileResult(path, 0, '{0}: {1}'.format(type(error).__name__, error))
+
+
+def _decrypt_file(job: tuple) -> FileResult:
+    """ worker: derive the key of the file header, or take it from the keys of this worker, and decrypt """
+    path, source, target, pwd = job
+    try:
+        with open(source, 'rb') as src:
+            header = src.read(HEADER_SIZE)
+            if len(header) != HEADER_SIZE:
+                raise ValueError("File is too short")
+            cache_key = hash_key(pwd, header)
+            key = _worker_keys.get_copy(cache_key)  # copied under the cache lock, clear() wipes the entry
+            if key is None:
+                key = derive_key(pwd, header[:16], int.from_bytes(header[16:], 'big'))
+                _worker_keys.put(cache_key, bytearray(key))  # bytearray so clear() can wipe it
+            src.seek(0)
+            size = __write_atomic(target, lambda dst: key_decrypt_stream(src, dst, key))
+            return FileResult(path, size, None)
+    except Exception as error:
+        return FileResult(path, 0, '{0}: {1}'.format(type(error).__name__, error))
+
+
+def __run(worker, jobs: list, workers: int = None) -> List[FileResult]:
+    """ private function that runs the jobs in a process pool, results are in job order """
+    if workers == 1 or len(jobs) < 2:
+        return list(map(worker, jobs))
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        pool_size = workers or os.cpu_count() or 1
+        return list(executor.map(worker, jobs, chunksize=max(1, len(jobs) // (pool_size * 8))))
+
+
+def encrypt_tree(source: str, destination: str, pwd: str, i: int = 100_000, per_file_salt: bool = True,
+                 workers: int = None, chunk_size: int = CHUNK_SIZE, suffix: str = SUFFIX) -> TreeReport:
+    """
+    Encrypt every file under source into the same relative path under destination + suffix
+    Files are spread over a process pool, a failing file doesn't stop the others.
+    :param source: str  directory to encrypt
+    :param destination: str  directory for the encrypted files
+    :param pwd: str  password
+    :param i: int  iterations or KDF parameters (scrypt_params, calibrate_kdf) of the key derivation
+    :param per_file_salt: bool  True: every file gets its own salt and key, derived in the workers
+                                False: derive the key once for the whole batch, all files share the salt and key,
+                                only the 7 byte random nonce prefix differs per file. Fine for thousands of files,
+                                not for millions: the chance that two files share a nonce grows with files ** 2
+    :param workers: int  size of the process pool, None for the amount of cores, 1 to run inline
+    :param chunk_size: int  plaintext bytes per authenticated chunk
+    :param suffix: str  appended to the name of every encrypted file
+    :raises ValueError: if i is out of range, see pwd.check_kdf_params
+    :return: TreeReport  results per file in path order with the throughput
+    """
+    check_kdf_params(i)
+    start = time.perf_counter()
+    key = zout = None
+    if not per_file_salt:
+        zout = secrets.token_bytes(16)
+        key = derive_key(pwd, zout, i)
+    jobs = [(path, os.path.join(source, path), os.path.join(destination, path + suffix),
+             pwd if per_file_salt else None, key, zout, i, chunk_size)
+            for path in __walk(source)]
+    results = __run(_encrypt_file, jobs, workers)
+    return TreeReport(results, time.perf_counter() - start)
+
+
+def decrypt_tree(source: str, destination: str, pwd: str,
+                 workers: int = None, suffix: str = SUFFIX) -> TreeReport:
+    """
+    Decrypt every file ending with suffix under source into destination
+    The workers derive the keys, once per distinct salt and iterations per worker process.
+    :param source: str  directory with encrypted files
+    :param destination: str  directory for the decrypted files
+    :param pwd: str  password
+    :param workers: int  size of the process pool, None for the amount of cores, 1 to run inline
+    :param suffix: str  only files with this suffix are decrypted, it is removed from the name
+    :return: TreeReport  results per file in path order with the throughput
+    """
+    start = time.perf_counter()
+    jobs = [(path, os.path.join(source, path),
+             os.path.join(destination, path[:len(path) - len(suffix)] if suffix else path), pwd)
+            for path in __walk(source, suffix)]
+    try:
+        results = __run(_decrypt_file, jobs, workers)
+    finally:
+        _worker_keys.clear()  # the keys of an inline run, worker processes end with the pool
+    return TreeReport(results, time.perf_counter() - start)
+
+
+def main(argv: list = None) -> int:
+    """
+    Command line interface
+    :param argv: list  arguments, None for sys.argv
+    :return: int  exit code, 1 if any file failed
+    """
+    parser = argparse.ArgumentParser(
+        prog='python -m crypt.pwd', description="Encrypt or decrypt a directory tree on all cores")
+    commands = parser.add_subparsers(dest='command', required=True)
+    for command in ('encrypt-tree', 'decrypt-tree'):
+        sub = commands.add_parser(command)
+        sub.add_argument('source')
+        sub.add_argument('destination')
+        sub.add_argument('--workers', type=int, default=None, help="processes, default: amount of cores")
+        sub.add_argument('--suffix', default=SUFFIX)
+        sub.add_argument('--password-env', metavar='NAME',
+                         help="read the password from this environment variable instead of a prompt")
+    encrypt = commands.choices['encrypt-tree']
+    encrypt.add_argument('--iterations', type=int, default=100_000)
+    encrypt.add_argument('--per-file-salt', dest='per_file_salt', action='store_true', default=True,
+                         help="a salt and key per file (default)")
+    encrypt.add_argument('--shared-salt', dest='per_file_salt', action='store_false',
+                         help="derive one key for the whole tree, faster for many small files")
+    encrypt.add_argument('--chunk-size', type=int, default=CHUNK_SIZE)
+    args = parser.parse_args(argv)
+
+    pwd = os.environ[args.password_env] if args.password_env else getpass.getpass()
+    if args.command == 'encrypt-tree':
+        report = encrypt_tree(args.source, args.destination, pwd, args.iterations, args.per_file_salt,
+                              args.workers, args.chunk_size, args.suffix)
+    else:
+        report = decrypt_tree(args.source, args.destination, pwd, args.workers, args.suffix)
+
+    for result in report.errors:
+        print("error: {0}: {1}".format(result.path, result.error))
+    print("files: {0}  bytes: {1}  seconds: {2:.3f}  {3:.1f} MB/s  {4:.1f} files/s  errors: {5}".format(
+        report.files, report.size, report.seconds, report.mb_per_second,
+        report.files_per_second, len(report.errors)))
+    return 1 if report.errors else 0
@@ -0,0 +1,193 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# cache.py
+
+import hashlib
+import os
+import secrets
+import threading
+import time
+from collections import OrderedDict, namedtuple
+
+CacheStats = namedtuple('CacheStats', ['hits', 'misses', 'size', 'maxsize'])
+
+# keyed per process, so cache keys made from secrets can't be brute forced offline
+__HASH_SECRET = secrets.token_bytes(32)
+
+
+def hash_key(*parts: (bytes, str, int)) -> bytes:
+    """
+    Make a cache key out of (secret) parts without keeping the parts themselves
+    :param parts: bytes, str or int  every part is length prefixed so parts can't run into each other
+    :return: bytes  32 byte digest
+    """
+    digest = hashlib.blake2b(key=__HASH_SECRET, digest_size=32)
+    for part in parts:
+        if isinstance(part, str):
+            part = part.encode('utf-8')
+        elif isinstance(part, int):
+            part = str(part).encode('ascii')
+        elif part is None:
+            part = b''
+        digest.update(len(part).to_bytes(8, 'big'))
+        digest.update(part)
+    return digest.digest()
+
+
+def wipe(value) -> None:
+    """ Overwrite a bytearray with zeros, other values can't be wiped and are left alone """
+    if isinstance(value, bytearray):
+        value[:] = bytes(len(value))
+
+
+class LRUCache:
+    """
+    Thread-safe least recently used cache with an optional time to live
+    bytearray values are overwritten with zeros when they leave the cache,
+    store secrets as bytearray so  clear()  wipes them.
+    """
+
+    def __init__(self, maxsize: int = 128, ttl: float = None):
+        """
+        :param maxsize: int  maximum amount of entries, the least recently used entry is evicted first
+        :param ttl: float  seconds an entry stays valid, None to keep entries until evicted
+        """
+        if maxsize < 1:
+            raise ValueError("maxsize must be at least 1, received: {0}".format(maxsize))
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()  # key -> (expires, value)
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        """
+        Return the value of key and mark it as recently used
+        :param key: hashable
+        :param default: returned when the key is missing or expired
+        :return: the cached value or default
+        """
+        with self._lock:
+            return self._lookup(key, default)
+
+    def get_copy(self, key, default=None):
+        """
+        Like  get, but a bytearray value is returned as a bytes copy made while the lock is held
+        Use it for secrets, the cached bytearray itself can be wiped by another thread at any time.
+        :param key: hashable
+        :param default: returned when the key is missing or expired
+        :return: the cached value, bytes for a bytearray, or default
+        """
+        with self._lock:
+            value = self._lookup(key, default)
+            return bytes(value) if isinstance(value, bytearray) else value
+
+    def _lookup(self, key, default):
+        """ get  without the lock, the caller holds it """
+        entry = self._entries.get(key)
+        if entry is not None and entry[0] is not None and entry[0] <= time.monotonic():
+            del self._entries[key]
+            wipe(entry[1])
+            entry = None
+        if entry is None:
+            self.misses += 1
+            return default
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return entry[1]
+
+    def put(self, key, value) -> None:
+        """
+        Add or replace the value of key, evicts the least recently used entry when full
+        :param key: hashable
+        :param value: the value to cache
+        :return: None
+        """
+        expires = None if self.ttl is None else time.monotonic() + self.ttl
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None and old[1] is not value:
+                wipe(old[1])
+            self._entries[key] = (expires, value)
+            while len(self._entries) > self.maxsize:
+                _, (_, evicted) = self._entries.popitem(last=False)
+                wipe(evicted)
+
+    def pop(self, key) -> bool:
+        """
+        Explicitly evict key
+        :param key: hashable
+        :return: bool  True if the key was cached
+        """
+        with self._lock:
+            entry = self._entries.pop(key, None)
+        if entry is None:
+            return False
+        wipe(entry[1])
+        return True
+
+    def pop_matching(self, predicate) -> int:
+        """
+        Explicitly evict every key for which predicate(key) is true
+        :param predicate: callable  predicate(key) -> bool
+        :return: int  amount of evicted entries
+        """
+        with self._lock:
+            keys = [key for key in self._entries if predicate(key)]
+            entries = [self._entries.pop(key) for key in keys]
+        for _, value in entries:
+            wipe(value)
+        return len(entries)
+
+    def clear(self) -> None:
+        """ Evict (and wipe) all entries, the counters are kept """
+        with self._lock:
+            entries, self._entries = self._entries, OrderedDict()
+        for _, value in entries.values():
+            wipe(value)
+
+    def stats(self) -> CacheStats:
+        """ Return the hit and miss counters with the current size """
+        with self._lock:
+            return CacheStats(self.hits, self.misses, len(self._entries), self.maxsize)
+
+    @property
+    def hit_rate(self) -> float:
+        """ Fraction of the lookups that were a hit, 0.0 if there were no lookups """
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def __contains__(self, key) -> bool:
+        entry = self._entries.get(key)
+        return entry is not None and (entry[0] is None or entry[0] > time.monotonic())
+
+
+key_file_cache = LRUCache(maxsize=256)  # process-wide cache of loaded key objects, see load_key_file
+
+
+def load_key_file(key_file: str, load, pwd: bytes = None, kind: str = 'key'):
+    """
+    Load a key file through  key_file_cache
+    Entries are keyed on (realpath, mtime, size, password hash), a changed file is loaded again.
+    :param key_file: str  path to the keyfile
+    :param load: callable  load(data, pwd) returns the key object
+    :param pwd: bytes  password of the key file, only a keyed hash of it is kept
+    :param kind: str  what load returns, a file loaded as private and as public key is cached twice
+    :raises FileNotFoundError:  if key_file doesnt exist
+    :return: the loaded key object
+    """
+    key_file = os.path.realpath(key_file)
+    if not os.path.exists(key_file):
+        raise FileNotFoundError("given file doesnt exist: {0}".format(key_file))
+    stat = os.stat(key_file)
+    cache_key = (kind, key_file, stat.st_mtime_ns, stat.st_size, hash_key(pwd))
+    key = key_file_cache.get(cache_key)
+    if key is None:
+        with open(key_file, 'rb') as open_file:
+            key = load(open_file.read(), pwd)
+        key_file_cache.put(cache_key, key)
+    return key
@@ -0,0 +1,293 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# chunked.py
+
+import mmap
+import os
+import struct
+from functools import partial
+from typing import BinaryIO, Callable, Iterable, Iterator
+
+from cryptography.exceptions import InvalidTag
+from cryptography.hazmat.backends import default_backend
+from cryptography.hazmat.primitives import hashes
+from cryptography.hazmat.primitives.ciphers.aead import ChaCha20Poly1305
+
+CHUNK_SIZE = 64 * 1024  # plaintext bytes per authenticated chunk
+MAX_CHUNK_SIZE = 16 * 1024 * 1024  # largest chunk, a frame that claims to be larger is refused before reading it
+NONCE_PREFIX_SIZE = 7  # random part of the nonce, 4 counter bytes + 1 last-chunk flag follow
+TAG_SIZE = 16  # Poly1305 tag appended to every chunk
+FRAME_HEADER = struct.Struct('>I')  # length of the ciphertext that follows
+HASH_CHUNK_SIZE = 1024 * 1024  # bytes fed to the hash at once
+
+
+def stream_nonce(prefix: bytes, counter: int, last: bool) -> bytes:
+    """
+    Build the nonce of a chunk
+    The counter prevents reordering, the last flag prevents truncation of the stream
+    :param prefix: bytes  random per stream, NONCE_PREFIX_SIZE long
+    :param counter: int  index of the chunk in the stream
+    :param last: bool  True if this is the final chunk of the stream
+    :raises OverflowError: if the stream has more chunks than the counter can hold
+    :return: bytes  12 byte nonce
+    """
+    return b'%b%b%b' % (prefix, counter.to_bytes(4, 'big'), b'\x01' if last else b'\x00')
+
+
+def read_exact(read: Callable[[int], bytes], size: int) -> bytes:
+    """
+    Read exactly size bytes, short reads (pipes, sockets) are retried
+    :param read: callable  read(n) of a file-like object
+    :param size: int  amount of bytes to read
+    :return: bytes  less than size only if the end of the data is reached
+    """
+    data = read(size)
+    if len(data) == size or not data:
+        return data
+    parts = [data]
+    remaining = size - len(data)
+    while remaining:
+        data = read(remaining)
+        if not data:
+            break
+        parts.append(data)
+        remaining -= len(data)
+    return b''.join(parts)
+
+
+def write_all(fd: int, data: bytes) -> int:
+    """
+    Write all of data to a file descriptor, short writes (full disk, signals) are retried
+    :param fd: int  file descriptor
+    :param data: bytes-like object
+    :raises OSError: if the write fails or nothing more can be written
+    :return: int  amount of bytes written
+    """
+    with memoryview(data) as view:
+        written = 0
+        while written < len(view):
+            count = os.write(fd, view[written:])
+            if not count:
+                raise OSError("Short write, {0} of {1} bytes written".format(written, len(view)))
+            written += count
+    return written
+
+
+def read_chunks(file: BinaryIO, chunk_size: int = CHUNK_SIZE) -> Iterator[bytes]:
+    """
+    Iterate over a file-like object in pieces of chunk_size
+    :param file: file-like object opened in binary mode
+    :param chunk_size: int
+    :return: iterator of bytes
+    """
+    return iter(partial(read_exact, file.read, chunk_size), b'')
+
+
+def rechunk(chunks: Iterable[bytes], chunk_size: int = CHUNK_SIZE) -> Iterator[bytes]:
+    """
+    Split pieces that are larger than chunk_size, smaller pieces are passed through
+    :param chunks: iterable of bytes-like objects
+    :param chunk_size: int
+    :return: iterator of bytes-like objects, none larger than chunk_size
+    """
+    for chunk in chunks:
+        if len(chunk) <= chunk_size:
+            yield chunk
+            continue
+        view = memoryview(chunk)
+        for start in range(0, len(view), chunk_size):
+            yield view[start:start + chunk_size]
+
+
+class IterableReader:
+    """ Gives an iterable of bytes the read(n) method of a file-like object """
+
+    def __init__(self, chunks: Iterable[bytes]):
+        self._chunks = iter(chunks)
+        self._buffer = bytearray()
+        self._offset = 0  # bytes of the buffer that are already read
+
+    def read(self, size: int) -> bytes:
+        while len(self._buffer) - self._offset < size:
+            chunk = next(self._chunks, None)
+            if chunk is None:
+                break
+            if self._offset:  # drop what is read once, before the buffer grows
+                del self._buffer[:self._offset]
+                self._offset = 0
+            self._buffer += chunk
+        end = min(self._offset + size, len(self._buffer))
+        with memoryview(self._buffer) as view:
+            data = bytes(view[self._offset:end])
+        self._offset = end
+        return data
+
+
+def check_chunk_size(chunk):
+    """
+    Refuse chunks that  decrypt_chunks  would refuse, and chunk sizes that can't hold a byte
+    :param chunk: bytes-like object or int  a chunk or a chunk size
+    :raises ValueError: if it is larger than MAX_CHUNK_SIZE, or a chunk size below 1
+    :return: what is given
+    """
+    if isinstance(chunk, int) and chunk < 1:
+        raise ValueError("Chunk size must be at least 1, received: {0}".format(chunk))
+    if (chunk if isinstance(chunk, int) else len(chunk)) > MAX_CHUNK_SIZE:
+        raise ValueError("Chunks can't be larger than {0} bytes".format(MAX_CHUNK_SIZE))
+    return chunk
+
+
+def encrypt_chunks(key: bytes, chunks: Iterable[bytes], aad: bytes, prefix: bytes) -> Iterator[bytes]:
+    """
+    Encrypt every chunk on its own and yield it as a length prefixed frame
+    At most two chunks are held in memory, the next chunk is read ahead to know which one is the last.
+    An empty stream still yields one (empty) last frame so a missing tail can be detected.
+    :param key: bytes  32 byte ChaCha20Poly1305 key
+    :param chunks: iterable of bytes  the plaintext
+    :param aad: bytes  associated data authenticated with every chunk, e.g. the header
+    :param prefix: bytes  random nonce prefix, NONCE_PREFIX_SIZE long
+    :raises ValueError: if a chunk is larger than MAX_CHUNK_SIZE
+    :return: iterator of bytes  frames
+    """
+    chacha = ChaCha20Poly1305(key)
+    chunks = iter(chunks)
+    current = check_chunk_size(next(chunks, b''))
+    counter = 0
+    for following in chunks:
+        if not following:
+            continue
+        check_chunk_size(following)
+        encrypted = chacha.encrypt(stream_nonce(prefix, counter, False), current, aad)
+        yield FRAME_HEADER.pack(len(encrypted)) + encrypted
+        current = following
+        counter += 1
+    encrypted = chacha.encrypt(stream_nonce(prefix, counter, True), current, aad)
+    yield FRAME_HEADER.pack(len(encrypted)) + encrypted
+
+
+def __read_frame(read: Callable[[int], bytes]) -> (bytes, None):
+    """ private function that reads one frame, None at the end of the stream """
+    header = read_exact(read, FRAME_HEADER.size)
+    if not header:
+        return None
+    if len(header) != FRAME_HEADER.size:
+        raise InvalidTag("Stream is truncated")
+    size, = FRAME_HEADER.unpack(header)
+    if size > MAX_CHUNK_SIZE + TAG_SIZE:
+        raise InvalidTag("Frame is larger than a chunk can be")
+    frame = read_exact(read, size)
+    if len(frame) != size:
+        raise InvalidTag("Stream is truncated")
+    return frame
+
+
+def decrypt_chunks(key: bytes, read: Callable[[int], bytes], aad: bytes, prefix: bytes) -> Iterator[bytes]:
+    """
+    Decrypt the frames made by  encrypt_chunks  and yield the plaintext chunk by chunk
+    :param key: bytes  32 byte ChaCha20Poly1305 key
+    :param read: callable  read(n) positioned at the first frame
+    :param aad: bytes  the associated data given at encryption
+    :param prefix: bytes  the nonce prefix given at encryption
+    :raises InvalidTag: if a chunk is altered, reordered, larger than MAX_CHUNK_SIZE or the stream is truncated
+    :return: iterator of bytes
+    """
+    chacha = ChaCha20Poly1305(key)
+    frame = __read_frame(read)
+    if frame is None:
+        raise InvalidTag("Stream is truncated")
+    counter = 0
+    while True:
+        following = __read_frame(read)
+        last = following is None
+        yield chacha.decrypt(stream_nonce(prefix, counter, last), frame, aad)
+        if last:
+            return
+        frame = following
+        counter += 1
+
+
+def encrypt_into(aead, nonce: bytes, data: bytes, aad: (bytes, None), dst) -> int:
+    """
+    Encrypt into a caller-owned buffer, without an intermediate bytes object if the AEAD supports it
+    :param aead: ChaCha20Poly1305 or another cryptography AEAD object
+    :param nonce: bytes
+    :param data: bytes-like object  the plaintext
+    :param aad: bytes-like object or None  associated data
+    :param dst: writable bytes-like object  at least len(data) + TAG_SIZE bytes
+    :raises ValueError: if dst is too small
+    :return: int  amount of bytes written to the start of dst
+    """
+    size = len(data) + TAG_SIZE
+    view = memoryview(dst).cast('B')
+    if len(view) < size:
+        raise ValueError("Buffer is too small, {0} bytes are needed".format(size))
+    if hasattr(aead, 'encrypt_into'):  # cryptography >= 47
+        return aead.encrypt_into(nonce, data, aad, view[:size])
+    view[:size] = aead.encrypt(nonce, bytes(data), aad)
+    return size
+
+
+def decrypt_into(aead, nonce: bytes, data: bytes, aad: (bytes, None), dst) -> int:
+    """
+    Decrypt into a caller-owned buffer, without an intermediate bytes object if the AEAD supports it
+    :param aead: ChaCha20Poly1305 or another cryptography AEAD object
+    :param nonce: bytes
+    :param data: bytes-like object  the ciphertext with the tag
+    :param aad: bytes-like object or None  associated data
+    :param dst: writable bytes-like object  at least len(data) - TAG_SIZE bytes
+    :raises ValueError: if dst is too small
+    :raises InvalidTag: if the data is altered
+    :return: int  amount of bytes written to the start of dst
+    """
+    size = len(data) - TAG_SIZE
+    if size < 0:
+        raise InvalidTag("Data is too short")
+    view = memoryview(dst).cast('B')
+    if len(view) < size:
+        raise ValueError("Buffer is too small, {0} bytes are needed".format(size))
+    if hasattr(aead, 'decrypt_into'):  # cryptography >= 47
+        return aead.decrypt_into(nonce, data, aad, view[:size])
+    view[:size] = aead.decrypt(nonce, bytes(data), aad)
+    return size
+
+
+def digest_chunks(chunks: Iterable[bytes], algorithm: hashes.HashAlgorithm = None) -> bytes:
+    """
+    Hash data piece by piece, for signing with  utils.Prehashed
+    :param chunks: iterable of bytes-like objects
+    :param algorithm: hashes.HashAlgorithm  default SHA256
+    :return: bytes  digest
+    """
+    digest = hashes.Hash(algorithm or hashes.SHA256(), default_backend())
+    for chunk in chunks:
+        digest.update(chunk)
+    return digest.finalize()
+
+
+def digest_file(file: (str, BinaryIO), algorithm: hashes.HashAlgorithm = None,
+                chunk_size: int = HASH_CHUNK_SIZE) -> bytes:
+    """
+    Hash a file from its current position with flat memory
+    Regular files are memory-mapped so no read buffers are copied, other file-like objects are read in chunks.
+    :param file: str or file-like object  path or file opened in binary mode
+    :param algorithm: hashes.HashAlgorithm  default SHA256
+    :param chunk_size: int  bytes fed to the hash at once
+    :return: bytes  digest
+    """
+    if isinstance(file, str):
+        with open(file, 'rb') as open_file:
+            return digest_file(open_file, algorithm, chunk_size)
+    try:
+        mapped = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+    except (AttributeError, OSError, ValueError):  # no fileno, an empty file, a pipe
+        return digest_chunks(read_chunks(file, chunk_size), algorithm)
+    digest = hashes.Hash(algorithm or hashes.SHA256(), default_backend())
+    with mapped:
+        view = memoryview(mapped)
+        try:
+            for start in range(file.tell(), len(view), chunk_size):
+                digest.update(view[start:start + chunk_size])
+        finally:
+            view.release()
+    file.seek(0, 2)  # consumed like the read path
+    return digest.finalize()
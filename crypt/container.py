@@ -0,0 +1,198 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# container.py
+
+# Seekable encrypted container on top of the pwd key derivation
+# layout:  MAGIC | salt (16) | iterations (4) | chunk size (4) | nonce prefix (7) | chunk 0 | chunk 1 | ...
+# Every chunk holds  chunk size  bytes of plaintext (the last one may hold less) plus a 16 byte tag,
+# so chunk k starts at  HEADER_SIZE + k * (chunk size + 16)  and the file size is the chunk index.
+# The nonce of a chunk holds its index and a last-chunk flag, moving or cutting off chunks is detected.
+
+import os
+import secrets
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import BinaryIO, Iterator
+
+from cryptography.exceptions import InvalidTag
+from cryptography.hazmat.primitives.ciphers.aead import ChaCha20Poly1305
+
+from .chunked import CHUNK_SIZE, NONCE_PREFIX_SIZE, TAG_SIZE, check_chunk_size, read_chunks, read_exact, \
+    stream_nonce
+from .pwd import check_kdf_params, derive_key
+
+MAGIC = b'PWC\x01'
+HEADER_SIZE = len(MAGIC) + 16 + 4 + 4 + NONCE_PREFIX_SIZE
+
+
+def container_encrypt(src: BinaryIO, dst: BinaryIO, pwd: str, i: int = 100_000,
+                      chunk_size: int = CHUNK_SIZE, workers: int = None) -> int:
+    """
+    Encrypt a file-like object into a seekable container
+    :param src: file-like object opened in binary mode to read the data from
+    :param dst: file-like object opened in binary mode to write the container to
+    :param pwd: str  password
+    :param i: int  iterations or KDF parameters (scrypt_params, calibrate_kdf) of the key derivation
+    :param chunk_size: int  plaintext bytes per chunk, the unit of random access
+    :param workers: int  encrypt chunks in a thread pool of this size, None or 1 to encrypt inline
+    :raises ValueError: if i is out of range, see pwd.check_kdf_params, or chunk_size is out of range
+    :return: int  amount of bytes written
+    """
+    check_kdf_params(i)
+    check_chunk_size(chunk_size)
+    zout = secrets.token_bytes(16)
+    prefix = secrets.token_bytes(NONCE_PREFIX_SIZE)
+    header = b'%b%b%b%b%b' % (MAGIC, zout, i.to_bytes(4, 'big'), chunk_size.to_bytes(4, 'big'), prefix)
+    chacha = ChaCha20Poly1305(derive_key(pwd, zout, i))
+
+    def encrypt(index: int, chunk: bytes, last: bool) -> bytes:
+        return chacha.encrypt(stream_nonce(prefix, index, last), chunk, header)
+
+    written = dst.write(header)
+    chunks = read_chunks(src, chunk_size)
+    current = next(chunks, b'')
+    if not workers or workers < 2:
+        index = 0
+        for following in chunks:
+            written += dst.write(encrypt(index, current, False))
+            current, index = following, index + 1
+        return written + dst.write(encrypt(index, current, True))
+
+    # keep a bounded batch of chunks in flight, results are written in order
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        batch, index = [], 0
+        for following in chunks:
+            batch.append(executor.submit(encrypt, index, current, False))
+            current, index = following, index + 1
+            if len(batch) >= workers * 4:
+                for future in batch:
+                    written += dst.write(future.result())
+                batch = []
+        batch.append(executor.submit(encrypt, index, current, True))
+        for future in batch:
+            written += dst.write(future.result())
+    return written
+
+
+class EncryptedContainer:
+    """
+    Random access to a container made by  container_encrypt
+    Only the chunks that overlap a requested range are read and decrypted.
+    """
+
+    def __init__(self, file: (str, BinaryIO), pwd: str, workers: int = None):
+        """
+        :param file: str or file-like object  path or seekable file opened in binary mode
+        :param pwd: str  password
+        :param workers: int  decrypt chunks in a thread pool of this size, None or 1 to decrypt inline
+        :raises ValueError: if the file is not a container, or its header is out of range
+        """
+        self._owns_file = isinstance(file, str)
+        self._file = open(os.path.realpath(file), 'rb') if self._owns_file else file
+        self._lock = threading.Lock()
+        try:
+            self._fileno = self._file.fileno() if hasattr(os, 'pread') else None
+        except (AttributeError, OSError):  # BytesIO and friends
+            self._fileno = None
+
+        try:
+            self._file.seek(0)
+            header = read_exact(self._file.read, HEADER_SIZE)
+            if len(header) != HEADER_SIZE or header[:len(MAGIC)] != MAGIC:
+                raise ValueError("Given file is not an encrypted container")
+            self._header = header
+            zout, _iter = header[4:20], header[20:24]
+            self.chunk_size = check_chunk_size(int.from_bytes(header[24:28], 'big'))
+            self._prefix = header[28:]
+            self._chacha = ChaCha20Poly1305(derive_key(pwd, zout, int.from_bytes(_iter, 'big')))
+        except BaseException:
+            if self._owns_file:
+                self._file.close()
+            raise
+
+        body = self._file.seek(0, os.SEEK_END) - HEADER_SIZE
+        stride = self.chunk_size + TAG_SIZE
+        self.chunk_count = max(1, -(-body // stride))
+        self.size = max(0, body - self.chunk_count * TAG_SIZE)
+        self.workers = workers if workers and workers > 1 else 1
+        self._executor = ThreadPoolExecutor(max_workers=workers) if self.workers > 1 else None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+    def close(self) -> None:
+        """ Stop the thread pool and close the file if it was opened by the container """
+        if self._executor is not None:
+            self._executor.shutdown()
+            self._executor = None
+        if self._owns_file:
+            self._file.close()
+
+    def _read_at(self, offset: int, size: int) -> bytes:
+        if self._fileno is not None:
+            return os.pread(self._fileno, size, offset)
+        with self._lock:
+            self._file.seek(offset)
+            return read_exact(self._file.read, size)
+
+    def read_chunk(self, index: int) -> bytes:
+        """
+        Read and decrypt one chunk
+        :param index: int  0 <= index < chunk_count
+        :raises IndexError: if index is out of range
+        :raises InvalidTag: if the password is wrong or the chunk is altered, moved or cut off
+        :return: bytes  the plaintext of the chunk
+        """
+        if not 0 <= index < self.chunk_count:
+            raise IndexError("chunk index out of range: {0}".format(index))
+        stride = self.chunk_size + TAG_SIZE
+        encrypted = self._read_at(HEADER_SIZE + index * stride, stride)
+        if len(encrypted) < TAG_SIZE:
+            raise InvalidTag("Container is truncated")
+        last = index == self.chunk_count - 1
+        return self._chacha.decrypt(stream_nonce(self._prefix, index, last), encrypted, self._header)
+
+    def iter_chunks(self, first: int = 0, stop: int = None) -> Iterator[bytes]:
+        """
+        Decrypt the chunks first up to stop in order, in parallel if the container has workers
+        :param first: int  index of the first chunk
+        :param stop: int  index after the last chunk, None for all chunks
+        :return: iterator of bytes
+        """
+        stop = self.chunk_count if stop is None else stop
+        if self._executor is None:
+            yield from map(self.read_chunk, range(first, stop))
+            return
+        window = self.workers * 4
+        for start in range(first, stop, window):
+            yield from self._executor.map(self.read_chunk, range(start, min(start + window, stop)))
+
+    def read_range(self, offset: int, length: int) -> bytes:
+        """
+        Read length bytes of plaintext starting at offset, only the touched chunks are decrypted
+        :param offset: int  plaintext offset
+        :param length: int  amount of bytes, less are returned if the range passes the end
+        :raises InvalidTag: if the password is wrong or a touched chunk is altered
+        :return: bytes
+        """
+        if offset < 0 or length < 0:
+            raise ValueError("offset and length must be positive")
+        end = min(offset + length, self.size)
+        if offset >= end:
+            return b''
+        first, stop = offset // self.chunk_size, (end - 1) // self.chunk_size + 1
+        data = b''.join(self.iter_chunks(first, stop))
+        start = offset - first * self.chunk_size
+        return data[start:start + end - offset]
+
+    def decrypt_to(self, dst: BinaryIO) -> int:
+        """
+        Decrypt the whole container into a file-like object
+        :param dst: file-like object opened in binary mode
+        :raises InvalidTag: if the password is wrong or the container is altered
+        :return: int  amount of bytes written
+        """
+        return sum(dst.write(chunk) for chunk in self.iter_chunks())
@@ -0,0 +1,61 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# aio_test.py
+
+import asyncio
+import threading
+import time
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+from cryptography.exceptions import InvalidKey
+from crypt import aio
+from crypt.rsa import get_private_key, verify_signed_message
+
+
+class AioTest(unittest.IsolatedAsyncioTestCase):
+
+    def tearDown(self):
+        aio.shutdown()
+
+    async def test_awaitable_functions(self):
+        """ the wrapped functions give the same results as the blocking ones """
+        self.assertFalse(hasattr(aio.pwd, 'pwd_encrypt_iter'))
+        self.assertEqual('pwd_encrypt', aio.pwd.pwd_encrypt.__name__)
+        token = await aio.pwd.pwd_encrypt(b'message', 'pwd', 1_000)
+        self.assertEqual(b'message', await aio.pwd.pwd_decrypt(token, 'pwd'))
+
+        private_key = get_private_key(key_size=2048)
+        signatures = await asyncio.gather(*(aio.rsa.sign_message(b'%d' % number, private_key) for number in range(4)))
+        self.assertTrue(all(verify_signed_message(signature, b'%d' % number, private_key.public_key())
+                            for number, signature in enumerate(signatures)))
+
+        private_key = await aio.ecc.get_private_key('X25519')
+        with self.assertRaises(InvalidKey):
+            await aio.ecc.sign_data(b'data', private_key)
+
+    async def test_concurrency_limit(self):
+        """ no more than  limit  calls run at once, the event loop stays free """
+        running, peak, lock = [0], [0], threading.Lock()
+
+        def work():
+            with lock:
+                running[0] += 1
+                peak[0] = max(peak[0], running[0])
+            time.sleep(0.02)
+            with lock:
+                running[0] -= 1
+
+        with ThreadPoolExecutor(max_workers=8) as executor:
+            aio.configure(executor, limit=2)
+            ticks = 0
+            calls = asyncio.gather(*(aio.run(work) for _ in range(6)))
+            while not calls.done():
+                ticks += 1
+                await asyncio.sleep(0.005)
+            await calls
+        self.assertEqual(2, peak[0])
+        self.assertGreater(ticks, 5)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,50 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# bench_test.py
+
+import os
+import unittest
+from tempfile import TemporaryDirectory
+from crypt.bench import *
+
+
+class BenchTest(unittest.TestCase):
+
+    def test_percentile(self):
+        """ nearest rank percentile """
+        samples = list(range(1, 101))
+        self.assertEqual(95, percentile(samples, 0.95))
+        self.assertEqual(50, percentile(samples, 0.50))
+        self.assertEqual(7, percentile([7], 0.95))
+
+    def test_measure(self):
+        """ every repetition is a sample, fast functions are looped """
+        calls = []
+        result = measure('append', lambda: calls.append(None), 64, warmup=1, repetitions=5, min_time=0.0005)
+        self.assertEqual(('append', 64, 5), result[:3])
+        self.assertGreater(result.loops, 1)
+        self.assertEqual(1 + 5 * result.loops, len(calls))
+        self.assertLessEqual(result.minimum, result.median)
+        self.assertLessEqual(result.median, result.p95)
+
+    def test_run_save_compare(self):
+        """ results survive a JSON round trip, a slower median is a regression """
+        cases = default_cases(sizes=(64,), rsa_key_size=1024, curve='X25519', iterations=1_000)
+        names = {case.name for case in cases}
+        self.assertIn('ecc.ecdh_hkdf', names)
+        self.assertNotIn('ecc.sign', names)
+        results = run(cases, warmup=1, repetitions=2, select='chacha20', min_time=0.0)
+        self.assertEqual({'ecc.chacha20_encrypt', 'ecc.chacha20_decrypt'}, {result.name for result in results})
+
+        with TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'bench.json')
+            save(results, path, {'repetitions': 2})
+            loaded = load(path)
+        self.assertEqual(sorted(results), sorted(loaded))
+        slower = [result._replace(median=result.median * 2) for result in loaded]
+        self.assertEqual([], compare(loaded, loaded))
+        self.assertEqual(2, len(compare(loaded, slower)))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,84 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# bulk_test.py
+
+import os
+import unittest
+from tempfile import TemporaryDirectory
+from crypt import bulk
+from crypt.bulk import *
+
+
+class BulkTest(unittest.TestCase):
+
+    iterations = 1_000  # keep the key derivation cheap in tests
+
+    def setUp(self) -> None:
+        self.directory = TemporaryDirectory()
+        self.source = os.path.join(self.directory.name, 'source')
+        self.files = {
+            'a.txt': b'a' * 10,
+            os.path.join('sub', 'b.bin'): os.urandom(5_000),
+            os.path.join('sub', 'deeper', 'empty'): b'',
+        }
+        for path, data in self.files.items():
+            os.makedirs(os.path.dirname(os.path.join(self.source, path)), exist_ok=True)
+            with open(os.path.join(self.source, path), 'wb') as file:
+                file.write(data)
+
+    def tearDown(self) -> None:
+        self.directory.cleanup()
+
+    def round_trip(self, per_file_salt: bool, workers: int) -> None:
+        encrypted = os.path.join(self.directory.name, 'encrypted')
+        decrypted = os.path.join(self.directory.name, 'decrypted')
+        report = encrypt_tree(self.source, encrypted, 'pwd', self.iterations, per_file_salt, workers, 1_024)
+        self.assertEqual(sorted(self.files), [result.path for result in report.results])
+        self.assertEqual(sum(map(len, self.files.values())), report.size)
+        self.assertEqual([], report.errors)
+
+        report = decrypt_tree(encrypted, decrypted, 'pwd', workers)
+        self.assertEqual([path + SUFFIX for path in sorted(self.files)], [result.path for result in report.results])
+        self.assertEqual([], report.errors)
+        for path, data in self.files.items():
+            with open(os.path.join(decrypted, path), 'rb') as file:
+                self.assertEqual(data, file.read())
+
+    def test_batch_key_inline(self):
+        """ one key for the whole batch, without a process pool """
+        self.round_trip(per_file_salt=False, workers=1)
+
+    def test_per_file_salt_process_pool(self):
+        """ a salt and key per file, spread over a process pool """
+        self.round_trip(per_file_salt=True, workers=2)
+
+    def test_per_file_salt_is_default(self):
+        """ every file gets its own salt unless a shared salt is asked for """
+        encrypted = os.path.join(self.directory.name, 'encrypted')
+        encrypt_tree(self.source, encrypted, 'pwd', self.iterations, workers=1)
+        salts = set()
+        for path in self.files:
+            with open(os.path.join(encrypted, path + SUFFIX), 'rb') as file:
+                salts.add(file.read(16))
+        self.assertEqual(len(self.files), len(salts))
+
+    def test_errors_are_reported_per_file(self):
+        """ a broken file is reported and the other files are still decrypted """
+        encrypted = os.path.join(self.directory.name, 'encrypted')
+        decrypted = os.path.join(self.directory.name, 'decrypted')
+        encrypt_tree(self.source, encrypted, 'pwd', self.iterations, workers=1)
+        with open(os.path.join(encrypted, 'a.txt' + SUFFIX), 'r+b') as file:
+            file.seek(-1, os.SEEK_END)
+            file.write(b'\x00')
+        with open(os.path.join(encrypted, 'short' + SUFFIX), 'wb') as file:
+            file.write(b'short')
+
+        report = decrypt_tree(encrypted, decrypted, 'pwd', workers=1)
+        self.assertEqual(['a.txt' + SUFFIX, 'short' + SUFFIX], [result.path for result in report.errors])
+        self.assertEqual(0, len(bulk._worker_keys))  # an inline run wipes the derived keys
+        self.assertFalse(os.path.exists(os.path.join(decrypted, 'a.txt')))  # no partial output
+        self.assertTrue(os.path.exists(os.path.join(decrypted, 'sub', 'b.bin')))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,70 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# cache_test.py
+
+import time
+import unittest
+from crypt.cache import *
+
+
+class CacheTest(unittest.TestCase):
+
+    def test_least_recently_used_is_evicted(self):
+        """ the entry that was used the longest ago is evicted first """
+        cache = LRUCache(maxsize=2)
+        cache.put('a', 1)
+        cache.put('b', 2)
+        self.assertEqual(1, cache.get('a'))  # 'b' is now the least recently used
+        cache.put('c', 3)
+        self.assertNotIn('b', cache)
+        self.assertIsNone(cache.get('b'))
+        self.assertEqual((1, 1, 2, 2), tuple(cache.stats()))
+        self.assertEqual(0.5, cache.hit_rate)
+
+    def test_entries_expire(self):
+        """ entries older than the time to live are a miss """
+        cache = LRUCache(maxsize=2, ttl=0.01)
+        cache.put('a', 1)
+        time.sleep(0.02)
+        self.assertNotIn('a', cache)
+        self.assertEqual('default', cache.get('a', 'default'))
+        self.assertEqual(0, len(cache))
+
+    def test_evicted_secrets_are_wiped(self):
+        """ bytearray values are overwritten when they leave the cache """
+        cache = LRUCache(maxsize=1)
+        secret = bytearray(b'secret')
+        cache.put('a', secret)
+        self.assertTrue(cache.pop('a'))
+        self.assertFalse(cache.pop('a'))
+        self.assertEqual(bytes(6), bytes(secret))
+
+    def test_get_copy(self):
+        """ a copied secret survives the wipe of the cached bytearray """
+        cache = LRUCache(maxsize=1)
+        cache.put('a', bytearray(b'secret'))
+        cache.put('b', 1)
+        self.assertIsNone(cache.get_copy('a'))  # evicted by 'b'
+        cache.put('a', bytearray(b'secret'))
+        copy = cache.get_copy('a')
+        cache.clear()
+        self.assertEqual(b'secret', copy)
+        self.assertIsInstance(copy, bytes)
+        self.assertEqual('default', cache.get_copy('a', 'default'))
+
+    def test_pop_matching(self):
+        """ only the matching keys are evicted """
+        cache = LRUCache(maxsize=4)
+        for key in (('a', 1), ('a', 2), ('b', 1)):
+            cache.put(key, bytearray(b'secret'))
+        self.assertEqual(2, cache.pop_matching(lambda key: key[0] == 'a'))
+        self.assertEqual([('b', 1)], [key for key in (('a', 1), ('a', 2), ('b', 1)) if key in cache])
+
+    def test_hash_key(self):
+        """ parts can't run into each other """
+        self.assertEqual(hash_key(b'ab', b'c', 1), hash_key(b'ab', b'c', 1))
+        self.assertNotEqual(hash_key(b'ab', b'c'), hash_key(b'a', b'bc'))
+
+
+if __name__ == '__main__':
+    unittest.main()
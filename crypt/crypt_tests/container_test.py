@@ -0,0 +1,95 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# container_test.py
+
+import io
+import os
+import unittest
+from unittest import mock
+from tempfile import TemporaryDirectory
+from cryptography.exceptions import InvalidTag
+from crypt.chunked import MAX_CHUNK_SIZE
+from crypt.container import *
+
+
+class ContainerTest(unittest.TestCase):
+
+    iterations = 1_000  # keep the key derivation cheap in tests
+
+    @classmethod
+    def setUpClass(cls) -> None:
+        cls.pwd = 'correct horse battery staple'
+        cls.data = os.urandom(10_000)
+        cls.container = io.BytesIO()
+        container_encrypt(io.BytesIO(cls.data), cls.container, cls.pwd, cls.iterations, chunk_size=1_000)
+
+    def test_read_range(self):
+        """ any range reads the same bytes as the plaintext, also across chunk borders and past the end """
+        with EncryptedContainer(self.container, self.pwd) as container:
+            self.assertEqual(len(self.data), container.size)
+            self.assertEqual(10, container.chunk_count)
+            for offset, length in ((0, 10), (995, 10), (1_000, 1_000), (2_500, 5_000), (9_990, 100), (10_000, 1)):
+                self.assertEqual(self.data[offset:offset + length], container.read_range(offset, length))
+
+    def test_parallel_encryption_decryption(self):
+        """ the thread pool gives the same result as the inline path """
+        with TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'data.pwc')
+            with open(path, 'wb') as dst:
+                container_encrypt(io.BytesIO(self.data), dst, self.pwd, self.iterations, 512, workers=4)
+            with EncryptedContainer(path, self.pwd, workers=4) as container:
+                self.assertEqual(self.data[3_000:7_777], container.read_range(3_000, 4_777))
+                dst = io.BytesIO()
+                self.assertEqual(len(self.data), container.decrypt_to(dst))
+                self.assertEqual(self.data, dst.getvalue())
+
+    def test_empty_container(self):
+        """ an empty container still holds an authenticated last chunk """
+        dst = io.BytesIO()
+        container_encrypt(io.BytesIO(), dst, self.pwd, self.iterations)
+        with EncryptedContainer(dst, self.pwd) as container:
+            self.assertEqual(0, container.size)
+            self.assertEqual(b'', container.read_chunk(0))
+
+    def test_container_is_authenticated(self):
+        """ altered chunks and a cut off tail are refused """
+        altered = bytearray(self.container.getvalue())
+        altered[HEADER_SIZE + 1_500] ^= 1  # in the second chunk
+        with EncryptedContainer(io.BytesIO(bytes(altered)), self.pwd) as container:
+            self.assertEqual(self.data[:100], container.read_range(0, 100))  # first chunk is untouched
+            with self.assertRaises(InvalidTag):
+                container.read_range(1_000, 10)
+
+        truncated = self.container.getvalue()[:HEADER_SIZE + 9 * 1_016]
+        with EncryptedContainer(io.BytesIO(truncated), self.pwd) as container:
+            with self.assertRaises(InvalidTag):  # chunk 8 was not encrypted as the last chunk
+                container.read_chunk(8)
+
+        with self.assertRaises(ValueError):
+            EncryptedContainer(io.BytesIO(b'not a container'), self.pwd)
+
+    def test_chunk_size_is_checked(self):
+        """ a chunk size of 0 or above MAX_CHUNK_SIZE is refused on write and in a header, the file is closed """
+        for chunk_size in (0, -1, MAX_CHUNK_SIZE + 1):
+            with self.assertRaises(ValueError):
+                container_encrypt(io.BytesIO(b'data'), io.BytesIO(), self.pwd, self.iterations, chunk_size)
+        with TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'data.pwc')
+            for chunk_size in (0, MAX_CHUNK_SIZE + 1):
+                header = self.container.getvalue()
+                with open(path, 'wb') as dst:
+                    dst.write(header[:24] + chunk_size.to_bytes(4, 'big') + header[28:])
+                files = []
+
+                def tracked_open(*args, **kwargs):
+                    files.append(open(*args, **kwargs))
+                    return files[-1]
+
+                with mock.patch('crypt.container.open', tracked_open, create=True):
+                    with self.assertRaises(ValueError):
+                        EncryptedContainer(path, self.pwd)
+                self.assertTrue(files[0].closed)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -2,11 +2,17 @@
 # -*- coding: utf-8 -*-
 # ecc_test.py
 
+import io
 import os
 import random
 import string
+import sys
+import threading
 import unittest
+from unittest import mock
+from concurrent.futures import ProcessPoolExecutor
 from tempfile import TemporaryDirectory
+from crypt.cache import key_file_cache
 from crypt.ecc import *
 
 
@@ -132,6 +138,247 @@ class RsaTest(unittest.TestCase):
         decrypted_by_bob = decrypt_with_derived_key(encrypted_by_alice, bob_derived_key)
         self.assertEqual(message_to_bob, decrypted_by_bob)
 
+    def test_cached_key_files(self):
+        """ cached reads parse a key file once and again after the file changed """
+        bob_private_path = os.path.join(self.bob_dir.name, 'private_key.pem')
+        bob_public_path = os.path.join(self.bob_dir.name, 'public_key.pem')
+        hits, misses = key_file_cache.hits, key_file_cache.misses
+        private_key = read_private_key(bob_private_path, self.bobs_pwd, cached=True)
+        self.assertIs(private_key, read_private_key(bob_private_path, self.bobs_pwd, cached=True))
+        public_key = read_public_key(bob_public_path, cached=True)
+        self.assertIs(public_key, read_public_key(bob_public_path, cached=True))
+        self.assertEqual((hits + 2, misses + 2), (key_file_cache.hits, key_file_cache.misses))
+
+        stat = os.stat(bob_public_path)
+        os.utime(bob_public_path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000))  # file changed
+        self.assertIsNot(public_key, read_public_key(bob_public_path, cached=True))
+        self.assertEqual(public_key.public_numbers(), read_public_key(bob_public_path, cached=True).public_numbers())
+
+    def test_sign_file(self):
+        """ files and pieces are signed incrementally, the signatures interoperate with sign_message """
+        data = os.urandom(300_000)
+        with TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'artifact.bin')
+            with open(path, 'wb') as open_file:
+                open_file.write(data)
+            signature = sign_file(path, self.bobs_private_key)
+            self.assertTrue(verify_signed_message(signature, data, self.bobs_public_key))
+            self.assertFalse(verify_file(signature, path, self.alices_public_key))
+            with open(path, 'rb') as open_file:
+                self.assertTrue(verify_file(sign_message(data, self.bobs_private_key), open_file, self.bobs_public_key))
+
+        pieces = [data[:1], data[1:100_000], data[100_000:]]
+        signature = sign_chunks(pieces, self.alices_private_key)
+        self.assertTrue(verify_chunks(signature, iter(pieces), self.alices_public_key))
+        self.assertTrue(verify_file(signature, io.BytesIO(data), self.alices_public_key))
+        self.assertFalse(verify_chunks(signature, pieces[:2], self.alices_public_key))
+
+    def test_batches(self):
+        """ batches return results in input order, in a thread pool, a process pool and inline """
+        messages = [b'message %d' % number for number in range(6)]
+        signatures = sign_many([(message, self.bobs_private_key) for message in messages])
+        items = [(signature, message, self.bobs_public_key) for signature, message in zip(signatures, messages)]
+        items[3] = (signatures[3], b'altered', self.bobs_public_key)
+        expected = [True, True, True, False, True, True]
+        self.assertEqual(expected, verify_many(items, workers=1))
+        self.assertEqual(expected, verify_many(items, workers=3))
+        with ProcessPoolExecutor(max_workers=2) as executor:
+            self.assertEqual(expected, verify_many(items, executor=executor))
+            signatures = sign_many([(message, self.alices_private_key) for message in messages], executor)
+            self.assertTrue(all(verify_signed_message(signature, message, self.alices_public_key)
+                                for signature, message in zip(signatures, messages)))
+        with self.assertRaises(InvalidKey):
+            verify_many([(signatures[0], messages[0], self.bobs_private_key)])
+
+        derived_key = get_derived_key(get_shared_key(self.alices_private_key, self.bobs_public_key))
+        encrypted = encrypt_many([(b'one', derived_key), (b'two', derived_key)])
+        self.assertEqual([b'one', b'two'], decrypt_many([(data, derived_key) for data in encrypted]))
+        items = [(encrypted[0], derived_key), (encrypted[1][:-1], derived_key)]
+        with self.assertRaises(InvalidTag):
+            decrypt_many(items, workers=2)
+        decrypted = decrypt_many(items, workers=2, return_exceptions=True)
+        self.assertEqual(b'one', decrypted[0])
+        self.assertIsInstance(decrypted[1], InvalidTag)
+
+    def test_aead_session(self):
+        """ frames decrypt in order or with gaps, altered and replayed frames are refused """
+        derived_key = get_derived_key(get_shared_key(self.alices_private_key, self.bobs_public_key))
+        alice, bob = AEADSession(derived_key, initiator=True), AEADSession(derived_key, initiator=False)
+        frames = [alice.encrypt(b'message %d' % number, b'header') for number in range(4)]
+        self.assertEqual(4, len(set(frame[AEADSession.SEQUENCE_SIZE:] for frame in frames)))
+        self.assertEqual(b'message 0', bob.decrypt(frames[0], b'header'))
+        self.assertEqual(b'message 2', bob.decrypt(frames[2], b'header'))
+        for replayed in (frames[0], frames[1], frames[2]):
+            with self.assertRaises(InvalidTag):
+                bob.decrypt(replayed, b'header')
+        with self.assertRaises(InvalidTag):
+            bob.decrypt(frames[3], b'other header')
+        self.assertEqual(b'message 3', bob.decrypt(frames[3], b'header'))
+        self.assertEqual(b'reply', alice.decrypt(bob.encrypt(b'reply')))
+        with self.assertRaises(InvalidTag):  # own frames use the other nonce prefix
+            alice.decrypt(alice.encrypt(b'echo'))
+        self.assertEqual({'derived_key_functions', 'aead_session'}, set(benchmark_aead_session(10)))
+
+    def test_cached_derived_key(self):
+        """ the derived key is cached per local key, peer and HKDF parameters """
+        derived_key_cache.clear()
+        hits = derived_key_cache.hits
+        expected = get_derived_key(get_shared_key(self.alices_private_key, self.bobs_public_key), b'info')
+        self.assertEqual(expected, get_cached_derived_key(self.alices_private_key, self.bobs_public_key, b'info'))
+        self.assertEqual(expected, get_cached_derived_key(self.alices_private_key, self.bobs_public_key, b'info'))
+        self.assertEqual(hits + 1, derived_key_cache.hits)
+        self.assertEqual(expected, get_cached_derived_key(self.bobs_private_key, self.alices_public_key, b'info'))
+        self.assertNotEqual(expected, get_cached_derived_key(self.alices_private_key, self.bobs_public_key, b'other'))
+        self.assertEqual(3, len(derived_key_cache))
+        self.assertEqual(2, evict_derived_keys(self.bobs_public_key))
+        self.assertEqual(1, evict_derived_keys())
+
+    def test_cached_derived_key_parameters(self):
+        """ bytearray info and salt are accepted, the fingerprint of a key object is computed once """
+        derived_key_cache.clear()
+        expected = get_derived_key(get_shared_key(self.alices_private_key, self.bobs_public_key), b'info', 32, b'salt')
+        with mock.patch('crypt.ecc.public_key_fingerprint', wraps=public_key_fingerprint) as fingerprint:
+            for _ in range(3):
+                self.assertEqual(expected, get_cached_derived_key(
+                    self.alices_private_key, self.bobs_public_key, bytearray(b'info'), salt=bytearray(b'salt')))
+            self.assertLessEqual(fingerprint.call_count, 2)
+        self.assertEqual(1, len(derived_key_cache))
+        self.assertEqual(1, evict_derived_keys(self.bobs_public_key, self.alices_private_key))
+
+    def test_cached_derived_key_eviction(self):
+        """ a key that is evicted by another thread is never returned wiped """
+        expected = get_derived_key(get_shared_key(self.alices_private_key, self.bobs_public_key), b'info')
+        done = threading.Event()
+
+        def evict():
+            while not done.is_set():
+                evict_derived_keys(self.bobs_public_key)
+
+        thread = threading.Thread(target=evict)
+        interval = sys.getswitchinterval()
+        sys.setswitchinterval(1e-6)  # switch threads as often as possible
+        thread.start()
+        try:
+            for _ in range(1_000):
+                derived_key = get_cached_derived_key(self.alices_private_key, self.bobs_public_key, b'info')
+                self.assertEqual(expected, derived_key)
+        finally:
+            done.set()
+            thread.join()
+            sys.setswitchinterval(interval)
+
+    def test_derived_keys(self):
+        """ one extract step, every key equals the key of get_derived_key with the same info """
+        shared_key = get_shared_key(self.alices_private_key, self.bobs_public_key)
+        infos = [b'channel %d' % index for index in range(20)]
+        keys = get_derived_keys(shared_key, infos, length=16, salt=b'salt')
+        self.assertEqual([get_derived_key(shared_key, info, 16, b'salt') for info in infos], keys)
+        self.assertEqual(20, len(set(keys)))
+        self.assertEqual([get_derived_key(shared_key, b'a', algorithm=hashes.SHA512())],
+                         get_derived_keys(bytearray(shared_key), [b'a'], algorithm=hashes.SHA512()))
+        self.assertEqual([], get_derived_keys(shared_key, []))
+
+    def test_edwards_curves(self):
+        """ X25519 and Ed25519 work behind the same functions, per call and per module """
+        alice, bob = get_private_key('X25519'), get_private_key('X25519')
+        shared_key = get_shared_key(alice, get_public_key(bob))
+        self.assertEqual(shared_key, get_shared_key(bob, get_public_key(alice)))
+        with self.assertRaises(InvalidKey):
+            sign_data(b'data', alice)
+        with self.assertRaises(InvalidKey):
+            get_shared_key(alice, self.bobs_public_key)
+
+        signing_key = get_private_key('Ed25519')
+        signature = sign_data(b'data', signing_key)
+        self.assertTrue(verify_signed_data(signature, b'data', get_public_key(signing_key)))
+        self.assertFalse(verify_signed_data(signature, b'other', get_public_key(signing_key)))
+        self.assertTrue(verify_chunks(sign_chunks([b'da', b'ta'], signing_key), [b'data'], signing_key.public_key()))
+        self.assertEqual([True], verify_many([(signature, b'data', signing_key.public_key())]))
+        with self.assertRaises(InvalidKey):
+            get_shared_key(signing_key, get_public_key(bob))
+
+        with TemporaryDirectory() as directory:
+            set_default_curve('Ed25519')
+            try:
+                private_key, public_key = generate_keys(directory, b'pwd')
+            finally:
+                set_default_curve('SECP521R1')
+            self.assertIsInstance(read_private_key(os.path.join(directory, 'private_key.pem'), b'pwd'),
+                                  type(private_key))
+        with self.assertRaises(ValueError):
+            set_default_curve('unknown')
+        table = benchmark_curves(('X25519', 'Ed25519'), duration=0.001)
+        self.assertEqual([None, None], [table[0]['sign'], table[1]['exchange']])
+        self.assertIn('| X25519 |', format_curve_table(table))
+
+    def test_seal_for_recipients(self):
+        """ every recipient opens the data, others and altered data are refused """
+        data = os.urandom(10_000)
+        sealed = seal_for_recipients(data, [self.alices_public_key, self.bobs_public_key, self.alices_public_key])
+        self.assertEqual(data, open_sealed(sealed, self.alices_private_key))
+        self.assertEqual(data, open_sealed(sealed, self.bobs_private_key))
+        with self.assertRaises(InvalidKey):
+            open_sealed(sealed, get_private_key())
+        altered = bytearray(sealed)
+        altered[-1] ^= 1
+        with self.assertRaises(InvalidTag):
+            open_sealed(bytes(altered), self.bobs_private_key)
+        x25519_public_key = get_private_key('X25519').public_key()
+        for recipients in ([self.bobs_public_key, x25519_public_key], [x25519_public_key, self.bobs_public_key],
+                           [self.bobs_public_key, get_private_key('SECP256R1').public_key()],
+                           [x25519_public_key, get_private_key('Ed25519').public_key()]):
+            with self.assertRaises(InvalidKey):
+                seal_for_recipients(data, recipients)
+
+        recipients = [get_private_key('X25519') for _ in range(20)]
+        sealed = seal_for_recipients(b'data', [private_key.public_key() for private_key in recipients])
+        self.assertTrue(all(open_sealed(sealed, private_key) == b'data' for private_key in recipients))
+
+    def test_der_raw_and_bulk_load(self):
+        """ DER and raw files load like PEM files, many files load at once with a report """
+        with TemporaryDirectory() as directory:
+            private_key, public_key = generate_keys(directory, name='der', encoding='der')
+            self.assertEqual(generate_public_bytes(public_key),
+                             generate_public_bytes(read_public_key(os.path.join(directory, 'der_public_key.der'))))
+            generate_keys(directory, name='raw', encoding='raw', curve='Ed25519')
+            raw_path = os.path.join(directory, 'raw_private_key.raw')
+            self.assertEqual(32, os.path.getsize(raw_path))
+            self.assertIsInstance(read_private_key(raw_path, curve='Ed25519', cached=True),
+                                  type(get_private_key('Ed25519')))
+            with self.assertRaises(ValueError):
+                generate_private_bytes(private_key, encoding='raw')
+
+            report = load_keys([os.path.join(directory, 'der_private_key.der'), raw_path])
+            self.assertEqual([os.path.join(directory, 'der_private_key.der')], list(report.keys))
+            self.assertEqual([raw_path], list(report.errors))
+            report = load_keys([os.path.join(directory, 'raw_public_key.raw')], private=False, curve='Ed25519')
+            self.assertEqual(1, len(report.keys))
+
+    def test_buffers_and_into(self):
+        """ bytes-like data is accepted, data is written into and read from caller buffers """
+        derived_key = bytearray(get_derived_key(get_shared_key(self.alices_private_key, self.bobs_public_key)))
+        packet = bytearray(os.urandom(1500))
+        payload = memoryview(packet)[20:1020]
+        encrypted = encrypt_with_derived_key(payload, memoryview(derived_key))
+        self.assertEqual(encrypted, encrypt_with_derived_key(bytes(payload), bytes(derived_key)))
+
+        buffer, plain = bytearray(2048), bytearray(1000)
+        size = encrypt_with_derived_key_into(buffer, payload, derived_key)
+        self.assertEqual(encrypted, buffer[:size])
+        self.assertEqual(1000, decrypt_with_derived_key_into(plain, memoryview(buffer)[:size], derived_key))
+        self.assertEqual(payload, plain)
+        with self.assertRaises(ValueError):
+            encrypt_with_derived_key_into(bytearray(1000), payload, derived_key)
+
+        sender, receiver = AEADSession(bytes(derived_key)), AEADSession(bytes(derived_key), initiator=False)
+        for _ in range(3):
+            size = sender.encrypt_into(buffer, payload, b'header')
+            self.assertEqual(1000 + 24, size)
+            self.assertEqual(1000, receiver.decrypt_into(plain, memoryview(buffer)[:size], b'header'))
+            self.assertEqual(payload, plain)
+        with self.assertRaises(InvalidTag):
+            receiver.decrypt_into(plain, memoryview(buffer)[:size], b'header')
+
 
 if __name__ == '__main__':
     print("start\n")
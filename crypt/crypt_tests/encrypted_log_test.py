@@ -0,0 +1,124 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# encrypted_log_test.py
+
+import os
+import threading
+import unittest
+from unittest import mock
+from tempfile import TemporaryDirectory
+from cryptography.exceptions import InvalidTag
+from crypt.chunked import TAG_SIZE
+from crypt.encrypted_log import *
+
+
+class EncryptedLogTest(unittest.TestCase):
+
+    iterations = 1_000  # keep the key derivation cheap in tests
+
+    def setUp(self) -> None:
+        self.directory = TemporaryDirectory()
+        self.path = os.path.join(self.directory.name, 'events.log')
+        self.pwd = 'correct horse battery staple'
+
+    def tearDown(self) -> None:
+        self.directory.cleanup()
+
+    def test_append_and_seek(self):
+        """ records come back by index from the sparse offset index and in order """
+        records = [os.urandom(index % 50) for index in range(200)]
+        with EncryptedLog(self.path, self.pwd, i=self.iterations, index_interval=16) as log:
+            self.assertEqual(0, log.append(records[0]))
+            self.assertEqual(199, log.extend(records[1:]))
+            self.assertEqual(13, len(log._index))
+        with EncryptedLog(self.path, self.pwd, mode='r', index_interval=16) as log:
+            self.assertEqual(200, len(log))
+            self.assertEqual(records, list(log))
+            for index in (0, 15, 16, 17, 100, 199, -1, -200):
+                self.assertEqual(records[index], log[index])
+            self.assertEqual(records[190:], list(log.records(190)))
+            self.assertEqual(records[-3:], list(log.records(-3)))
+            with self.assertRaises(IndexError):
+                log.read(200)
+            with self.assertRaises(ValueError):
+                log.append(b'read-only')
+
+    def test_password_and_tampering(self):
+        """ a wrong password fails on open, an altered record fails when it is read """
+        with EncryptedLog(self.path, self.pwd, i=self.iterations) as log:
+            log.extend([b'first', b'second', b'third'])
+        with self.assertRaises(InvalidTag):
+            EncryptedLog(self.path, 'wrong password')
+        with open(self.path, 'r+b') as open_file:
+            open_file.seek(-3, os.SEEK_END)
+            open_file.write(b'xxx')
+        with EncryptedLog(self.path, self.pwd, mode='r') as log:
+            self.assertEqual(b'second', log[1])
+            with self.assertRaises(InvalidTag):
+                log.read(2)
+        with open(self.path, 'wb') as open_file:
+            open_file.write(b'not a log')
+        with self.assertRaises(ValueError):
+            EncryptedLog(self.path, self.pwd)
+
+    def test_torn_record(self):
+        """ a torn record is cut off and its slot number is not used again """
+        with EncryptedLog(self.path, self.pwd, i=self.iterations) as log:
+            log.extend([b'first', b'second'])
+        with open(self.path, 'ab') as open_file:
+            open_file.write(b'\x00\x00\x01\x00torn')
+        with EncryptedLog(self.path, self.pwd, mode='r') as log:
+            self.assertEqual([b'first', b'second'], list(log))
+        with EncryptedLog(self.path, self.pwd) as log:
+            self.assertEqual(3, log._slots)
+            self.assertEqual(2, log.append(b'third'))
+        with EncryptedLog(self.path, self.pwd, mode='r') as log:
+            self.assertEqual([b'first', b'second', b'third'], list(log))
+            self.assertEqual(b'third', log[2])
+
+    def test_holes_are_authenticated(self):
+        """ a record can't be turned into a hole, an append that fails leaves no partial slot """
+        with EncryptedLog(self.path, self.pwd, i=self.iterations) as log:
+            self.assertEqual(-1, log.extend([]))
+            log.extend([b'first', b'second'])
+            size = os.path.getsize(self.path)
+            with mock.patch('os.write', side_effect=OSError(28, 'No space left on device')):
+                with self.assertRaises(OSError):
+                    log.append(b'third')
+            self.assertEqual(size, os.path.getsize(self.path))
+            self.assertEqual(1, log.extend([]))
+        with open(self.path, 'ab') as open_file:
+            open_file.write(b'\x00\x00\x01\x00torn')
+        with EncryptedLog(self.path, self.pwd) as log:  # the torn record becomes a sealed hole
+            self.assertEqual(2, log.append(b'third'))
+        with EncryptedLog(self.path, self.pwd, mode='r') as log:
+            self.assertEqual([b'first', b'second', b'third'], list(log))
+
+        with open(self.path, 'r+b') as open_file:  # turn 'first' into a hole of 16 bytes and a broken slot
+            open_file.seek(LOG_HEADER_SIZE + TAG_SIZE)
+            open_file.write(LENGTH.pack(0))
+        with self.assertRaises(InvalidTag):
+            EncryptedLog(self.path, self.pwd, mode='r')
+
+    def test_tail(self):
+        """ a reader follows the records a writer appends """
+        with EncryptedLog(self.path, self.pwd, i=self.iterations) as log:
+            log.append(b'old')
+            reader = EncryptedLog(self.path, self.pwd, mode='r')
+
+            def write():
+                for index in range(5):
+                    log.append(b'new %d' % index)
+
+            thread = threading.Thread(target=write)
+            followed = reader.tail(start=1, poll=0.01, timeout=1.0)
+            thread.start()
+            self.assertEqual([b'new %d' % index for index in range(5)], [next(followed) for _ in range(5)])
+            thread.join()
+            self.assertEqual(6, len(list(reader.tail(start=0, timeout=0))))
+            self.assertEqual([], list(reader.tail(timeout=0)))
+            reader.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
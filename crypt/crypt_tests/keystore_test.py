@@ -0,0 +1,108 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# keystore_test.py
+
+import os
+import unittest
+from unittest import mock
+from tempfile import TemporaryDirectory
+from crypt import ecc, rsa
+from crypt.keyfile import public_bytes
+from crypt.keystore import *
+
+
+class KeyStoreTest(unittest.TestCase):
+
+    def setUp(self) -> None:
+        self.directory = TemporaryDirectory()
+        self.path = os.path.join(self.directory.name, 'keys.pks')
+
+    def tearDown(self) -> None:
+        self.directory.cleanup()
+
+    @staticmethod
+    def public_der(key) -> bytes:
+        return public_bytes(key if hasattr(key, 'public_bytes') else key.public_key(), 'der')
+
+    def test_lookup_by_id_and_fingerprint(self):
+        """ keys come back by key id and fingerprint, from the cache the second time """
+        keys = {'key%d' % index: ecc.get_private_key('X25519') for index in range(50)}
+        rsa_key = rsa.get_private_key(key_size=2048)
+        with KeyStore(self.path) as store:
+            fingerprints = store.add_public_keys({key_id: key.public_key() for key_id, key in keys.items()})
+            self.assertEqual(fingerprints['key0'], store.add_public_key('key0', keys['key0'].public_key()))
+            store.add_private_key('rsa', rsa_key, b'pwd')
+            self.assertEqual(51, len(store))
+            self.assertIn('rsa', store)
+            public_key = store.get_public_key('key7')
+            self.assertEqual(self.public_der(keys['key7']), self.public_der(public_key))
+            self.assertIs(public_key, store.get_public_key(fingerprint=fingerprints['key7']))
+            self.assertEqual(self.public_der(rsa_key), self.public_der(store.get_private_key('rsa', b'pwd')))
+            with self.assertRaises(ValueError):
+                store.get_private_key('rsa', b'wrong')
+            with self.assertRaises(TypeError):  # stored encrypted, it can't be loaded without the password
+                store.get_private_key('rsa')
+            for pwd in (None, b''):
+                with self.assertRaises(ValueError):
+                    store.add_private_key('plain', rsa_key, pwd)
+            self.assertNotIn('plain', store)
+            with self.assertRaises(KeyError):
+                store.get_public_key('rsa')
+
+        with KeyStore(self.path) as store:  # the index is rebuilt from the file
+            self.assertEqual(list(keys) + ['rsa'], store.key_ids())
+            self.assertEqual(self.public_der(keys['key49']), self.public_der(store.get_public_key('key49')))
+
+    def test_replace_and_refresh(self):
+        """ the newest record of a key id wins, records appended by another handle are found """
+        first, second = ecc.get_private_key('Ed25519'), ecc.get_private_key('Ed25519')
+        with KeyStore(self.path) as store, KeyStore(self.path) as other:
+            store.add_public_key('key', first.public_key())
+            self.assertEqual(self.public_der(first), self.public_der(other.get_public_key('key')))
+            store.add_public_key('key', second.public_key())
+            self.assertEqual(self.public_der(first), self.public_der(other.get_public_key('key')))  # not refreshed
+            self.assertEqual(1, other.refresh())
+            self.assertEqual(self.public_der(second), self.public_der(other.get_public_key('key')))
+            self.assertEqual(self.public_der(second), self.public_der(store.get_public_key('key')))
+
+    def test_torn_write_is_cut_off(self):
+        """ a record that was only partly written is ignored and removed by the next append """
+        with KeyStore(self.path) as store:
+            store.add_public_key('complete', ecc.get_private_key().public_key())
+        size = os.path.getsize(self.path)
+        with open(self.path, 'ab') as open_file:
+            open_file.write(b'\x00' * 20)
+        with KeyStore(self.path) as store:
+            self.assertEqual(['complete'], store.key_ids())
+            self.assertEqual(size, os.path.getsize(self.path))
+
+        with open(self.path, 'wb') as open_file:
+            open_file.write(b'not a keystore')
+        with self.assertRaises(ValueError):
+            KeyStore(self.path)
+
+    def test_short_and_failed_writes(self):
+        """ short writes are retried, a failed write stores none of the records """
+        write = os.write
+        with KeyStore(self.path) as store:
+            with mock.patch('os.write', lambda fd, data: write(fd, data[:7])):
+                store.add_public_key('short', ecc.get_private_key().public_key())
+            size = os.path.getsize(self.path)
+
+            def fail(fd, data):
+                write(fd, data[:len(data) // 2])
+                raise OSError(28, 'No space left on device')
+
+            with mock.patch('os.write', fail):
+                with self.assertRaises(OSError):
+                    store.add_public_keys({'a': ecc.get_private_key().public_key(),
+                                           'b': ecc.get_private_key().public_key()})
+            self.assertEqual(size, os.path.getsize(self.path))
+            self.assertEqual(['short'], store.key_ids())
+        with KeyStore(self.path) as store:
+            self.assertEqual(['short'], store.key_ids())
+            self.assertIsNotNone(store.get_public_key('short'))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,77 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# merkle_test.py
+
+import io
+import os
+import unittest
+from tempfile import TemporaryDirectory
+from crypt import ecc, rsa
+from crypt.merkle import *
+
+
+class MerkleTest(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls) -> None:
+        cls.keys = [ecc.get_private_key('SECP256R1'), ecc.get_private_key('Ed25519'),
+                    rsa.get_private_key(key_size=2048)]
+
+    def test_verify_every_chunk(self):
+        """ every chunk verifies on its own for trees with an odd and even amount of leaves """
+        for private_key in self.keys:
+            public_key = private_key.public_key()
+            for count in (1, 2, 3, 5, 8):
+                data = os.urandom(100 * count - 7)
+                proof = sign_tree(io.BytesIO(data), private_key, chunk_size=100, workers=3)
+                self.assertEqual(HEADER.size + 32 * sum(level_sizes(count)), len(proof) - HEADER.unpack_from(proof)[4])
+                self.assertTrue(verify_tree(proof, io.BytesIO(data), public_key))
+                for index in range(count):
+                    chunk = data[index * 100:(index + 1) * 100]
+                    self.assertTrue(verify_chunk(proof, index, chunk, public_key), (count, index))
+                    self.assertFalse(verify_chunk(proof, index, bytes([chunk[0] ^ 1]) + chunk[1:], public_key))
+                self.assertFalse(verify_chunk(proof, count, b'', public_key))
+                self.assertFalse(verify_tree(proof, io.BytesIO(data + b'x'), public_key))
+
+    def test_files_and_keys(self):
+        """ memory-mapped files, proofs on disk, empty data and the wrong key """
+        private_key = ecc.get_private_key('SECP256R1')
+        with TemporaryDirectory() as directory:
+            data_path, proof_path = os.path.join(directory, 'data'), os.path.join(directory, 'data.proof')
+            data = os.urandom(10_000)
+            with open(data_path, 'wb') as open_file:
+                open_file.write(data)
+            proof = sign_tree(data_path, private_key, chunk_size=1024)
+            self.assertEqual(hash_chunks(io.BytesIO(data), 1024, workers=1), hash_chunks(data_path, 1024))
+            with open(proof_path, 'wb') as open_file:
+                open_file.write(proof)
+            self.assertTrue(verify_tree(proof_path, data_path, private_key.public_key()))
+            self.assertTrue(verify_chunk(proof_path, 9, data[9216:], private_key.public_key()))
+            self.assertFalse(verify_chunk(proof, 9, data[9216:], ecc.get_private_key('SECP256R1').public_key()))
+
+            open(data_path, 'wb').close()
+            proof = sign_tree(data_path, private_key)
+            self.assertTrue(verify_tree(proof, data_path, private_key.public_key()))
+            self.assertTrue(verify_chunk(proof, 0, b'', private_key.public_key()))
+
+        with self.assertRaises(ValueError):
+            verify_chunk(b'not a proof', 0, b'', private_key.public_key())
+
+    def test_chunk_size_is_checked(self):
+        """ a chunk size below 1, also one from a crafted proof, is refused """
+        private_key = ecc.get_private_key('Ed25519')
+        for chunk_size in (0, -1):
+            with self.assertRaises(ValueError):
+                sign_tree(io.BytesIO(b'data'), private_key, chunk_size=chunk_size)
+            with self.assertRaises(ValueError):
+                hash_chunks(io.BytesIO(b'data'), chunk_size)
+        proof = sign_tree(io.BytesIO(b'data'), private_key, chunk_size=2)
+        crafted = proof[:4] + bytes(4) + proof[8:]
+        with self.assertRaises(ValueError):
+            verify_chunk(crafted, 1, b'ta', private_key.public_key())
+        with self.assertRaises(ValueError):
+            verify_tree(crafted, io.BytesIO(b'data'), private_key.public_key())
+
+
+if __name__ == '__main__':
+    unittest.main()
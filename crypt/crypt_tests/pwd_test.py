@@ -0,0 +1,245 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# pwd_test.py
+
+import io
+import os
+import sys
+import threading
+import unittest
+from cryptography.exceptions import InvalidTag
+from cryptography.fernet import InvalidToken
+from crypt import pwd as pwd_module
+from crypt.chunked import MAX_CHUNK_SIZE, IterableReader
+from crypt.pwd import *
+
+
+class PwdTest(unittest.TestCase):
+
+    iterations = 1_000  # keep the key derivation cheap in tests
+
+    def setUp(self) -> None:
+        self.pwd = 'correct horse battery staple'
+        self.message = os.urandom(10_000)
+
+    def test_token_encryption_decryption(self):
+        """ the base64 token made by pwd_encrypt can be decrypted with the same password """
+        token = pwd_encrypt(self.message, self.pwd, self.iterations)
+        self.assertEqual(self.message, pwd_decrypt(token, self.pwd))
+
+    def test_raw_token_encryption_decryption(self):
+        """ the binary token skips base64, pwd_decrypt detects the format """
+        token = pwd_encrypt(self.message, self.pwd, self.iterations, raw=True)
+        self.assertEqual(RAW_VERSION, token[:1])
+        self.assertEqual(RAW_HEADER_SIZE + 12 + len(self.message) + 16, len(token))
+        self.assertLess(len(token), len(pwd_encrypt(self.message, self.pwd, self.iterations)))
+        self.assertEqual(self.message, pwd_decrypt(token, self.pwd))
+        self.assertEqual(self.message, pwd_decrypt(bytearray(token), self.pwd))
+
+        altered = bytearray(token)
+        altered[5] ^= 1  # the salt in the header is authenticated too
+        with self.assertRaises(InvalidTag):
+            pwd_decrypt(bytes(altered), self.pwd)
+        with self.assertRaises(InvalidTag):
+            pwd_decrypt(token, 'wrong password')
+
+    def test_scrypt_tokens(self):
+        """ the KDF identifier travels in the header, PBKDF2 headers are plain iterations """
+        params = scrypt_params(n=2 ** 10, r=8, p=1)
+        self.assertEqual(KDF_SCRYPT, params >> 24)
+        for raw in (False, True):
+            token = pwd_encrypt(self.message, self.pwd, params, raw=raw)
+            self.assertEqual(self.message, pwd_decrypt(token, self.pwd))
+        encrypted = b''.join(pwd_encrypt_iter([self.message], self.pwd, params))
+        self.assertEqual(params, int.from_bytes(encrypted[16:20], 'big'))
+        self.assertEqual(self.message, b''.join(pwd_decrypt_iter([encrypted], self.pwd)))
+
+        with self.assertRaises(ValueError):
+            scrypt_params(n=1_000)
+        with self.assertRaises(ValueError):
+            scrypt_params(n=2 ** (MAX_SCRYPT_LOG_N + 1))
+        for i in (0, MAX_PBKDF2_ITERATIONS + 1, 20_000_000, int(params)):  # plain ints above 2 ** 24 are refused
+            with self.assertRaises(ValueError):
+                pwd_encrypt(self.message, self.pwd, i)
+            with self.assertRaises(ValueError):
+                pwd_encrypt_iter([], self.pwd, i)
+        self.assertEqual(params, check_kdf_params(ScryptParams(int(params))))
+
+    def test_kdf_limits(self):
+        """ a forged header that asks for a huge key derivation is refused before the KDF runs """
+        token = pwd_encrypt(self.message, self.pwd, self.iterations, raw=True)
+        encrypted = b''.join(pwd_encrypt_iter([self.message], self.pwd, self.iterations))
+        for i in (ScryptParams(KDF_SCRYPT << 24 | MAX_SCRYPT_LOG_N << 16 | 255 << 8 | 1), MAX_PBKDF2_ITERATIONS):
+            header = i.to_bytes(4, 'big')
+            with self.assertRaises(ValueError):
+                pwd_decrypt(token[:17] + header + token[21:], self.pwd)
+            with self.assertRaises(ValueError):
+                b''.join(pwd_decrypt_iter([encrypted[:16] + header + encrypted[20:]], self.pwd))
+            with self.assertRaises(ValueError):
+                pwd_encrypt(self.message, self.pwd, i)
+        try:
+            set_kdf_limits(max_iterations=self.iterations - 1)
+            with self.assertRaises(ValueError):
+                pwd_decrypt(token, self.pwd)
+            set_kdf_limits(max_memory=128 * 8 * 2 ** 10 - 1)
+            with self.assertRaises(ValueError):
+                pwd_encrypt(self.message, self.pwd, scrypt_params(n=2 ** 10))
+        finally:
+            set_kdf_limits()
+        self.assertEqual(self.message, pwd_decrypt(token, self.pwd))
+
+    def test_calibrate_kdf(self):
+        """ calibration returns parameters that the encrypt functions accept """
+        iterations = calibrate_kdf(target=0.001, rounds=1)
+        self.assertEqual(KDF_PBKDF2, iterations >> 24)
+        self.assertGreaterEqual(iterations, 1_000)
+        params = calibrate_kdf(target=0.001, kdf=KDF_SCRYPT, rounds=1)
+        self.assertEqual(KDF_SCRYPT, params >> 24)
+        token = pwd_encrypt(self.message, self.pwd, params, raw=True)
+        self.assertEqual(self.message, pwd_decrypt(token, self.pwd))
+
+    def test_decrypt_many(self):
+        """ tokens are grouped per header, results come back in order with errors per item """
+        shared = pwd_encrypt_many([b'0', b'1', b'2'], self.pwd, self.iterations)
+        shared += pwd_encrypt_many([b'3'], self.pwd, self.iterations, raw=True)
+        other = pwd_encrypt(b'other', self.pwd, self.iterations)
+        altered = shared[0][:-2] + (b'AA' if shared[0][-2:] != b'AA' else b'BB')
+        tokens = shared[:2] + [b'\x01 too short', other, altered] + shared[2:]
+
+        for workers in (None, 2):
+            results = pwd_decrypt_many(tokens, self.pwd, workers)
+            self.assertEqual([b'0', b'1'], results[:2])
+            self.assertIsInstance(results[2], InvalidTag)
+            self.assertEqual(b'other', results[3])
+            self.assertIsInstance(results[4], InvalidToken)
+            self.assertEqual([b'2', b'3'], results[5:])
+
+        cache = enable_key_cache()
+        try:
+            pwd_decrypt_many(tokens, self.pwd)
+        finally:
+            disable_key_cache()
+        self.assertEqual(3, cache.misses)  # one derivation per distinct header
+
+    def test_stream_encryption_decryption(self):
+        """ a stream is encrypted in chunks and decrypted to the original data """
+        src, encrypted, dst = io.BytesIO(self.message), io.BytesIO(), io.BytesIO()
+        written = pwd_encrypt_stream(src, encrypted, self.pwd, self.iterations, chunk_size=1_000)
+        self.assertEqual(len(encrypted.getvalue()), written)
+        encrypted.seek(0)
+        self.assertEqual(len(self.message), pwd_decrypt_stream(encrypted, dst, self.pwd))
+        self.assertEqual(self.message, dst.getvalue())
+
+    def test_iter_encryption_decryption(self):
+        """ iterator variants accept pieces of any size, including an empty stream """
+        pieces = [self.message[:3], self.message[3:5_000], b'', self.message[5_000:]]
+        encrypted = b''.join(pwd_encrypt_iter(pieces, self.pwd, self.iterations, chunk_size=1_024))
+        # feed the encrypted stream back in odd sized pieces
+        odd_pieces = (encrypted[start:start + 333] for start in range(0, len(encrypted), 333))
+        self.assertEqual(self.message, b''.join(pwd_decrypt_iter(odd_pieces, self.pwd)))
+
+        encrypted = b''.join(pwd_encrypt_iter([], self.pwd, self.iterations))
+        self.assertEqual(b'', b''.join(pwd_decrypt_iter([encrypted], self.pwd)))
+
+        reader = IterableReader([b'ab', b'', b'cdef', b'g'])
+        self.assertEqual([b'a', b'bcd', b'', b'efg', b''], [reader.read(size) for size in (1, 3, 0, 5, 1)])
+
+    def test_stream_is_authenticated(self):
+        """ wrong passwords, altered, truncated or reordered streams are refused """
+        encrypted = b''.join(pwd_encrypt_iter([self.message], self.pwd, self.iterations, chunk_size=1_000))
+        with self.assertRaises(InvalidTag):
+            b''.join(pwd_decrypt_iter([encrypted], 'wrong password'))
+
+        altered = bytearray(encrypted)
+        altered[-1] ^= 1
+        with self.assertRaises(InvalidTag):
+            b''.join(pwd_decrypt_iter([bytes(altered)], self.pwd))
+
+        frame_size = 4 + 1_000 + 16
+        header_size = len(encrypted) - 10 * frame_size
+        truncated = encrypted[:-frame_size]  # drop the last chunk
+        with self.assertRaises(InvalidTag):
+            b''.join(pwd_decrypt_iter([truncated], self.pwd))
+
+        header, frames = encrypted[:header_size], encrypted[header_size:]
+        swapped = header + frames[frame_size:2 * frame_size] + frames[:frame_size] + frames[2 * frame_size:]
+        with self.assertRaises(InvalidTag):
+            b''.join(pwd_decrypt_iter([swapped], self.pwd))
+
+        huge = header + b'\xff\xff\xff\xff' + frames[4:]  # a frame length of 4 GiB is refused before reading it
+        with self.assertRaises(InvalidTag):
+            b''.join(pwd_decrypt_iter([huge], self.pwd))
+        with self.assertRaises(ValueError):
+            pwd_encrypt_iter([], self.pwd, self.iterations, chunk_size=MAX_CHUNK_SIZE + 1)
+
+    def test_key_cache(self):
+        """ the opt-in key cache derives a key once per password, salt and iterations """
+        cache = enable_key_cache(maxsize=4, ttl=60)
+        try:
+            token = pwd_encrypt(self.message, self.pwd, self.iterations)  # miss, derives and caches
+            for _ in range(3):
+                self.assertEqual(self.message, pwd_decrypt(token, self.pwd))
+            self.assertEqual((3, 1, 1, 4), tuple(cache.stats()))
+
+            with self.assertRaises(InvalidToken):
+                pwd_decrypt(token, 'wrong password')  # a different password is a different entry
+            self.assertEqual(2, len(cache))
+
+            cached = next(iter(cache._entries.values()))[1]
+            cache.clear()
+            self.assertEqual(0, len(cache))
+            self.assertEqual(bytes(32), bytes(cached))  # the secret is wiped
+        finally:
+            disable_key_cache()
+        self.assertIsNone(pwd_module.key_cache)
+
+    def test_key_cache_eviction_while_decrypting(self):
+        """ keys that are wiped by another thread never reach a decryption """
+        cache = enable_key_cache(maxsize=1, ttl=60)
+        try:
+            token = pwd_encrypt(self.message, self.pwd, self.iterations)
+            done = threading.Event()
+
+            def evict():
+                while not done.is_set():
+                    cache.clear()
+
+            thread = threading.Thread(target=evict)
+            interval = sys.getswitchinterval()
+            sys.setswitchinterval(1e-6)  # switch threads as often as possible
+            thread.start()
+            try:
+                for _ in range(1_000):
+                    self.assertEqual(self.message, pwd_decrypt(token, self.pwd))
+                self.assertEqual([self.message] * 20, pwd_decrypt_many([token] * 20, self.pwd, workers=4))
+            finally:
+                done.set()
+                thread.join()
+                sys.setswitchinterval(interval)
+        finally:
+            disable_key_cache()
+
+    def test_buffers_and_into(self):
+        """ bytes-like messages are accepted, raw tokens are written into and read from caller buffers """
+        message = bytearray(os.urandom(1000))
+        window = memoryview(message)[100:600]
+        self.assertEqual(bytes(window), pwd_decrypt(pwd_encrypt(window, 'pwd', self.iterations), 'pwd'))
+        self.assertEqual(bytes(window), pwd_decrypt(pwd_encrypt(window, 'pwd', self.iterations, raw=True), 'pwd'))
+
+        buffer = bytearray(2048)
+        size = pwd_encrypt_into(buffer, window, 'pwd', self.iterations)
+        self.assertEqual(len(window) + RAW_OVERHEAD, size)
+        token = memoryview(buffer)[:size]
+        self.assertEqual(bytes(window), pwd_decrypt(token, 'pwd'))
+        plain = bytearray(len(window))
+        self.assertEqual(len(window), pwd_decrypt_into(plain, token, 'pwd'))
+        self.assertEqual(window, plain)
+        self.assertEqual(3, pwd_decrypt_into(plain, pwd_encrypt(b'abc', 'pwd', self.iterations), 'pwd'))
+        with self.assertRaises(ValueError):
+            pwd_encrypt_into(bytearray(10), window, 'pwd', self.iterations)
+        with self.assertRaises(ValueError):
+            pwd_decrypt_into(bytearray(10), token, 'pwd')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -2,11 +2,16 @@
 # -*- coding: utf-8 -*-
 # rsa_test.py
 
+import io
 import os
 import random
 import string
+import threading
+import time
 import unittest
+from concurrent.futures import Executor, Future, ProcessPoolExecutor
 from tempfile import TemporaryDirectory
+from crypt.cache import key_file_cache
 from crypt.rsa import *
 
 
@@ -133,6 +138,165 @@ class RsaTest(unittest.TestCase):
         decrypted_by_bob = rsa_decrypt(encrypted_by_john, self.bobs_private_key)
         self.assertEqual(message_to_bob, decrypted_by_bob)  # bob now thinks alice says goodbye
 
+    def test_seal_open(self):
+        """
+        bob seals a message larger than RSA-OAEP can encrypt for alice
+        only alice can open it, altering it is detected
+        """
+        message_to_alice = os.urandom(100_000)
+        sealed_by_bob = rsa_seal(message_to_alice, self.alices_public_key)
+        self.assertEqual(message_to_alice, rsa_open(sealed_by_bob, self.alices_private_key))
+        with self.assertRaises(ValueError):  # bob's key doesn't unwrap the content key
+            rsa_open(sealed_by_bob, self.bobs_private_key)
+        altered = bytearray(sealed_by_bob)
+        altered[-1] ^= 1
+        with self.assertRaises(InvalidTag):
+            rsa_open(bytes(altered), self.alices_private_key)
+
+        # the same as a stream
+        sealed_stream, opened_stream = io.BytesIO(), io.BytesIO()
+        rsa_seal_stream(io.BytesIO(message_to_alice), sealed_stream, self.alices_public_key, chunk_size=4_096)
+        sealed_stream.seek(0)
+        rsa_open_stream(sealed_stream, opened_stream, self.alices_private_key)
+        self.assertEqual(message_to_alice, opened_stream.getvalue())
+
+    def test_key_pool(self):
+        """ keys are taken from the pool once it is filled, an empty pool falls back to inline generation """
+        with KeyPool(size=2, key_size=1024, workers=1) as pool, TemporaryDirectory() as directory:
+            deadline = time.monotonic() + 60
+            while pool.stats().depth < 2 and time.monotonic() < deadline:
+                time.sleep(0.05)
+            self.assertEqual(2, pool.stats().depth)
+
+            private_key = get_private_key(key_size=1024, pool=pool)
+            self.assertEqual(1024, private_key.key_size)
+            private_key, public_key = generate_keys(directory, pool=pool)
+            self.assertEqual(1024, read_public_key(os.path.join(directory, 'public_key.pem')).key_size)
+            self.assertEqual(0, pool.stats().waits)
+
+            pool.close()  # no refills, the next key is generated inline
+            while pool.stats().pending and time.monotonic() < deadline:
+                time.sleep(0.05)
+            while pool.stats().depth:
+                pool.get()
+            pool.get()
+            stats = pool.stats()
+            self.assertEqual(1, stats.waits)
+            self.assertGreater(stats.wait_time, 0)
+
+    def test_key_pool_finished_futures(self):
+        """ a future that is already done when the pool registers its callback doesn't deadlock the pool """
+        class InlineExecutor(Executor):
+            def submit(self, fn, *args, **kwargs):
+                future = Future()
+                future.set_result(fn(*args, **kwargs))
+                return future
+
+        pool = KeyPool(size=0, key_size=1024, workers=1)
+        pool._executor.shutdown()
+        pool._executor, pool.size = InlineExecutor(), 2
+        thread = threading.Thread(target=pool._refill, daemon=True)
+        thread.start()
+        thread.join(timeout=30)
+        self.assertFalse(thread.is_alive())  # not closed on failure, close() would wait for the lock too
+        self.assertEqual((2, 0, 2), tuple(pool.stats())[:3])
+        pool.close()
+
+    def test_cached_key_files(self):
+        """ cached reads parse a key file once and again after the file changed """
+        bob_private_path = os.path.join(self.bob_dir.name, 'private_key.pem')
+        bob_public_path = os.path.join(self.bob_dir.name, 'public_key.pem')
+        hits, misses = key_file_cache.hits, key_file_cache.misses
+        private_key = read_private_key(bob_private_path, self.bobs_pwd, cached=True)
+        self.assertIs(private_key, read_private_key(bob_private_path, self.bobs_pwd, cached=True))
+        public_key = read_public_key(bob_public_path, cached=True)
+        self.assertIs(public_key, read_public_key(bob_public_path, cached=True))
+        self.assertEqual((hits + 2, misses + 2), (key_file_cache.hits, key_file_cache.misses))
+
+        stat = os.stat(bob_public_path)
+        os.utime(bob_public_path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000))  # file changed
+        self.assertIsNot(public_key, read_public_key(bob_public_path, cached=True))
+        self.assertEqual(public_key.public_numbers(), read_public_key(bob_public_path, cached=True).public_numbers())
+
+    def test_sign_file(self):
+        """ files and pieces are signed incrementally, the signatures interoperate with sign_message """
+        data = os.urandom(300_000)
+        with TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'artifact.bin')
+            with open(path, 'wb') as open_file:
+                open_file.write(data)
+            signature = sign_file(path, self.bobs_private_key)
+            self.assertTrue(verify_signed_message(signature, data, self.bobs_public_key))
+            self.assertFalse(verify_file(signature, path, self.alices_public_key))
+            with open(path, 'rb') as open_file:
+                self.assertTrue(verify_file(sign_message(data, self.bobs_private_key), open_file, self.bobs_public_key))
+
+        pieces = [data[:1], data[1:100_000], data[100_000:]]
+        signature = sign_chunks(pieces, self.alices_private_key)
+        self.assertTrue(verify_chunks(signature, iter(pieces), self.alices_public_key))
+        self.assertTrue(verify_file(signature, io.BytesIO(data), self.alices_public_key))
+        self.assertFalse(verify_chunks(signature, pieces[:2], self.alices_public_key))
+
+    def test_batches(self):
+        """ batches return results in input order, in a thread pool, a process pool and inline """
+        messages = [b'message %d' % number for number in range(6)]
+        signatures = sign_many([(message, self.bobs_private_key) for message in messages])
+        items = [(signature, message, self.bobs_public_key) for signature, message in zip(signatures, messages)]
+        items[3] = (signatures[3], b'altered', self.bobs_public_key)
+        expected = [True, True, True, False, True, True]
+        self.assertEqual(expected, verify_many(items, workers=1))
+        self.assertEqual(expected, verify_many(items, workers=3))
+        with ProcessPoolExecutor(max_workers=2) as executor:
+            self.assertEqual(expected, verify_many(items, executor=executor))
+            signatures = sign_many([(message, self.alices_private_key) for message in messages], executor)
+            self.assertTrue(all(verify_signed_message(signature, message, self.alices_public_key)
+                                for signature, message in zip(signatures, messages)))
+        with self.assertRaises(InvalidKey):
+            verify_many([(signatures[0], messages[0], self.bobs_private_key)])
+
+        encrypted = encrypt_many([(b'to alice', self.alices_public_key), (b'to bob', self.bobs_public_key)])
+        items = [(encrypted[0], self.alices_private_key), (encrypted[1], self.alices_private_key)]
+        with self.assertRaises(ValueError):  # alice can't decrypt bob's message
+            decrypt_many(items, workers=1)
+        decrypted = decrypt_many(items, workers=1, return_exceptions=True)
+        self.assertEqual(b'to alice', decrypted[0])
+        self.assertIsInstance(decrypted[1], ValueError)  # per item error
+
+    def test_der_and_bulk_load(self):
+        """ DER files load like PEM files, many files load at once with a report """
+        with TemporaryDirectory() as directory:
+            paths = []
+            for index, private_key in enumerate((self.bobs_private_key, self.alices_private_key)):
+                generate_keys(directory, self.bobs_pwd, name='key%d' % index, encoding='der')
+                with open(os.path.join(directory, 'key%d_private_key.der' % index), 'wb') as open_file:
+                    open_file.write(get_private_bytes(private_key, self.bobs_pwd))
+                paths.append(os.path.join(directory, 'key%d_private_key.der' % index))
+            self.assertEqual(get_public_bytes(self.bobs_public_key),
+                             get_public_bytes(read_private_key(paths[0], self.bobs_pwd).public_key()))
+            self.assertTrue(os.path.isfile(os.path.join(directory, 'key1_public_key.der')))
+
+            report = load_keys(paths + [os.path.join(directory, 'missing.der')], self.bobs_pwd, validate=False)
+            self.assertEqual(paths, list(report.keys))
+            self.assertEqual(get_public_bytes(self.alices_public_key),
+                             get_public_bytes(report.keys[paths[1]].public_key()))
+            self.assertIsInstance(report.errors[os.path.join(directory, 'missing.der')], FileNotFoundError)
+            self.assertGreater(report.keys_per_second, 0)
+            public_paths = [os.path.join(directory, 'key%d_public_key.der' % index) for index in range(2)]
+            self.assertEqual(2, len(load_keys(public_paths, private=False, workers=1).keys))
+
+    def test_buffers_and_into(self):
+        """ bytes-like messages are accepted, results are written into caller buffers """
+        packet = bytearray(b'header message trailer')
+        message = memoryview(packet)[7:14]
+        buffer, plain = bytearray(1024), bytearray(64)
+        size = rsa_encrypt_into(buffer, message, self.bobs_public_key)
+        self.assertEqual(512, size)
+        self.assertEqual(b'message', rsa_decrypt(memoryview(buffer)[:size], self.bobs_private_key))
+        self.assertEqual(7, rsa_decrypt_into(plain, buffer[:size], self.bobs_private_key))
+        self.assertEqual(b'message', plain[:7])
+        with self.assertRaises(ValueError):
+            rsa_encrypt_into(bytearray(10), message, self.bobs_public_key)
+
 
 if __name__ == '__main__':
     print("start\n")
@@ -4,12 +4,52 @@
 
 import os
 import logging
-from cryptography.hazmat.primitives.asymmetric import ec
-from cryptography.hazmat.primitives.kdf.hkdf import HKDF
-from cryptography.hazmat.primitives import serialization, hashes
+import threading
+import time
+from concurrent.futures import Executor
+from typing import BinaryIO, Iterable
+from cryptography.hazmat.primitives.asymmetric import ec, ed25519, utils, x25519
+from cryptography.hazmat.primitives.kdf.hkdf import HKDF, HKDFExpand
+from cryptography.hazmat.primitives import serialization, hashes, hmac
 from cryptography.hazmat.primitives.ciphers.aead import ChaCha20Poly1305
 from cryptography.hazmat.backends import default_backend
-from cryptography.exceptions import InvalidSignature, InvalidKey
+from cryptography.exceptions import InvalidSignature, InvalidKey, InvalidTag
+
+if __name__ == '__main__' and not __package__:  # python crypt/ecc.py, the imports below are package-relative
+    import sys
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    __package__ = 'crypt'
+
+from .batch import resolve_key, run_batch
+from .cache import LRUCache, load_key_file
+from .chunked import TAG_SIZE, decrypt_into, digest_chunks, digest_file, encrypt_into
+from .keyfile import LoadReport, file_name, load_key_files, load_private_bytes, load_public_bytes, \
+    private_bytes, public_bytes
+
+# derived keys of  get_cached_derived_key, keyed on (local fingerprint, peer fingerprint, hash, info, salt, length)
+derived_key_cache = LRUCache(maxsize=256, ttl=300.0)
+# fingerprints of the keys of  get_cached_derived_key, keyed on id(), an entry holds the key so its id isn't reused
+_fingerprints = LRUCache(maxsize=256, ttl=300.0)
+
+# X25519 only does key agreement and Ed25519 only signs, both are much faster than the NIST curves
+EDWARDS_CURVES = {'X25519': x25519.X25519PrivateKey, 'Ed25519': ed25519.Ed25519PrivateKey}
+CURVES = ('SECP256R1', 'SECP384R1', 'SECP521R1', 'SECP256K1', 'X25519', 'Ed25519')
+
+default_curve = 'SECP521R1'  # curve of  get_private_key  when no curve is given, see set_default_curve
+
+
+def set_default_curve(curve: str) -> None:
+    """
+    Set the curve used by  get_private_key  and  generate_keys  when no curve is given
+
+    :param curve: name of a curve in cryptography.hazmat.primitives.asymmetric.ec, 'X25519' or 'Ed25519'
+    :raises ValueError: if the curve is unknown
+    :return: None
+    """
+    global default_curve
+    if curve not in EDWARDS_CURVES and not isinstance(getattr(ec, str(curve), None), type):
+        raise ValueError("Unknown curve: {0}".format(curve))
+    default_curve = curve
 
 
 def __assure_private_key(private_key: ec) -> None:
@@ -20,7 +60,8 @@ def __assure_private_key(private_key: ec) -> None:
     :return: None
     """
     private_keys = (
-        ec.EllipticCurvePrivateKey, ec.EllipticCurvePrivateNumbers, ec.EllipticCurvePrivateNumbers)
+        ec.EllipticCurvePrivateKey, ec.EllipticCurvePrivateNumbers, ec.EllipticCurvePrivateNumbers,
+        x25519.X25519PrivateKey, ed25519.Ed25519PrivateKey)
     if not isinstance(private_key, private_keys):
         raise InvalidKey("Given key is not a private key")
 
@@ -33,22 +74,33 @@ def __assure_public_key(public_key: ec) -> None:
     :return: None
     """
     public_keys = (
-        ec.EllipticCurvePublicKey, ec.EllipticCurvePublicNumbers, ec.EllipticCurvePublicKeyWithSerialization)
+        ec.EllipticCurvePublicKey, ec.EllipticCurvePublicNumbers, ec.EllipticCurvePublicKeyWithSerialization,
+        x25519.X25519PublicKey, ed25519.Ed25519PublicKey)
     if not isinstance(public_key, public_keys):
         raise InvalidKey("Given key is not a public key")
 
 
-def get_private_key(curve: str = 'SECP521R1') -> ec.EllipticCurvePrivateKey:
+def __assure_signing_key(key) -> None:
+    """ private function that refuses X25519 keys, they can't sign """
+    if isinstance(key, (x25519.X25519PrivateKey, x25519.X25519PublicKey)):
+        raise InvalidKey("X25519 keys can't sign, use Ed25519")
+
+
+def get_private_key(curve: str = None) -> ec.EllipticCurvePrivateKey:
     """
     Helper function to generate a private key
     :param curve  str  name of the function in cryptography.hazmat.primitives.asymmetric.ec
         website: https://cryptography.io/en/latest/hazmat/primitives/asymmetric/ec/#elliptic-curves
+        'X25519' for key agreement or 'Ed25519' for signatures, None for  default_curve
     :type curve: str
     :return:  a new private key
     :rtype: ec.EllipticCurvePrivateKey
     """
+    curve = curve or default_curve
+    if curve in EDWARDS_CURVES:
+        return EDWARDS_CURVES[curve].generate()
     private_key = ec.generate_private_key(
-            curve=getattr(ec, str(curve)),
+            curve=getattr(ec, str(curve))(),
             backend=default_backend())
     return private_key
 
@@ -82,6 +134,14 @@ def get_shared_key(private_key: ec.EllipticCurvePrivateKey, peer_public_key: ec.
     """
     __assure_private_key(private_key)
     __assure_public_key(peer_public_key)
+    if isinstance(private_key, x25519.X25519PrivateKey):
+        if not isinstance(peer_public_key, x25519.X25519PublicKey):
+            raise InvalidKey("Peer key is not an X25519 key")
+        return private_key.exchange(peer_public_key)
+    if isinstance(private_key, ed25519.Ed25519PrivateKey):
+        raise InvalidKey("Ed25519 keys can't do a key exchange, use X25519")
+    if not isinstance(peer_public_key, ec.EllipticCurvePublicKey):
+        raise InvalidKey("Peer key is not an elliptic curve key")
     if not bool(algorithm) and algorithm is None:
         algorithm = ec.ECDH()
     shared_key = private_key.exchange(algorithm=algorithm, peer_public_key=peer_public_key)
@@ -118,17 +178,111 @@ def get_derived_key(shared_key: bytes, data: bytes = None,
     return derived_key.derive(shared_key)
 
 
+def get_derived_keys(shared_key: bytes, infos: Iterable[bytes], length: int = 32,
+                     salt: bytes = None, algorithm: hashes.HashAlgorithm = None) -> list:
+    """
+    Creates many derived keys from one shared key, e.g. a key per channel or stream
+    HKDF-Extract runs once, only HKDF-Expand runs per info.
+    Every key equals  get_derived_key(shared_key, info, length, salt, algorithm)
+
+    :param shared_key: bytes  key received from the other party
+    :param infos: iterable of bytes  the data to include per derived key, must differ per key
+    :param length: int  length of every key
+    :param salt: bytes  salt of the extract step
+    :param algorithm: cryptography.hazmat.primitives.hashes  hash of the HKDF, SHA256 by default
+    :return: list of bytes  the keys in the order of infos
+    """
+    if not bool(algorithm):
+        algorithm = hashes.SHA256()
+
+    extract = hmac.HMAC(salt or b'\x00' * algorithm.digest_size, algorithm, backend=default_backend())
+    extract.update(bytes(shared_key))
+    pseudo_random_key = extract.finalize()
+    return [HKDFExpand(algorithm=algorithm, length=length, info=info, backend=default_backend())
+            .derive(pseudo_random_key) for info in infos]
+
+
+def public_key_fingerprint(public_key) -> bytes:
+    """
+    SHA-256 of the SubjectPublicKeyInfo of a public key, the same key always gives the same fingerprint
+
+    :param public_key: a public key, or a private key to take the public key from
+    :return: 32 byte fingerprint
+    """
+    if hasattr(public_key, 'public_key'):
+        public_key = public_key.public_key()
+    der = public_key.public_bytes(encoding=serialization.Encoding.DER,
+                                  format=serialization.PublicFormat.SubjectPublicKeyInfo)
+    digest = hashes.Hash(hashes.SHA256(), default_backend())
+    digest.update(der)
+    return digest.finalize()
+
+
+def __cached_fingerprint(key) -> bytes:
+    """ private function, public_key_fingerprint  of a key object computed once and kept in  _fingerprints """
+    entry = _fingerprints.get(id(key))
+    if entry is None or entry[0] is not key:
+        entry = (key, public_key_fingerprint(key))
+        _fingerprints.put(id(key), entry)
+    return entry[1]
+
+
+def get_cached_derived_key(private_key: ec.EllipticCurvePrivateKey, peer_public_key: ec.EllipticCurvePublicKey,
+                           data: bytes = None, lenght: int = 32, salt: bytes = None,
+                           algorithm: hashes = None) -> bytes:
+    """
+    get_shared_key  followed by  get_derived_key, the result is kept in  derived_key_cache
+    A server that talks to the same peers over and over skips the key exchange and HKDF on a hit.
+    Use  derived_key_cache.stats()  for the hit rate and  evict_derived_keys  to drop keys explicitly.
+
+    :param private_key: the local private key
+    :param peer_public_key: the public key of the other party
+    :param data: data to include in the derived key, any bytes-like object
+    :param lenght: lenght of the key
+    :param salt: salt of the HKDF, any bytes-like object
+    :param algorithm: hash algorithm of the HKDF, default SHA256
+    :return: derived key
+    """
+    algorithm = algorithm or hashes.SHA256()
+    data = None if data is None else bytes(data)
+    salt = None if salt is None else bytes(salt)
+    cache_key = (__cached_fingerprint(private_key), __cached_fingerprint(peer_public_key),
+                 algorithm.name, data, salt, lenght)
+    derived_key = derived_key_cache.get_copy(cache_key)  # copied under the cache lock, an eviction wipes the entry
+    if derived_key is not None:
+        return derived_key
+    derived_key = get_derived_key(get_shared_key(private_key, peer_public_key), data, lenght, salt, algorithm)
+    derived_key_cache.put(cache_key, bytearray(derived_key))  # bytearray so eviction wipes it
+    return derived_key
+
+
+def evict_derived_keys(peer_public_key: ec.EllipticCurvePublicKey = None,
+                       private_key: ec.EllipticCurvePrivateKey = None) -> int:
+    """
+    Remove (and wipe) cached derived keys, e.g. when a peer rotates or revokes its key
+
+    :param peer_public_key: only the keys shared with this peer, None for every peer
+    :param private_key: only the keys of this local key, None for every local key
+    :return: amount of evicted keys
+    """
+    local = None if private_key is None else __cached_fingerprint(private_key)
+    peer = None if peer_public_key is None else __cached_fingerprint(peer_public_key)
+    return derived_key_cache.pop_matching(
+        lambda key: (local is None or key[0] == local) and (peer is None or key[1] == peer))
+
+
 def encrypt_with_derived_key(unencrypted_data: bytes, derived_key: bytes) -> bytes:
     """
     Encrypt messages with the derived key
 
     :param derived_key: key received from  get_derived_key  function
     :type derived_key: bytes
-    :param unencrypted_data: data to encrypt
+    :param unencrypted_data: data to encrypt, any bytes-like object
     :type unencrypted_data: bytes
     :return: encrypted data
     :rtype: bytes
     """
+    derived_key = bytes(derived_key)
     key = derived_key.zfill(12)
     nonce, secret = (key[:6] + key[-6:]), key[::-1][0:12]
     chacha = ChaCha20Poly1305(derived_key)
@@ -142,11 +296,12 @@ def decrypt_with_derived_key(encrypted_data: bytes, derived_key: bytes) -> bytes
 
     :param derived_key: key received from  get_derived_key  function
     :type derived_key: bytes
-    :param encrypted_data: encrypted data from the  encrypt_with_derived_key  function
+    :param encrypted_data: encrypted data from the  encrypt_with_derived_key  function, any bytes-like object
     :type encrypted_data: bytes
     :return: decrypted data
     :rtype: bytes
     """
+    derived_key = bytes(derived_key)
     key = derived_key.zfill(12)
     nonce, secret = (key[:6] + key[-6:]), key[::-1][0:12]
     chacha = ChaCha20Poly1305(derived_key)
@@ -154,6 +309,273 @@ def decrypt_with_derived_key(encrypted_data: bytes, derived_key: bytes) -> bytes
     return unencrypted_data
 
 
+def encrypt_with_derived_key_into(dst, unencrypted_data: bytes, derived_key: bytes) -> int:
+    """
+    encrypt_with_derived_key  that writes into a caller-owned buffer instead of returning new bytes
+
+    :param dst: writable bytes-like object (bytearray, memoryview, mmap) of at least len(unencrypted_data) + 16
+    :param unencrypted_data: data to encrypt, any bytes-like object
+    :param derived_key: key received from  get_derived_key  function
+    :raises ValueError: if dst is too small
+    :return: amount of bytes written to the start of dst
+    """
+    derived_key = bytes(derived_key)
+    key = derived_key.zfill(12)
+    return encrypt_into(ChaCha20Poly1305(derived_key), key[:6] + key[-6:], unencrypted_data, derived_key, dst)
+
+
+def decrypt_with_derived_key_into(dst, encrypted_data: bytes, derived_key: bytes) -> int:
+    """
+    decrypt_with_derived_key  that writes into a caller-owned buffer instead of returning new bytes
+
+    :param dst: writable bytes-like object of at least len(encrypted_data) - 16
+    :param encrypted_data: encrypted data from the  encrypt_with_derived_key  function, any bytes-like object
+    :param derived_key: key received from  get_derived_key  function
+    :raises ValueError: if dst is too small
+    :raises InvalidTag: if the data is altered or the key is wrong
+    :return: amount of bytes written to the start of dst
+    """
+    derived_key = bytes(derived_key)
+    key = derived_key.zfill(12)
+    return decrypt_into(ChaCha20Poly1305(derived_key), key[:6] + key[-6:], encrypted_data, derived_key, dst)
+
+
+class AEADSession:
+    """
+    Encrypt and decrypt a stream of messages under one derived key
+    The ChaCha20Poly1305 object is kept for the lifetime of the session and every message gets a fresh
+    counter based nonce, unlike  encrypt_with_derived_key  which uses the same nonce for every message.
+    A frame is the 8 byte sequence number followed by the ciphertext, replayed or old frames are refused.
+    Both parties use the same derived key, one of them is the initiator so their nonces never collide.
+    """
+
+    SEQUENCE_SIZE = 8
+
+    def __init__(self, derived_key: bytes, initiator: bool = True):
+        """
+        :param derived_key: key received from  get_derived_key  function
+        :param initiator: True for one party, False for the other
+        """
+        self._chacha = ChaCha20Poly1305(derived_key)
+        self._send_prefix = b'\x00\x00\x00\x01' if initiator else b'\x00\x00\x00\x02'
+        self._receive_prefix = b'\x00\x00\x00\x02' if initiator else b'\x00\x00\x00\x01'
+        self._send_sequence = 0
+        self._receive_sequence = 0  # lowest sequence number that is still accepted
+        self._lock = threading.Lock()
+
+    def _next_sequence(self) -> bytes:
+        with self._lock:
+            sequence = self._send_sequence.to_bytes(self.SEQUENCE_SIZE, 'big')
+            self._send_sequence += 1
+        return sequence
+
+    def _check_sequence(self, frame: memoryview) -> (bytes, int):
+        sequence = bytes(frame[:self.SEQUENCE_SIZE])
+        number = int.from_bytes(sequence, 'big')
+        if len(sequence) != self.SEQUENCE_SIZE or number < self._receive_sequence:
+            raise InvalidTag("Frame is replayed or too short")
+        return sequence, number
+
+    def _accept_sequence(self, number: int) -> None:
+        with self._lock:
+            if number < self._receive_sequence:  # accepted by another thread in the meantime
+                raise InvalidTag("Frame is replayed")
+            self._receive_sequence = number + 1
+
+    def encrypt(self, data: bytes, associated_data: bytes = None) -> bytes:
+        """
+        Encrypt one message
+
+        :param data: data to encrypt, any bytes-like object
+        :param associated_data: authenticated but not encrypted, must be given again to decrypt
+        :raises OverflowError: after 2 ** 64 messages, start a new session with a new key
+        :return: frame, sequence number + encrypted data
+        """
+        sequence = self._next_sequence()
+        aad = sequence if associated_data is None else sequence + associated_data
+        return sequence + self._chacha.encrypt(self._send_prefix + sequence, data, aad)
+
+    def encrypt_into(self, dst, data: bytes, associated_data: bytes = None) -> int:
+        """
+        encrypt  that writes the frame into a caller-owned buffer
+
+        :param dst: writable bytes-like object of at least len(data) + 24 (sequence number and tag)
+        :param data: data to encrypt, any bytes-like object
+        :param associated_data: authenticated but not encrypted, must be given again to decrypt
+        :raises ValueError: if dst is too small
+        :return: amount of bytes written to the start of dst
+        """
+        view = memoryview(dst).cast('B')
+        if len(view) < self.SEQUENCE_SIZE + len(data) + TAG_SIZE:
+            raise ValueError("Buffer is too small, {0} bytes are needed".format(
+                self.SEQUENCE_SIZE + len(data) + TAG_SIZE))
+        sequence = self._next_sequence()
+        aad = sequence if associated_data is None else sequence + associated_data
+        view[:self.SEQUENCE_SIZE] = sequence
+        return self.SEQUENCE_SIZE + encrypt_into(
+            self._chacha, self._send_prefix + sequence, data, aad, view[self.SEQUENCE_SIZE:])
+
+    def decrypt(self, frame: bytes, associated_data: bytes = None) -> bytes:
+        """
+        Decrypt one message of the other party, frames may be skipped but not replayed
+
+        :param frame: frame made by  encrypt  of the other party, any bytes-like object
+        :param associated_data: the associated data given to  encrypt
+        :raises InvalidTag: if the frame is altered, replayed or older than the last accepted frame
+        :return: decrypted data
+        """
+        frame = memoryview(frame)
+        sequence, number = self._check_sequence(frame)
+        aad = sequence if associated_data is None else sequence + associated_data
+        data = self._chacha.decrypt(self._receive_prefix + sequence, frame[self.SEQUENCE_SIZE:], aad)
+        self._accept_sequence(number)
+        return data
+
+    def decrypt_into(self, dst, frame: bytes, associated_data: bytes = None) -> int:
+        """
+        decrypt  that writes the data into a caller-owned buffer
+
+        :param dst: writable bytes-like object of at least len(frame) - 24
+        :param frame: frame made by  encrypt  of the other party, any bytes-like object
+        :param associated_data: the associated data given to  encrypt
+        :raises ValueError: if dst is too small
+        :raises InvalidTag: if the frame is altered, replayed or older than the last accepted frame
+        :return: amount of bytes written to the start of dst
+        """
+        frame = memoryview(frame)
+        sequence, number = self._check_sequence(frame)
+        aad = sequence if associated_data is None else sequence + associated_data
+        size = decrypt_into(self._chacha, self._receive_prefix + sequence, frame[self.SEQUENCE_SIZE:], aad, dst)
+        self._accept_sequence(number)
+        return size
+
+
+def benchmark_aead_session(count: int = 10_000, size: int = 64) -> dict:
+    """
+    Compare messages per second of  AEADSession  with  encrypt_with_derived_key / decrypt_with_derived_key
+
+    :param count: amount of messages
+    :param size: bytes per message
+    :return: {'derived_key_functions': msg/s, 'aead_session': msg/s} for an encrypt + decrypt round trip
+    """
+    derived_key, message = ChaCha20Poly1305.generate_key(), os.urandom(size)
+    results = {}
+
+    start = time.perf_counter()
+    for _ in range(count):
+        decrypt_with_derived_key(encrypt_with_derived_key(message, derived_key), derived_key)
+    results['derived_key_functions'] = count / (time.perf_counter() - start)
+
+    sender, receiver = AEADSession(derived_key, initiator=True), AEADSession(derived_key, initiator=False)
+    start = time.perf_counter()
+    for _ in range(count):
+        receiver.decrypt(sender.encrypt(message))
+    results['aead_session'] = count / (time.perf_counter() - start)
+    return results
+
+
+SEALED_VERSION = b'\x01'  # version | key length (2) | ephemeral public key | count (2) | entries | nonce (12) | data
+SEALED_ENTRY_SIZE = 32 + 32 + 16  # recipient fingerprint | wrapped content key + tag, sorted on fingerprint
+
+
+def __wrapping_key(shared_key: bytes, ephemeral_fingerprint: bytes, fingerprint: bytes) -> ChaCha20Poly1305:
+    """ private function that derives the key that wraps the content key for one recipient """
+    return ChaCha20Poly1305(get_derived_key(shared_key, b'sealed %b %b' % (ephemeral_fingerprint, fingerprint)))
+
+
+def seal_for_recipients(data: bytes, peer_public_keys: Iterable[ec.EllipticCurvePublicKey]) -> bytes:
+    """
+    Encrypt data once for many recipients
+    The data is encrypted with a random content key, that key is wrapped per recipient with ECDH + HKDF
+    against one ephemeral key, so the cost of the payload doesn't grow with the amount of recipients.
+    The recipients are fingerprinted and sorted, a recipient finds its entry with a binary search.
+
+    :param data: data to encrypt
+    :param peer_public_keys: public keys of the recipients, all on the same curve (X25519 or a NIST curve)
+    :raises InvalidKey: if a given key is invalid or on another curve
+    :raises ValueError: if no recipients are given
+    :return: sealed data, decrypt with  open_sealed
+    """
+    recipients = {}
+    for public_key in peer_public_keys:
+        __assure_public_key(public_key)
+        recipients[public_key_fingerprint(public_key)] = public_key
+    if not recipients:
+        raise ValueError("No recipients given")
+    first = next(iter(recipients.values()))
+    if isinstance(first, x25519.X25519PublicKey):
+        ephemeral_key = x25519.X25519PrivateKey.generate()
+    elif isinstance(first, ec.EllipticCurvePublicKey):
+        ephemeral_key = ec.generate_private_key(first.curve, default_backend())
+    else:
+        raise InvalidKey("Recipient keys must be X25519 or elliptic curve keys")
+    curve = None if isinstance(first, x25519.X25519PublicKey) else first.curve.name
+    for public_key in recipients.values():  # before sealing, the exchange raises a bare ValueError for another curve
+        if curve is None:
+            same_curve = isinstance(public_key, x25519.X25519PublicKey)
+        else:
+            same_curve = isinstance(public_key, ec.EllipticCurvePublicKey) and public_key.curve.name == curve
+        if not same_curve:
+            raise InvalidKey("Recipient keys must all be on the same curve")
+    ephemeral_public = ephemeral_key.public_key().public_bytes(
+        encoding=serialization.Encoding.DER, format=serialization.PublicFormat.SubjectPublicKeyInfo)
+    ephemeral_fingerprint = public_key_fingerprint(ephemeral_key)
+
+    content_key = ChaCha20Poly1305.generate_key()
+    entries = []
+    for fingerprint in sorted(recipients):
+        shared_key = get_shared_key(ephemeral_key, recipients[fingerprint])
+        wrapping_key = __wrapping_key(shared_key, ephemeral_fingerprint, fingerprint)
+        entries.append(fingerprint + wrapping_key.encrypt(bytes(12), content_key, None))  # key used once
+
+    header = b'%b%b%b%b%b' % (SEALED_VERSION, len(ephemeral_public).to_bytes(2, 'big'), ephemeral_public,
+                              len(entries).to_bytes(2, 'big'), b''.join(entries))
+    nonce = os.urandom(12)
+    return b'%b%b%b' % (header, nonce, ChaCha20Poly1305(content_key).encrypt(nonce, data, header))
+
+
+def open_sealed(sealed: bytes, private_key: ec.EllipticCurvePrivateKey) -> bytes:
+    """
+    Decrypt data made by  seal_for_recipients  with the private key of one of the recipients
+
+    :param sealed: sealed data
+    :param private_key: private key of a recipient
+    :raises InvalidKey: if given key is invalid or not one of the recipients
+    :raises ValueError: if the data is not sealed by  seal_for_recipients
+    :raises InvalidTag: if the data is altered
+    :return: decrypted data
+    """
+    __assure_private_key(private_key)
+    sealed = memoryview(sealed)
+    if len(sealed) < 3 or sealed[:1] != SEALED_VERSION:
+        raise ValueError("Given data is not sealed by seal_for_recipients")
+    position = 3 + int.from_bytes(sealed[1:3], 'big')
+    ephemeral_public = serialization.load_der_public_key(bytes(sealed[3:position]), default_backend())
+    count = int.from_bytes(sealed[position:position + 2], 'big')
+    entries = position + 2
+    position = entries + count * SEALED_ENTRY_SIZE
+    if len(sealed) < position + 12 + 16:
+        raise ValueError("Given data is truncated")
+
+    fingerprint, low, high = public_key_fingerprint(private_key), 0, count
+    while low < high:  # binary search over the sorted fixed size entries
+        middle = (low + high) // 2
+        start = entries + middle * SEALED_ENTRY_SIZE
+        if bytes(sealed[start:start + 32]) < fingerprint:
+            low = middle + 1
+        else:
+            high = middle
+    start = entries + low * SEALED_ENTRY_SIZE
+    if low == count or sealed[start:start + 32] != fingerprint:
+        raise InvalidKey("Given key is not one of the recipients")
+
+    shared_key = get_shared_key(private_key, ephemeral_public)
+    wrapping_key = __wrapping_key(shared_key, public_key_fingerprint(ephemeral_public), fingerprint)
+    content_key = wrapping_key.decrypt(bytes(12), sealed[start + 32:start + SEALED_ENTRY_SIZE], None)
+    return ChaCha20Poly1305(content_key).decrypt(sealed[position:position + 12], sealed[position + 12:],
+                                                 sealed[:position])
+
+
 def generate_public_pem(public_key: ec.EllipticCurvePublicKey) -> bytes:
     """
     Generates a Privacy Enhanced Mail (pem) from the public key
@@ -192,7 +614,34 @@ def generate_private_pem(private_key: ec.EllipticCurvePrivateKey, pwd: bytes = N
     return pem
 
 
-def generate_keys(directory: str, pwd: bytes = None) -> (ec.EllipticCurvePrivateKey, ec.EllipticCurvePublicKey):
+def generate_public_bytes(public_key: ec.EllipticCurvePublicKey, encoding: str = 'der') -> bytes:
+    """
+    Serialize the public key, DER and raw are smaller and faster to load than PEM
+
+    :param public_key: the public key
+    :param encoding: 'pem', 'der' or 'raw' (X25519 and Ed25519 only)
+    :return: bytes
+    """
+    __assure_public_key(public_key)
+    return public_bytes(public_key, encoding)
+
+
+def generate_private_bytes(private_key: ec.EllipticCurvePrivateKey, pwd: bytes = None,
+                           encoding: str = 'der') -> bytes:
+    """
+    Serialize the private key, DER and raw are smaller and faster to load than PEM
+
+    :param private_key: the private_key
+    :param pwd: password: if not None, Best available encryption is chosen, not possible for raw
+    :param encoding: 'pem', 'der' or 'raw' (X25519 and Ed25519 only)
+    :return: bytes
+    """
+    __assure_private_key(private_key)
+    return private_bytes(private_key, pwd, encoding)
+
+
+def generate_keys(directory: str, pwd: bytes = None, curve: str = None, name: str = None,
+                  encoding: str = 'pem') -> (ec.EllipticCurvePrivateKey, ec.EllipticCurvePublicKey):
     """
     Generate the public and private keys
     Generated keys have a default name, you should rename them
@@ -201,14 +650,18 @@ def generate_keys(directory: str, pwd: bytes = None) -> (ec.EllipticCurvePrivate
                       overwrite the existing keys
     :param pwd: password: if not None, Best available encryption is chosen
                 and the private key is encrypted with a the password
+    :param curve: curve of the keys, None for  default_curve
+    :param name: the files are named <name>_private_key.<encoding>, None for private_key.<encoding>
+    :param encoding: 'pem', 'der' or 'raw' (X25519 and Ed25519 only)
     :return: private, public keys
     """
-    private_key = generate_private_key(directory, pwd)
-    public_key = generate_public_key(directory, private_key)
+    private_key = generate_private_key(directory, pwd, curve, name, encoding)
+    public_key = generate_public_key(directory, private_key, name, encoding)
     return private_key, public_key
 
 
-def generate_private_key(directory: str, pwd: bytes = None) -> ec.EllipticCurvePrivateKey:
+def generate_private_key(directory: str, pwd: bytes = None, curve: str = None, name: str = None,
+                         encoding: str = 'pem') -> ec.EllipticCurvePrivateKey:
     """
     Generate the private key, this key should not be shared with anyone!
     Generated keys have a default name, you should rename them
@@ -218,6 +671,9 @@ def generate_private_key(directory: str, pwd: bytes = None) -> ec.EllipticCurveP
     :param directory: folder where the keys are made
                       overwrite the existing keys
     :param pwd: password: if not None, Best available encryption is chosen
+    :param curve: curve of the key, None for  default_curve
+    :param name: the file is named <name>_private_key.<encoding>, None for private_key.<encoding>
+    :param encoding: 'pem', 'der' or 'raw' (X25519 and Ed25519 only)
     :return: ec  private key object
     """
     directory = os.path.realpath(directory)
@@ -225,16 +681,16 @@ def generate_private_key(directory: str, pwd: bytes = None) -> ec.EllipticCurveP
         directory = os.path.dirname(directory)
 
     # generate private key
-    private_key = get_private_key()
+    private_key = get_private_key(curve)
 
-    private_path = os.path.join(directory, './private_key.pem')
+    private_path = os.path.join(directory, file_name('private', name, encoding))
     with open(private_path, 'wb') as open_file:
-        private_pem = generate_private_pem(private_key, pwd)
-        open_file.write(private_pem)
+        open_file.write(generate_private_bytes(private_key, pwd, encoding))
     return private_key
 
 
-def generate_public_key(directory: str, private_key: ec) -> ec.EllipticCurvePublicKey:
+def generate_public_key(directory: str, private_key: ec, name: str = None,
+                        encoding: str = 'pem') -> ec.EllipticCurvePublicKey:
     """
     Generate the public key, share this key with anyone
     Generated keys have a default name, you should rename them
@@ -243,15 +699,16 @@ def generate_public_key(directory: str, private_key: ec) -> ec.EllipticCurvePubl
 
     :param directory: folder where the keys are made
                       overwrite the existing keys
+    :param name: the file is named <name>_public_key.<encoding>, None for public_key.<encoding>
+    :param encoding: 'pem', 'der' or 'raw' (X25519 and Ed25519 only)
     :raises InvalidKey: if given key is invalid
     :return: ec  private key object
     """
     __assure_private_key(private_key)
     public_key = private_key.public_key()
-    public_path = os.path.join(directory, './public_key.pem')
+    public_path = os.path.join(directory, file_name('public', name, encoding))
     with open(public_path, 'wb') as open_file:
-        public_pem = generate_public_pem(public_key)
-        open_file.write(public_pem)
+        open_file.write(generate_public_bytes(public_key, encoding))
     return public_key
 
 
@@ -264,37 +721,76 @@ def __read_file(key_file: str) -> bytes:
         return key_file.read()
 
 
-def read_private_key(key_file: (str, bytes), pwd: bytes = None) -> ec.EllipticCurvePrivateKey:
+def read_private_key(key_file: (str, bytes), pwd: bytes = None, cached: bool = False,
+                     curve: str = None) -> ec.EllipticCurvePrivateKey:
     """
-    Read and return a private key
+    Read and return a private key, PEM and DER are detected
     To use with an incoming encrypted message
     :param key_file: str  path to the keyfile
     :param pwd: bytes  if the private key is locked with an password
+    :param cached: bool  reuse the key object while the file is unchanged, see cache.key_file_cache
+    :param curve: str  'X25519' or 'Ed25519' if the key is raw
     :raises FileNotFoundError:  if key_file doesnt exist
     :return: serialization object
     """
+    load = __load_private_pem if curve is None else lambda data, pwd=None: load_private_bytes(data, curve=curve)
     if isinstance(key_file, str) and os.path.isfile(key_file):
+        if cached:
+            return load_key_file(key_file, load, pwd, 'ecc private {0}'.format(curve))
         key_file = __read_file(key_file)
 
-    private_key = serialization.load_pem_private_key(key_file, password=pwd, backend=default_backend())
+    private_key = load(key_file, pwd)
     return private_key
 
 
-def read_public_key(key_file: str) -> ec.EllipticCurvePublicKey:
+def read_public_key(key_file: str, cached: bool = False, curve: str = None) -> ec.EllipticCurvePublicKey:
     """
-    Read and return a public key
+    Read and return a public key, PEM and DER are detected
     To use with encrypting an outgoing message
     :param key_file: str
+    :param cached: bool  reuse the key object while the file is unchanged, see cache.key_file_cache
+    :param curve: str  'X25519' or 'Ed25519' if the key is raw
     :raises FileNotFoundError:  if key_file doesnt exist
     :return: serialization object
     """
+    load = __load_public_pem if curve is None else lambda data, pwd=None: load_public_bytes(data, curve)
     if isinstance(key_file, str) and os.path.isfile(key_file):
+        if cached:
+            return load_key_file(key_file, load, None, 'ecc public {0}'.format(curve))
         key_file = __read_file(key_file)
 
-    public_key = serialization.load_pem_public_key(key_file, backend=default_backend())
+    public_key = load(key_file)
     return public_key
 
 
+def load_keys(key_files: Iterable[str], pwd: bytes = None, private: bool = True, curve: str = None,
+              executor: Executor = None, workers: int = None) -> LoadReport:
+    """
+    Load many key files concurrently, e.g. to warm a service within its startup budget
+
+    :param key_files: paths to the key files, PEM and DER are detected
+    :param pwd: password of the private keys
+    :param private: True to load private keys, False for public keys
+    :param curve: 'X25519' or 'Ed25519' if the keys are raw
+    :param executor: thread pool to use, it is not shut down
+    :param workers: size of the thread pool made when no executor is given, 1 to load inline
+    :return: LoadReport  keys and errors per path, seconds and keys_per_second of the load
+    """
+    if private:
+        return load_key_files(key_files, lambda data: load_private_bytes(data, pwd, curve), executor, workers)
+    return load_key_files(key_files, lambda data: load_public_bytes(data, curve), executor, workers)
+
+
+def __load_private_pem(data: bytes, pwd: bytes = None) -> ec.EllipticCurvePrivateKey:
+    """ private function that parses a private key, PEM or DER """
+    return load_private_bytes(data, pwd)
+
+
+def __load_public_pem(data: bytes, pwd: bytes = None) -> ec.EllipticCurvePublicKey:
+    """ private function that parses a public key, PEM or DER, pwd is ignored """
+    return load_public_bytes(data)
+
+
 def sign_data(data: bytes, private_key: ec.EllipticCurvePrivateKey, algorithm: ec.ECDSA = None) -> bytes:
     """
     Sign data with the private key to ensure te receiving party that it is your's
@@ -303,10 +799,13 @@ def sign_data(data: bytes, private_key: ec.EllipticCurvePrivateKey, algorithm: e
 
     :param private_key: the private key to sign the data with
     :param data: data to sign
-    :param algorithm: algorithm agreed upon with the receiving party
+    :param algorithm: algorithm agreed upon with the receiving party, ignored for Ed25519 keys
     :return: signature based on the data
     """
     __assure_private_key(private_key)
+    __assure_signing_key(private_key)
+    if isinstance(private_key, ed25519.Ed25519PrivateKey):
+        return private_key.sign(data)
     if not bool(algorithm):
         algorithm = ec.ECDSA(hashes.SHA256())
     signed_data = private_key.sign(data, algorithm)
@@ -325,16 +824,20 @@ def verify_signed_data(signature: bytes, data: bytes,
     :param public_key: public key from the other party
     :param signature: the signature that has been send along the data
     :param data: data that belongs to the signature
-    :param algorithm: algorithm used by the other party
+    :param algorithm: algorithm used by the other party, ignored for Ed25519 keys
     :return: bool
     """
     __assure_public_key(public_key)
+    __assure_signing_key(public_key)
     result = False  # set the result to False
     if not bool(algorithm) and algorithm is None:  # if algorithm is None
         algorithm = ec.ECDSA(hashes.SHA256())
 
     try:  # with suppress(InvalidSignature):
-        public_key.verify(signature, data, algorithm)
+        if isinstance(public_key, ed25519.Ed25519PublicKey):
+            public_key.verify(signature, data)
+        else:
+            public_key.verify(signature, data, algorithm)
     except InvalidSignature:
         pass  # result = False
     else:
@@ -347,6 +850,259 @@ def verify_signed_data(signature: bytes, data: bytes,
 verify_signed_message = verify_signed_data
 
 
+def sign_digest(digest: bytes, private_key: ec.EllipticCurvePrivateKey,
+                algorithm: hashes.HashAlgorithm = None) -> bytes:
+    """
+    Sign a digest with the private key, the signature verifies with  verify_signed_data  over the hashed data
+    Ed25519 can't sign a prehashed digest, an Ed25519 key signs the digest itself as the message,
+    that signature only verifies with  verify_signed_digest, verify_file  and  verify_chunks.
+
+    :param digest: digest of the data
+    :param private_key: the private key to sign the digest with
+    :param algorithm: hash algorithm the digest was made with, default SHA256
+    :return: signature based on the data
+    """
+    __assure_private_key(private_key)
+    __assure_signing_key(private_key)
+    if isinstance(private_key, ed25519.Ed25519PrivateKey):
+        return private_key.sign(digest)
+    if not bool(algorithm):
+        algorithm = hashes.SHA256()
+    signed_data = private_key.sign(digest, ec.ECDSA(utils.Prehashed(algorithm)))
+    return signed_data
+
+
+def verify_signed_digest(signature: bytes, digest: bytes,
+                         public_key: ec.EllipticCurvePublicKey, algorithm: hashes.HashAlgorithm = None) -> bool:
+    """
+    Verify a signature against a digest, accepts signatures made by  sign_data  too
+
+    :param signature: the signature that has been send along the data
+    :param digest: digest of the data that belongs to the signature
+    :param public_key: public key from the other party
+    :param algorithm: hash algorithm the digest was made with, default SHA256
+    :return: bool
+    """
+    __assure_public_key(public_key)
+    __assure_signing_key(public_key)
+    if not bool(algorithm):
+        algorithm = hashes.SHA256()
+    try:
+        if isinstance(public_key, ed25519.Ed25519PublicKey):
+            public_key.verify(signature, digest)
+        else:
+            public_key.verify(signature, digest, ec.ECDSA(utils.Prehashed(algorithm)))
+    except InvalidSignature:
+        return False
+    return True
+
+
+def sign_file(file: (str, BinaryIO), private_key: ec.EllipticCurvePrivateKey) -> bytes:
+    """
+    Sign a file of any size with flat memory, the file is hashed incrementally (memory-mapped if possible)
+
+    :param file: str or file-like object  path or file opened in binary mode
+    :param private_key: the private key to sign the file with
+    :return: signature, verifies with  verify_signed_data  over the same content
+    """
+    return sign_digest(digest_file(file), private_key)
+
+
+def verify_file(signature: bytes, file: (str, BinaryIO), public_key: ec.EllipticCurvePublicKey) -> bool:
+    """
+    Verify a file of any size with flat memory
+
+    :param signature: the signature that has been send along the file
+    :param file: str or file-like object  path or file opened in binary mode
+    :param public_key: public key from the other party
+    :return: bool
+    """
+    return verify_signed_digest(signature, digest_file(file), public_key)
+
+
+def sign_chunks(chunks: Iterable[bytes], private_key: ec.EllipticCurvePrivateKey) -> bytes:
+    """
+    Sign data that arrives in pieces
+
+    :param chunks: iterable of bytes
+    :param private_key: the private key to sign the data with
+    :return: signature, verifies with  verify_signed_data  over the joined pieces
+    """
+    return sign_digest(digest_chunks(chunks), private_key)
+
+
+def verify_chunks(signature: bytes, chunks: Iterable[bytes], public_key: ec.EllipticCurvePublicKey) -> bool:
+    """
+    Verify data that arrives in pieces
+
+    :param signature: the signature that has been send along the data
+    :param chunks: iterable of bytes
+    :param public_key: public key from the other party
+    :return: bool
+    """
+    return verify_signed_digest(signature, digest_chunks(chunks), public_key)
+
+
+# the algorithm object is immutable, the batch functions share it instead of building it per item
+__ECDSA = ec.ECDSA(hashes.SHA256())
+
+
+def _sign_item(item: tuple) -> bytes:
+    """ worker: (data, private_key) -> signature """
+    data, private_key = item
+    private_key = resolve_key(private_key)
+    if isinstance(private_key, ed25519.Ed25519PrivateKey):
+        return private_key.sign(data)
+    return private_key.sign(data, __ECDSA)
+
+
+def _verify_item(item: tuple) -> bool:
+    """ worker: (signature, data, public_key) -> bool """
+    signature, data, public_key = item
+    public_key = resolve_key(public_key)
+    try:
+        if isinstance(public_key, ed25519.Ed25519PublicKey):
+            public_key.verify(signature, data)
+        else:
+            public_key.verify(signature, data, __ECDSA)
+    except InvalidSignature:
+        return False
+    return True
+
+
+def _encrypt_item(item: tuple) -> bytes:
+    """ worker: (unencrypted_data, derived_key) -> encrypted data """
+    return encrypt_with_derived_key(*item)
+
+
+def _decrypt_item(item: tuple) -> bytes:
+    """ worker: (encrypted_data, derived_key) -> decrypted data """
+    return decrypt_with_derived_key(*item)
+
+
+def __assure_keys(items: Iterable[tuple], position: int, assure) -> list:
+    """ private function that checks every distinct key of a batch once """
+    items = list(items)
+    for key in {id(item[position]): item[position] for item in items}.values():
+        assure(key)
+    return items
+
+
+def sign_many(items: Iterable[tuple], executor: Executor = None, workers: int = None,
+              return_exceptions: bool = False) -> list:
+    """
+    Sign many pieces of data, spread over a thread pool or the given (process) pool
+
+    :param items: iterable of (data, private_key)
+    :param executor: thread or process pool to use, keys go to processes as DER once per key
+    :param workers: size of the thread pool made when no executor is given, 1 to run inline
+    :param return_exceptions: return the exception of a failed item as its result instead of raising it
+    :raises InvalidKey: if a given key is invalid
+    :raises Exception: the first exception of an item in input order, unless return_exceptions
+    :return: signatures in input order, Union[bytes, Exception] with return_exceptions
+    """
+    items = __assure_keys(items, 1, __assure_private_key)
+    __assure_keys(items, 1, __assure_signing_key)
+    return run_batch(_sign_item, items, (1,), executor, workers, return_exceptions)
+
+
+def verify_many(items: Iterable[tuple], executor: Executor = None, workers: int = None,
+                return_exceptions: bool = False) -> list:
+    """
+    Verify many signatures, spread over a thread pool or the given (process) pool
+
+    :param items: iterable of (signature, data, public_key)
+    :param executor: thread or process pool to use, keys go to processes as DER once per key
+    :param workers: size of the thread pool made when no executor is given, 1 to run inline
+    :param return_exceptions: return the exception of a failed item as its result instead of raising it
+    :raises InvalidKey: if a given key is invalid
+    :raises Exception: the first exception of an item in input order, unless return_exceptions
+    :return: bool per item in input order, Union[bool, Exception] with return_exceptions
+    """
+    items = __assure_keys(items, 2, __assure_public_key)
+    __assure_keys(items, 2, __assure_signing_key)
+    return run_batch(_verify_item, items, (2,), executor, workers, return_exceptions)
+
+
+def encrypt_many(items: Iterable[tuple], executor: Executor = None, workers: int = None,
+                 return_exceptions: bool = False) -> list:
+    """
+    Encrypt many pieces of data with derived keys, spread over a thread pool or the given (process) pool
+
+    :param items: iterable of (unencrypted_data, derived_key)
+    :param executor: thread or process pool to use
+    :param workers: size of the thread pool made when no executor is given, 1 to run inline
+    :param return_exceptions: return the exception of a failed item as its result instead of raising it
+    :raises Exception: the first exception of an item in input order, unless return_exceptions
+    :return: encrypted data in input order, Union[bytes, Exception] with return_exceptions
+    """
+    return run_batch(_encrypt_item, items, (), executor, workers, return_exceptions)
+
+
+def decrypt_many(items: Iterable[tuple], executor: Executor = None, workers: int = None,
+                 return_exceptions: bool = False) -> list:
+    """
+    Decrypt many pieces of data with derived keys, spread over a thread pool or the given (process) pool
+
+    :param items: iterable of (encrypted_data, derived_key)
+    :param executor: thread or process pool to use
+    :param workers: size of the thread pool made when no executor is given, 1 to run inline
+    :param return_exceptions: return the exception of a failed item as its result instead of raising it
+    :raises Exception: the first exception of an item in input order, unless return_exceptions
+    :return: decrypted data in input order, Union[bytes, Exception] with return_exceptions
+    """
+    return run_batch(_decrypt_item, items, (), executor, workers, return_exceptions)
+
+
+def benchmark_curves(curves: Iterable[str] = CURVES, duration: float = 0.2) -> list:
+    """
+    Measure the operations per second of every curve, an operation a curve can't do is None
+
+    :param curves: names of the curves to measure
+    :param duration: seconds spent on every measurement
+    :return: list of dicts with the keys curve, keygen, exchange, sign and verify
+    """
+    def ops_per_second(operation) -> float:
+        count, start = 0, time.perf_counter()
+        while True:
+            operation()
+            count += 1
+            elapsed = time.perf_counter() - start
+            if elapsed >= duration:
+                return count / elapsed
+
+    data, table = os.urandom(64), []
+    for curve in curves:
+        private_key, peer_private_key = get_private_key(curve), get_private_key(curve)
+        public_key, peer_public_key = private_key.public_key(), peer_private_key.public_key()
+        row = {'curve': curve, 'keygen': ops_per_second(lambda: get_private_key(curve)),
+               'exchange': None, 'sign': None, 'verify': None}
+        if curve != 'Ed25519':
+            row['exchange'] = ops_per_second(lambda: get_shared_key(private_key, peer_public_key))
+        if curve != 'X25519':
+            signature = sign_data(data, private_key)
+            row['sign'] = ops_per_second(lambda: sign_data(data, private_key))
+            row['verify'] = ops_per_second(lambda: verify_signed_data(signature, data, public_key))
+        table.append(row)
+    return table
+
+
+def format_curve_table(table: list) -> str:
+    """
+    Format the result of  benchmark_curves  as a markdown table
+
+    :param table: result of  benchmark_curves
+    :return: markdown table
+    """
+    columns = ('curve', 'keygen', 'exchange', 'sign', 'verify')
+    lines = ['| ' + ' | '.join(columns) + ' |', '|' + '---|' * len(columns)]
+    for row in table:
+        cells = [row['curve']] + ['-' if row[column] is None else '{0:,.0f}'.format(row[column])
+                                  for column in columns[1:]]
+        lines.append('| ' + ' | '.join(cells) + ' |')
+    return '\n'.join(lines)
+
+
 if __name__ == '__main__':
     print("start\n")
 
@@ -385,8 +1141,8 @@ if __name__ == '__main__':
     print(server_derived_key == other_client_derived_key)  # -> False
 
     secret_data = b'secret data'
-    encrypted_msg = encrypt_with_derived_key(server_derived_key, secret_data)
-    uncovered_msg = decrypt_with_derived_key(client_derived_key, encrypted_msg)
+    encrypted_msg = encrypt_with_derived_key(secret_data, server_derived_key)
+    uncovered_msg = decrypt_with_derived_key(encrypted_msg, client_derived_key)
     print(secret_data == uncovered_msg)  # -> True
 
 
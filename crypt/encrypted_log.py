@@ -0,0 +1,323 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# encrypted_log.py
+
+# Append-only log of records encrypted with a password, the key is derived once per file
+# layout:  MAGIC | salt (16) | KDF parameters (4) | nonce prefix (4) | check tag (16) | slot | slot | ...
+# slot:    length (4) | ChaCha20Poly1305 ciphertext + tag, the header is the associated data
+# hole:    0 (4) | tag of an empty plaintext, the header and the 8 byte slot number are the associated data
+# The nonce of a slot is the nonce prefix followed by the 8 byte number of the slot in the file,
+# so records can't be reordered, removed from the middle or moved to another log.
+# The check tag authenticates the header with the last nonce, a wrong password fails on open.
+# A hole replaces a torn record that was cut off, it keeps its number so its nonce is never reused.
+# Holes are authenticated too, a record can't be turned into a hole without the key.
+
+import os
+import secrets
+import struct
+import threading
+import time
+from contextlib import contextmanager
+from typing import Iterable, Iterator, List
+
+try:
+    import fcntl  # lock the file between processes, not available on Windows
+except ImportError:
+    fcntl = None
+
+from cryptography.hazmat.primitives.ciphers.aead import ChaCha20Poly1305
+
+from .chunked import TAG_SIZE, write_all
+from .pwd import HEADER_SIZE, check_kdf_params, derive_key
+
+MAGIC = b'PEL\x01'
+PREFIX_SIZE = 4  # random part of the nonce, 8 counter bytes follow
+LOG_HEADER_SIZE = len(MAGIC) + HEADER_SIZE + PREFIX_SIZE
+LENGTH = struct.Struct('>I')
+HOLE_SIZE = LENGTH.size + TAG_SIZE
+CHECK_COUNTER = (1 << 64) - 1  # nonce of the check tag, a slot never gets this number
+SCAN_SIZE = 64 * 1024  # bytes read at once while indexing
+INDEX_INTERVAL = 64  # records between two entries of the offset index
+
+
+class EncryptedLog:
+    """
+    Writer and reader of an encrypted append-only log
+    Appending encrypts with the derived key and writes the record, no key derivation per record.
+    Records are found by index through a sparse offset index, one entry per  index_interval  records.
+    """
+
+    def __init__(self, path: str, pwd: str, mode: str = 'a', i: int = 100_000,
+                 index_interval: int = INDEX_INTERVAL, sync: bool = False):
+        """
+        :param path: str  log file
+        :param pwd: str  password
+        :param mode: str  'a' to read and append, the file is made if it doesn't exist, 'r' to only read
+        :param i: int  iterations or KDF parameters (pwd.scrypt_params, pwd.calibrate_kdf) of a new file
+        :param index_interval: int  records between two entries of the offset index
+        :param sync: bool  fsync after every append, slower but the records survive a power loss
+        :raises ValueError: if the file is not an encrypted log, mode is unknown or i is out of range
+        :raises InvalidTag: if the password is wrong or the header is altered
+        """
+        if mode not in ('a', 'r'):
+            raise ValueError("Unknown mode: {0}, use 'a' or 'r'".format(mode))
+        self.path = os.path.realpath(path)
+        self.writable = mode == 'a'
+        self.index_interval = max(1, index_interval)
+        self.sync = sync
+        self._lock = threading.RLock()
+        flags = os.O_RDWR | os.O_CREAT | os.O_APPEND if self.writable else os.O_RDONLY
+        self._fd = os.open(self.path, flags | getattr(os, 'O_BINARY', 0), 0o600)
+        self._index: List[tuple] = []  # (offset, slot number) of every index_interval-th record
+        self._count = 0  # amount of records
+        self._slots = 0  # amount of slots, records and holes
+        self._end = LOG_HEADER_SIZE + TAG_SIZE  # end of the last complete slot
+        try:
+            with self._file_lock():
+                if self.writable and os.fstat(self._fd).st_size == 0:
+                    check_kdf_params(i)
+                    zout, prefix = secrets.token_bytes(16), secrets.token_bytes(PREFIX_SIZE)
+                    self._header = b'%b%b%b%b' % (MAGIC, zout, i.to_bytes(4, 'big'), prefix)
+                    self.__set_key(derive_key(pwd, zout, i))
+                    check = self._chacha.encrypt(self._nonce(CHECK_COUNTER), b'', self._header)
+                    self._write(self._header + check, 0)
+                else:
+                    self.__open(pwd)
+                self.refresh(repair=self.writable)
+        except BaseException:
+            self.close()
+            raise
+
+    def __open(self, pwd: str) -> None:
+        """ private method that reads the header of an existing log and derives its key """
+        header = self._read(0, LOG_HEADER_SIZE + TAG_SIZE)
+        if len(header) != LOG_HEADER_SIZE + TAG_SIZE or header[:len(MAGIC)] != MAGIC:
+            raise ValueError("Given file is not an encrypted log: {0}".format(self.path))
+        self._header, check = header[:LOG_HEADER_SIZE], header[LOG_HEADER_SIZE:]
+        zout = self._header[len(MAGIC):len(MAGIC) + 16]
+        i = int.from_bytes(self._header[len(MAGIC) + 16:len(MAGIC) + HEADER_SIZE], 'big')
+        self.__set_key(derive_key(pwd, zout, i))
+        self._chacha.decrypt(self._nonce(CHECK_COUNTER), check, self._header)  # raises InvalidTag
+
+    def __set_key(self, key: bytes) -> None:
+        self._chacha = ChaCha20Poly1305(key)
+        self._prefix = self._header[LOG_HEADER_SIZE - PREFIX_SIZE:]
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+    def close(self) -> None:
+        """ Close the file """
+        with self._lock:
+            if self._fd is not None:
+                os.close(self._fd)
+                self._fd = None
+
+    def __len__(self) -> int:
+        """ amount of records seen by the last refresh """
+        return self._count
+
+    def __getitem__(self, index: int) -> bytes:
+        return self.read(index)
+
+    def __iter__(self) -> Iterator[bytes]:
+        return self.records()
+
+    def _nonce(self, counter: int) -> bytes:
+        return self._prefix + counter.to_bytes(8, 'big')
+
+    def _read(self, offset: int, size: int) -> bytes:
+        if hasattr(os, 'pread'):
+            return os.pread(self._fd, size, offset)
+        with self._lock:
+            os.lseek(self._fd, offset, os.SEEK_SET)
+            return os.read(self._fd, size)
+
+    def _flush(self) -> None:
+        if self.sync:
+            os.fsync(self._fd)
+
+    def _write(self, data: bytes, end: int) -> None:
+        """ append data, on a failed write the file is cut back to end and the error is raised """
+        try:
+            write_all(self._fd, data)  # O_APPEND file, the file lock keeps other writers out
+            self._flush()
+        except BaseException:
+            os.ftruncate(self._fd, end)
+            raise
+
+    def _hole(self, counter: int) -> bytes:
+        """ the hole of a slot, the tag binds it to the slot number and the log """
+        aad = self._header + counter.to_bytes(8, 'big')
+        return LENGTH.pack(0) + self._chacha.encrypt(self._nonce(counter), b'', aad)
+
+    def _check_hole(self, offset: int, counter: int) -> None:
+        """ raise InvalidTag if the hole at offset was not written with the key of this log """
+        tag = self._read(offset + LENGTH.size, TAG_SIZE)
+        self._chacha.decrypt(self._nonce(counter), tag, self._header + counter.to_bytes(8, 'big'))
+
+    @contextmanager
+    def _file_lock(self):
+        """ exclusive lock on the file while appending, so slot numbers of processes don't collide """
+        with self._lock:
+            if fcntl is not None and self.writable:
+                fcntl.flock(self._fd, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                if fcntl is not None and self.writable:
+                    fcntl.flock(self._fd, fcntl.LOCK_UN)
+
+    def refresh(self, repair: bool = False) -> int:
+        """
+        Index the records that were appended since the last refresh, e.g. by another process
+        Only the length of every slot is read, records are decrypted when they are read, holes are checked here.
+        :param repair: bool  replace a torn record at the end by a hole, only while holding the file lock
+        :raises InvalidTag: if a hole is forged, e.g. a record that was turned into a hole
+        :return: int  amount of new records
+        """
+        with self._lock:
+            size = os.fstat(self._fd).st_size
+            count, offset = self._count, self._end
+            window_start, window = offset, b''
+            while offset + LENGTH.size <= size:
+                if offset + LENGTH.size > window_start + len(window):
+                    window_start, window = offset, self._read(offset, SCAN_SIZE)
+                length = LENGTH.unpack_from(window, offset - window_start)[0]
+                slot_size = LENGTH.size + length if length else HOLE_SIZE
+                if offset + slot_size > size:
+                    break  # torn, or still being written by another process
+                if length:
+                    if self._count % self.index_interval == 0:
+                        self._index.append((offset, self._slots))
+                    self._count += 1
+                else:
+                    self._check_hole(offset, self._slots)
+                self._slots += 1
+                offset += slot_size
+            self._end = offset
+            if repair and offset < size:
+                os.ftruncate(self._fd, offset)
+                self._write(self._hole(self._slots), offset)
+                self._slots += 1
+                self._end += HOLE_SIZE
+            return self._count - count
+
+    def append(self, record: bytes) -> int:
+        """
+        Encrypt and append one record
+        :param record: bytes-like object
+        :raises ValueError: if the log is opened read-only
+        :return: int  index of the record
+        """
+        return self.extend([record])
+
+    def extend(self, records: Iterable[bytes]) -> int:
+        """
+        Encrypt and append many records with one write, all or none of them are appended
+        :param records: iterable of bytes-like objects
+        :raises ValueError: if the log is opened read-only
+        :raises OSError: if the records can't be written, the file is cut back to the last complete slot
+        :return: int  index of the last record in the log, -1 if the log is empty
+        """
+        if not self.writable:
+            raise ValueError("Log is opened read-only: {0}".format(self.path))
+        records = list(records)
+        with self._file_lock():
+            self.refresh(repair=True)  # records of other processes, and cut off a torn record
+            slots = []
+            for counter, record in enumerate(records, self._slots):
+                encrypted = self._chacha.encrypt(self._nonce(counter), bytes(record), self._header)
+                slots.append(LENGTH.pack(len(encrypted)) + encrypted)
+            if slots:
+                self._write(b''.join(slots), self._end)
+                self.refresh()
+            return self._count - 1
+
+    def _locate(self, index: int) -> (int, int):
+        """ (offset, slot number) of a record, from the nearest entry of the offset index """
+        if index < 0:
+            index += self._count
+        elif index >= self._count:
+            self.refresh()
+        if not 0 <= index < self._count:
+            raise IndexError("Record index out of range: {0}".format(index))
+        offset, counter = self._index[index // self.index_interval]
+        skip = index % self.index_interval
+        while True:
+            length = LENGTH.unpack(self._read(offset, LENGTH.size))[0]
+            if length:
+                if not skip:
+                    return offset, counter
+                skip -= 1
+            offset += LENGTH.size + length if length else HOLE_SIZE
+            counter += 1
+
+    def _decrypt(self, offset: int, counter: int) -> (bytes, int):
+        """ (record, offset of the next slot) of the slot at offset, None for a hole """
+        length = LENGTH.unpack(self._read(offset, LENGTH.size))[0]
+        if not length:
+            self._check_hole(offset, counter)
+            return None, offset + HOLE_SIZE
+        encrypted = self._read(offset + LENGTH.size, length)
+        return self._chacha.decrypt(self._nonce(counter), encrypted, self._header), offset + LENGTH.size + length
+
+    def read(self, index: int) -> bytes:
+        """
+        Decrypt one record
+        :param index: int  index of the record, negative counts from the end
+        :raises IndexError: if there is no such record
+        :raises InvalidTag: if the record is altered
+        :return: bytes
+        """
+        return self._decrypt(*self._locate(index))[0]
+
+    def records(self, start: int = 0) -> Iterator[bytes]:
+        """
+        Decrypt the records from start up to the end seen by the last refresh
+        :param start: int  index of the first record, negative counts from the end
+        :raises InvalidTag: if a record is altered
+        :return: iterator of bytes
+        """
+        if start < 0:
+            start = max(0, start + self._count)
+        elif start >= self._count:
+            self.refresh()
+        if start >= self._count:
+            return
+        offset, counter = self._locate(start)
+        while offset < self._end:
+            record, offset = self._decrypt(offset, counter)
+            counter += 1
+            if record is not None:
+                yield record
+
+    def tail(self, start: int = None, poll: float = 0.1, timeout: float = None) -> Iterator[bytes]:
+        """
+        Follow the log, yield records as they are appended, by this or another process
+        :param start: int  index of the first record, None for the records appended from now on
+        :param poll: float  seconds between two checks for new records
+        :param timeout: float  stop after this many seconds without a new record, None to follow forever
+        :raises InvalidTag: if a record is altered
+        :return: iterator of bytes
+        """
+        self.refresh()
+        index = self._count if start is None else start if start >= 0 else max(0, start + self._count)
+        waited = 0.0
+        while True:
+            found = False
+            for record in self.records(index):
+                yield record
+                index += 1
+                found = True
+            if found:
+                waited = 0.0
+                continue
+            if timeout is not None and waited >= timeout:
+                return
+            time.sleep(poll)
+            waited += poll
+            self.refresh()
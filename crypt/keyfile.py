@@ -0,0 +1,149 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# keyfile.py
+
+# Key encodings shared by rsa.py and ecc.py and a concurrent loader for many key files
+#   pem  base64 PKCS8 / SubjectPublicKeyInfo, the default
+#   der  the same structures without base64, faster to parse and smaller
+#   raw  only the key bytes, for X25519 and Ed25519, the curve must be known to load it
+
+import os
+import time
+from collections import namedtuple
+from concurrent.futures import Executor, ThreadPoolExecutor
+from typing import Callable, Dict, Iterable
+
+from cryptography.hazmat.backends import default_backend
+from cryptography.hazmat.primitives import serialization
+from cryptography.hazmat.primitives.asymmetric import ed25519, x25519
+
+ENCODINGS = {
+    'pem': serialization.Encoding.PEM,
+    'der': serialization.Encoding.DER,
+    'raw': serialization.Encoding.Raw,
+}
+RAW_KEYS = {  # curve -> (private key class, public key class)
+    'X25519': (x25519.X25519PrivateKey, x25519.X25519PublicKey),
+    'Ed25519': (ed25519.Ed25519PrivateKey, ed25519.Ed25519PublicKey),
+}
+
+
+def file_name(kind: str, name: str = None, encoding: str = 'pem') -> str:
+    """
+    Name of a key file, 'private_key.pem' or '<name>_private_key.der'
+    :param kind: str  'private' or 'public'
+    :param name: str  prefix of the file name, None for the default name
+    :param encoding: str  'pem', 'der' or 'raw'
+    :return: str
+    """
+    return '{0}{1}_key.{2}'.format(name + '_' if name else '', kind, encoding)
+
+
+def __encoding(encoding: str) -> serialization.Encoding:
+    """ private function that looks up an encoding by name """
+    if encoding not in ENCODINGS:
+        raise ValueError("Unknown encoding: {0}, use one of {1}".format(encoding, ', '.join(ENCODINGS)))
+    return ENCODINGS[encoding]
+
+
+def private_bytes(private_key, pwd: bytes = None, encoding: str = 'pem') -> bytes:
+    """
+    Serialize a private key
+    :param private_key: a private key object
+    :param pwd: bytes  if not None, Best available encryption is chosen, not possible for raw
+    :param encoding: str  'pem', 'der' or 'raw'
+    :raises ValueError: if the encoding is unknown or raw is asked for an encrypted or non 25519 key
+    :return: bytes
+    """
+    encryption = serialization.BestAvailableEncryption(pwd) if pwd else serialization.NoEncryption()
+    private_format = serialization.PrivateFormat.PKCS8
+    if encoding == 'raw':
+        if pwd:
+            raise ValueError("A raw private key can't be encrypted")
+        private_format = serialization.PrivateFormat.Raw
+    return private_key.private_bytes(__encoding(encoding), private_format, encryption)
+
+
+def public_bytes(public_key, encoding: str = 'pem') -> bytes:
+    """
+    Serialize a public key
+    :param public_key: a public key object
+    :param encoding: str  'pem', 'der' or 'raw'
+    :raises ValueError: if the encoding is unknown or raw is asked for a non 25519 key
+    :return: bytes
+    """
+    public_format = serialization.PublicFormat.SubjectPublicKeyInfo
+    if encoding == 'raw':
+        public_format = serialization.PublicFormat.Raw
+    return public_key.public_bytes(__encoding(encoding), public_format)
+
+
+def load_private_bytes(data: bytes, pwd: bytes = None, curve: str = None, validate: bool = True):
+    """
+    Load a private key from PEM, DER or raw bytes, PEM and DER are detected
+    :param data: bytes
+    :param pwd: bytes  if the private key is locked with an password
+    :param curve: str  'X25519' or 'Ed25519' if data is a raw key
+    :param validate: bool  False skips the (slow) consistency check of RSA keys, only for trusted keys
+    :return: a private key object
+    """
+    if curve is not None:
+        return RAW_KEYS[curve][0].from_private_bytes(bytes(data))
+    options = {} if validate else {'unsafe_skip_rsa_key_validation': True}
+    if data[:5] == b'-----':
+        return serialization.load_pem_private_key(data, pwd, default_backend(), **options)
+    return serialization.load_der_private_key(data, pwd, default_backend(), **options)
+
+
+def load_public_bytes(data: bytes, curve: str = None):
+    """
+    Load a public key from PEM, DER or raw bytes, PEM and DER are detected
+    :param data: bytes
+    :param curve: str  'X25519' or 'Ed25519' if data is a raw key
+    :return: a public key object
+    """
+    if curve is not None:
+        return RAW_KEYS[curve][1].from_public_bytes(bytes(data))
+    if data[:5] == b'-----':
+        return serialization.load_pem_public_key(data, default_backend())
+    return serialization.load_der_public_key(data, default_backend())
+
+
+class LoadReport(namedtuple('LoadReport', ['keys', 'errors', 'seconds'])):
+    """ Loaded keys and failures per path with the wall time of the load """
+
+    @property
+    def keys_per_second(self) -> float:
+        return len(self.keys) / self.seconds if self.seconds else 0.0
+
+
+def load_key_files(paths: Iterable[str], load: Callable[[bytes], object],
+                   executor: Executor = None, workers: int = None) -> LoadReport:
+    """
+    Read and parse many key files concurrently
+    A file that fails is reported in errors, the other files still load.
+    :param paths: iterable of str  key files
+    :param load: callable  load(data) returns the key object
+    :param executor: Executor  thread pool to use, it is not shut down
+    :param workers: int  size of the thread pool made when no executor is given, 1 to load inline
+    :return: LoadReport  keys and errors as dicts on path
+    """
+    def read(path: str):
+        try:
+            with open(path, 'rb') as open_file:
+                return path, load(open_file.read()), None
+        except Exception as error:
+            return path, None, error
+
+    start = time.perf_counter()
+    paths = list(dict.fromkeys(paths))
+    if executor is not None:
+        results = list(executor.map(read, paths))
+    elif workers == 1 or len(paths) < 2:
+        results = list(map(read, paths))
+    else:
+        with ThreadPoolExecutor(max_workers=workers or min(32, (os.cpu_count() or 1) * 4)) as pool:
+            results = list(pool.map(read, paths))
+    keys: Dict[str, object] = {path: key for path, key, error in results if error is None}
+    errors: Dict[str, Exception] = {path: error for path, key, error in results if error is not None}
+    return LoadReport(keys, errors, time.perf_counter() - start)
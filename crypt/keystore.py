@@ -0,0 +1,254 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# keystore.py
+
+# Many keys in one append-only file
+# layout:  MAGIC | record | record | ...
+# record:  crc32 (4) | size (4) | kind (1) | fingerprint (32) | key id size (2) | key id | DER
+# The crc covers everything after it, a torn write at the end of the file is detected and cut off.
+# Public keys are stored as SubjectPublicKeyInfo, private keys as PKCS8, always BestAvailableEncryption with a password.
+# A key id that is added again points to the newest record, older records stay in the file.
+
+import mmap
+import os
+import struct
+import threading
+import zlib
+from contextlib import contextmanager
+from typing import Iterator, List
+
+try:
+    import fcntl  # lock the file between processes, not available on Windows
+except ImportError:
+    fcntl = None
+
+from .cache import LRUCache, hash_key
+from .chunked import write_all
+from .ecc import public_key_fingerprint
+from .keyfile import load_private_bytes, load_public_bytes, private_bytes, public_bytes
+
+MAGIC = b'PKS\x01'
+RECORD = struct.Struct('>IIB32sH')  # crc32, size of key id + DER, kind, fingerprint, size of key id
+PUBLIC, PRIVATE = 0, 1
+
+
+class KeyStore:
+    """
+    Append-only file of keys with an in-memory index on key id and fingerprint
+    Lookups read the memory-mapped file and parse a key once, parsed keys are kept in an LRUCache.
+    """
+
+    def __init__(self, path: str, cache_size: int = 1024):
+        """
+        :param path: str  keystore file, made if it doesn't exist
+        :param cache_size: int  amount of parsed keys to keep
+        :raises ValueError: if the file is not a keystore
+        """
+        self.path = os.path.realpath(path)
+        self.cache = LRUCache(maxsize=cache_size)
+        self._lock = threading.RLock()
+        self._fd = os.open(self.path, os.O_RDWR | os.O_CREAT | os.O_APPEND | getattr(os, 'O_BINARY', 0), 0o600)
+        self._map = None
+        self._end = len(MAGIC)  # end of the last complete record
+        self._ids = ({}, {})  # per kind: key id -> offset
+        self._fingerprints = ({}, {})  # per kind: fingerprint -> offset
+        try:
+            with self._lock, self._file_lock():
+                if os.fstat(self._fd).st_size == 0:
+                    try:
+                        write_all(self._fd, MAGIC)
+                        os.fsync(self._fd)
+                    except BaseException:
+                        os.ftruncate(self._fd, 0)  # a later open doesn't find half a MAGIC
+                        raise
+                valid = os.lseek(self._fd, 0, os.SEEK_SET) == 0 and os.read(self._fd, len(MAGIC)) == MAGIC
+                if valid:
+                    self.refresh(repair=True)
+        except BaseException:
+            self.close()
+            raise
+        if not valid:
+            self.close()
+            raise ValueError("Given file is not a keystore: {0}".format(self.path))
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+    def close(self) -> None:
+        """ Close the file and wipe the cached keys """
+        with self._lock:
+            if self._map is not None:
+                self._map.close()
+                self._map = None
+            if self._fd is not None:
+                os.close(self._fd)
+                self._fd = None
+        self.cache.clear()
+
+    def __len__(self) -> int:
+        """ amount of distinct key ids """
+        return len(set(self._ids[PUBLIC]) | set(self._ids[PRIVATE]))
+
+    def __contains__(self, key_id: str) -> bool:
+        return key_id in self._ids[PUBLIC] or key_id in self._ids[PRIVATE]
+
+    def key_ids(self, kind: int = None) -> List[str]:
+        """
+        :param kind: int  PUBLIC or PRIVATE, None for both
+        :return: list  key ids in the order they were first added
+        """
+        if kind is not None:
+            return list(self._ids[kind])
+        return list(dict.fromkeys(list(self._ids[PUBLIC]) + list(self._ids[PRIVATE])))
+
+    @contextmanager
+    def _file_lock(self):
+        """ exclusive lock on the file while appending, so records of processes don't interleave """
+        if fcntl is not None:
+            fcntl.flock(self._fd, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            if fcntl is not None:
+                fcntl.flock(self._fd, fcntl.LOCK_UN)
+
+    def refresh(self, repair: bool = False) -> int:
+        """
+        Index the records that were appended since the last refresh, e.g. by another process
+        A replaced key id is looked up at its new record, key objects returned before are not changed.
+        :param repair: bool  cut off a torn record at the end, only while holding the file lock
+        :return: int  amount of new records
+        """
+        with self._lock:
+            size = os.fstat(self._fd).st_size
+            if size <= self._end:
+                return 0
+            if self._map is not None:
+                self._map.close()
+            self._map = mmap.mmap(self._fd, size, access=mmap.ACCESS_READ)
+            count = 0
+            for offset, kind, fingerprint, key_id, end in self._scan(self._end, size):
+                self._ids[kind][key_id] = offset
+                self._fingerprints[kind][fingerprint] = offset
+                self._end = end
+                count += 1
+            if repair and self._end < size:
+                os.ftruncate(self._fd, self._end)
+            return count
+
+    def _scan(self, offset: int, size: int) -> Iterator[tuple]:
+        """ yield (offset, kind, fingerprint, key id, end) of the complete records between offset and size """
+        view = self._map
+        while offset + RECORD.size <= size:
+            crc, length, kind, fingerprint, id_size = RECORD.unpack_from(view, offset)
+            end = offset + RECORD.size + length
+            if end > size or zlib.crc32(view[offset + 4:end]) != crc:
+                return  # torn write
+            start = offset + RECORD.size
+            yield offset, kind, fingerprint, view[start:start + id_size].decode('utf-8'), end
+            offset = end
+
+    def _append(self, records: List[tuple]) -> None:
+        """
+        append (kind, key id, fingerprint, DER) records with one write, all or none of them are stored
+        :raises OSError: if the records can't be written, the file is cut back to the last complete record
+        """
+        data = []
+        for kind, key_id, fingerprint, der in records:
+            encoded_id = key_id.encode('utf-8')
+            body = RECORD.pack(0, len(encoded_id) + len(der), kind, fingerprint, len(encoded_id))[4:]
+            body += encoded_id + der
+            data.append(struct.pack('>I', zlib.crc32(body)) + body)
+        with self._lock, self._file_lock():
+            self.refresh(repair=True)  # records of other processes, and cut off a torn record
+            try:
+                write_all(self._fd, b''.join(data))  # O_APPEND file, the file lock keeps other writers out
+                os.fsync(self._fd)
+            except BaseException:
+                os.ftruncate(self._fd, self._end)  # none of the records is stored
+                raise
+            self.refresh()
+
+    def add_public_key(self, key_id: str, public_key) -> bytes:
+        """
+        Append a public key (RSA, EC, X25519 or Ed25519)
+        :param key_id: str  name to look the key up with, a key id that exists is replaced
+        :param public_key: a public key object
+        :return: bytes  fingerprint, SHA-256 of the SubjectPublicKeyInfo
+        """
+        return self.add_public_keys({key_id: public_key})[key_id]
+
+    def add_public_keys(self, public_keys: dict) -> dict:
+        """
+        Append many public keys with one write and one fsync
+        :param public_keys: dict  key id -> public key object
+        :return: dict  key id -> fingerprint
+        """
+        records = [(PUBLIC, key_id, public_key_fingerprint(public_key), public_bytes(public_key, 'der'))
+                   for key_id, public_key in public_keys.items()]
+        self._append(records)
+        return {key_id: fingerprint for _, key_id, fingerprint, _ in records}
+
+    def add_private_key(self, key_id: str, private_key, pwd: bytes) -> bytes:
+        """
+        Append a private key, encrypted with BestAvailableEncryption, a private key is never stored in the clear
+        :param key_id: str  name to look the key up with, a key id that exists is replaced
+        :param private_key: a private key object
+        :param pwd: bytes  password to encrypt the key with
+        :raises ValueError: if no password is given
+        :return: bytes  fingerprint of its public key
+        """
+        if not pwd:
+            raise ValueError("A password is needed to store a private key")
+        fingerprint = public_key_fingerprint(private_key)
+        self._append([(PRIVATE, key_id, fingerprint, private_bytes(private_key, pwd, 'der'))])
+        return fingerprint
+
+    def _load(self, offset: int, kind: int, pwd: bytes = None):
+        cache_key = (offset, hash_key(pwd) if kind == PRIVATE else None)
+        key = self.cache.get(cache_key)
+        if key is not None:
+            return key
+        with self._lock:
+            _, length, _, _, id_size = RECORD.unpack_from(self._map, offset)
+            der = self._map[offset + RECORD.size + id_size:offset + RECORD.size + length]
+        key = load_public_bytes(der) if kind == PUBLIC else load_private_bytes(der, pwd)
+        self.cache.put(cache_key, key)
+        return key
+
+    def __offset(self, kind: int, key_id: str = None, fingerprint: bytes = None) -> int:
+        """ private function that finds a record, refreshes once if it is not indexed yet """
+        for _ in range(2):
+            offset = (self._ids[kind].get(key_id) if fingerprint is None
+                      else self._fingerprints[kind].get(fingerprint))
+            if offset is not None:
+                return offset
+            if not self.refresh():
+                break
+        raise KeyError(key_id if fingerprint is None else fingerprint.hex())
+
+    def get_public_key(self, key_id: str = None, fingerprint: bytes = None):
+        """
+        Look up a public key by key id or fingerprint
+        :param key_id: str
+        :param fingerprint: bytes  SHA-256 of the SubjectPublicKeyInfo
+        :raises KeyError: if the key is not in the store
+        :return: a public key object
+        """
+        return self._load(self.__offset(PUBLIC, key_id, fingerprint), PUBLIC)
+
+    def get_private_key(self, key_id: str = None, pwd: bytes = None, fingerprint: bytes = None):
+        """
+        Look up a private key by key id or the fingerprint of its public key
+        :param key_id: str
+        :param pwd: bytes  password the key was stored with
+        :param fingerprint: bytes  SHA-256 of the SubjectPublicKeyInfo of its public key
+        :raises KeyError: if the key is not in the store
+        :raises ValueError: if the password is wrong
+        :raises TypeError: if no password is given
+        :return: a private key object
+        """
+        return self._load(self.__offset(PRIVATE, key_id, fingerprint), PRIVATE, pwd)
@@ -0,0 +1,239 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# merkle.py
+
+# Sign large data as a Merkle tree of chunk hashes, only the root is signed
+# proof:  MAGIC | chunk size (4) | data size (8) | chunk count (4) | signature size (2) | signature | nodes
+# The nodes are SHA-256 hashes level by level, leaves first and the root last.
+#   leaf = sha256(0x00 | chunk)    node = sha256(0x01 | left | right)    an odd last node moves up as it is
+# The signature covers the header fields and the root.
+# A single chunk is verified with the log2(n) sibling hashes on its path, read from the proof by offset.
+
+import hashlib
+import mmap
+import os
+from concurrent.futures import ThreadPoolExecutor
+from struct import Struct
+from typing import BinaryIO, Callable, List
+
+from cryptography.hazmat.primitives.asymmetric import rsa as _rsa
+
+from . import ecc, rsa
+from .chunked import HASH_CHUNK_SIZE, check_chunk_size, read_chunks, read_exact
+
+MAGIC = b'MKL\x01'
+HEADER = Struct('>4sIQIH')  # magic, chunk size, data size, chunk count, signature size
+HASH_SIZE = 32
+
+
+def leaf_hash(chunk: bytes) -> bytes:
+    """
+    Hash of one chunk, hashlib releases the GIL on large buffers so chunks hash in parallel in threads
+    :param chunk: bytes-like object
+    :return: bytes  32 byte hash
+    """
+    digest = hashlib.sha256(b'\x00')
+    digest.update(chunk)
+    return digest.digest()
+
+
+def node_hash(left: bytes, right: bytes) -> bytes:
+    """
+    Hash of two child nodes
+    :param left: bytes
+    :param right: bytes
+    :return: bytes  32 byte hash
+    """
+    return hashlib.sha256(b'\x01' + left + right).digest()
+
+
+def level_sizes(count: int) -> List[int]:
+    """
+    Amount of nodes per level of a tree with count leaves
+    :param count: int  amount of leaves
+    :return: list  leaves first, the root level (1) last
+    """
+    sizes = [count]
+    while sizes[-1] > 1:
+        sizes.append((sizes[-1] + 1) // 2)
+    return sizes
+
+
+def build_tree(leaves: List[bytes]) -> List[List[bytes]]:
+    """
+    Build every level of the tree
+    :param leaves: list  leaf hashes
+    :return: list of levels, leaves first and [root] last
+    """
+    levels = [list(leaves)]
+    while len(levels[-1]) > 1:
+        level = levels[-1]
+        levels.append([node_hash(level[index], level[index + 1]) if index + 1 < len(level) else level[index]
+                       for index in range(0, len(level), 2)])
+    return levels
+
+
+def hash_chunks(file: (str, BinaryIO), chunk_size: int = HASH_CHUNK_SIZE, workers: int = None) -> List[bytes]:
+    """
+    Hash the chunks of a file in a thread pool
+    Regular files are memory-mapped and hashed without copies, other file-like objects are read in order
+    with a bounded amount of chunks in flight.
+    :param file: str or file-like object  path or file opened in binary mode, read from its current position
+    :param chunk_size: int  bytes per chunk
+    :param workers: int  threads, None for the amount of cores, 1 to hash inline
+    :raises ValueError: if chunk_size is below 1 or above chunked.MAX_CHUNK_SIZE
+    :return: list  leaf hashes, one empty leaf for empty data
+    """
+    check_chunk_size(chunk_size)
+    if isinstance(file, str):
+        with open(file, 'rb') as open_file:
+            return hash_chunks(open_file, chunk_size, workers)
+    workers = workers or os.cpu_count() or 1
+    try:
+        mapped = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+    except (AttributeError, OSError, ValueError):  # no fileno, an empty file, a pipe
+        mapped = None
+
+    if mapped is not None:
+        with mapped:
+            view = memoryview(mapped)
+            try:
+                start = file.tell()
+                offsets = range(start, len(view), chunk_size) or [start]
+                hash_at = lambda offset: leaf_hash(view[offset:offset + chunk_size])
+                if workers == 1:
+                    leaves = list(map(hash_at, offsets))
+                else:
+                    with ThreadPoolExecutor(max_workers=workers) as executor:
+                        leaves = list(executor.map(hash_at, offsets))
+            finally:
+                view.release()
+        file.seek(0, os.SEEK_END)  # consumed like the read path
+        return leaves
+
+    leaves, window = [], []
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        for chunk in read_chunks(file, chunk_size):
+            window.append(executor.submit(leaf_hash, chunk))
+            if len(window) >= workers * 2:
+                leaves += [future.result() for future in window]
+                window = []
+        leaves += [future.result() for future in window]
+    return leaves or [leaf_hash(b'')]
+
+
+def __signed_data(chunk_size: int, size: int, count: int, root: bytes) -> bytes:
+    """ private function that builds what the signature covers """
+    return HEADER.pack(MAGIC, chunk_size, size, count, 0)[:-2] + root
+
+
+def sign_tree(file: (str, BinaryIO), private_key, chunk_size: int = HASH_CHUNK_SIZE,
+              workers: int = None) -> bytes:
+    """
+    Hash the data as a Merkle tree in a thread pool and sign the root
+    :param file: str or file-like object  path or file opened in binary mode
+    :param private_key: RSA or ECC (EC, Ed25519) private key
+    :param chunk_size: int  bytes per chunk, the unit of  verify_chunk
+    :param workers: int  threads, None for the amount of cores, 1 to hash inline
+    :raises ValueError: if chunk_size is below 1 or above chunked.MAX_CHUNK_SIZE
+    :return: bytes  the proof, about 64 bytes per chunk plus the signature
+    """
+    check_chunk_size(chunk_size)
+    if isinstance(file, str):
+        with open(file, 'rb') as open_file:
+            return sign_tree(open_file, private_key, chunk_size, workers)
+    start = file.tell() if hasattr(file, 'tell') else 0
+    leaves = hash_chunks(file, chunk_size, workers)
+    size = file.tell() - start if hasattr(file, 'tell') else None
+    if size is None:
+        raise ValueError("Size of the data is unknown, give a path or a file with tell()")
+    levels = build_tree(leaves)
+    signed = __signed_data(chunk_size, size, len(leaves), levels[-1][0])
+    if isinstance(private_key, _rsa.RSAPrivateKey):
+        signature = rsa.sign_message(signed, private_key)
+    else:
+        signature = ecc.sign_data(signed, private_key)
+    header = HEADER.pack(MAGIC, chunk_size, size, len(leaves), len(signature))
+    return b''.join([header, signature] + [node for level in levels for node in level])
+
+
+def __reader(proof: (bytes, BinaryIO)) -> Callable[[int, int], bytes]:
+    """ private function that returns read(offset, size) over proof bytes or a seekable file """
+    if hasattr(proof, 'read'):
+        def read(offset: int, size: int) -> bytes:
+            proof.seek(offset)
+            return read_exact(proof.read, size)
+        return read
+    view = memoryview(proof)
+    return lambda offset, size: bytes(view[offset:offset + size])
+
+
+def __header(read: Callable[[int, int], bytes]) -> tuple:
+    """ private function that returns (chunk size, data size, chunk count, signature size) of a proof """
+    header = read(0, HEADER.size)
+    if len(header) != HEADER.size or header[:4] != MAGIC:
+        raise ValueError("Given proof is not made by sign_tree")
+    header = HEADER.unpack(header)[1:]
+    check_chunk_size(header[0])  # a crafted chunk size of 0 would divide by zero
+    return header
+
+
+def __verify_root(read: Callable[[int, int], bytes], header: tuple, root: bytes, public_key) -> bool:
+    """ private function that checks the signature of the proof over the header fields and root """
+    chunk_size, size, count, signature_size = header
+    signature = read(HEADER.size, signature_size)
+    signed = __signed_data(chunk_size, size, count, root)
+    if isinstance(public_key, _rsa.RSAPublicKey):
+        return rsa.verify_signed_message(signature, signed, public_key)
+    return ecc.verify_signed_data(signature, signed, public_key)
+
+
+def verify_chunk(proof: (bytes, str, BinaryIO), index: int, chunk: bytes, public_key) -> bool:
+    """
+    Verify one chunk without the rest of the data, only the hashes on its path are read from the proof
+    :param proof: bytes, str or file-like object  proof made by  sign_tree, as bytes, path or seekable file
+    :param index: int  index of the chunk, the chunk starts at index * chunk size in the data
+    :param chunk: bytes-like object  the chunk
+    :param public_key: RSA or ECC public key of the signer
+    :raises ValueError: if proof is not made by  sign_tree, or its chunk size is out of range
+    :return: bool
+    """
+    if isinstance(proof, str):
+        with open(proof, 'rb') as open_file:
+            return verify_chunk(open_file, index, chunk, public_key)
+    read = __reader(proof)
+    header = __header(read)
+    chunk_size, size, count, signature_size = header
+    if not 0 <= index < count or len(chunk) != min(chunk_size, size - index * chunk_size):
+        return False
+
+    node, position, start = leaf_hash(chunk), index, HEADER.size + signature_size
+    for level_size in level_sizes(count)[:-1]:
+        sibling = position ^ 1
+        if sibling < level_size:
+            sibling_hash = read(start + sibling * HASH_SIZE, HASH_SIZE)
+            node = node_hash(node, sibling_hash) if position % 2 == 0 else node_hash(sibling_hash, node)
+        start += level_size * HASH_SIZE
+        position //= 2
+    return __verify_root(read, header, node, public_key)
+
+
+def verify_tree(proof: (bytes, str, BinaryIO), file: (str, BinaryIO), public_key, workers: int = None) -> bool:
+    """
+    Verify all data against a proof, the chunks are hashed in a thread pool
+    :param proof: bytes, str or file-like object  proof made by  sign_tree
+    :param file: str or file-like object  path or file opened in binary mode
+    :param public_key: RSA or ECC public key of the signer
+    :param workers: int  threads, None for the amount of cores, 1 to hash inline
+    :raises ValueError: if proof is not made by  sign_tree, or its chunk size is out of range
+    :return: bool
+    """
+    if isinstance(proof, str):
+        with open(proof, 'rb') as open_file:
+            return verify_tree(open_file, file, public_key, workers)
+    read = __reader(proof)
+    header = __header(read)
+    leaves = hash_chunks(file, header[0], workers)
+    if len(leaves) != header[2]:
+        return False
+    return __verify_root(read, header, build_tree(leaves)[-1][0], public_key)
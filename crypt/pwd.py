@@ -1,34 +1,494 @@
 #!/usr/bin/env python3
+import os
 import secrets
+import statistics
+import time
 from base64 import urlsafe_b64encode as b64e, urlsafe_b64decode as b64d
+from concurrent.futures import ThreadPoolExecutor
+from typing import BinaryIO, Iterable, Iterator
 
-from cryptography.fernet import Fernet
+from cryptography.exceptions import InvalidTag
+from cryptography.fernet import Fernet, InvalidToken
 from cryptography.hazmat.backends import default_backend
 from cryptography.hazmat.primitives import hashes
+from cryptography.hazmat.primitives.ciphers.aead import ChaCha20Poly1305
 from cryptography.hazmat.primitives.kdf.pbkdf2 import PBKDF2HMAC
+from cryptography.hazmat.primitives.kdf.scrypt import Scrypt
 
+if __name__ == '__main__' and not __package__:  # python crypt/pwd.py, the imports below are package-relative
+    import sys
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    __package__ = 'crypt'
 
-def __derive_key(pwd: bytes, zout: bytes, i: int = 100_000) -> bytes:
-    kdf = PBKDF2HMAC(hashes.SHA256(), 32, zout, i, default_backend())
-    return b64e(kdf.derive(pwd))
+from .cache import LRUCache, hash_key
+from .chunked import CHUNK_SIZE, NONCE_PREFIX_SIZE, TAG_SIZE, IterableReader, check_chunk_size, \
+    decrypt_chunks, decrypt_into, encrypt_chunks, encrypt_into, read_chunks, read_exact, rechunk
 
+HEADER_SIZE = 20  # 16 bytes salt + 4 bytes iterations
 
-def pwd_encrypt(message: (str, bytes), pwd: str, i: int = 100_000) -> bytes:
-    message = message if isinstance(message, bytes) else message.encode('utf-8')
+# The 4 bytes after the salt hold the KDF parameters, the highest byte is the KDF identifier.
+# PBKDF2 (0) uses the other 3 bytes as iterations, so every existing token keeps its meaning.
+# Scrypt (1) uses them as log2(n), r and p, build them with  scrypt_params.
+KDF_PBKDF2 = 0
+KDF_SCRYPT = 1
+MAX_PBKDF2_ITERATIONS = (1 << 24) - 1
+MAX_SCRYPT_LOG_N = 24  # n = 2 ** 24 with r = 8 takes 16 GiB
+KDF_MAX_MEMORY = 1 << 30  # default limit of  set_kdf_limits, n = 2 ** 20 with r = 8
+KDF_MAX_ITERATIONS = 5_000_000  # default limit of  set_kdf_limits, a few seconds of PBKDF2
+RAW_VERSION = b'\x01'  # first byte of a raw token, not in the base64 alphabet so the formats can't be confused
+RAW_HEADER_SIZE = len(RAW_VERSION) + HEADER_SIZE
+RAW_OVERHEAD = RAW_HEADER_SIZE + 12 + TAG_SIZE  # a raw token is this much longer than its message
+
+key_cache = None  # opt-in LRUCache of derived keys, see enable_key_cache
+# the KDF parameters of a token or stream come from its header, these limits keep a forged header from
+# making a decrypt take all memory or minutes of CPU, see set_kdf_limits
+kdf_max_memory = KDF_MAX_MEMORY
+kdf_max_iterations = KDF_MAX_ITERATIONS
+
+
+def enable_key_cache(maxsize: int = 128, ttl: float = 300.0) -> LRUCache:
+    """
+    Cache derived keys so tokens that share a password, salt and iterations skip the key derivation
+    The cache is keyed on a keyed hash of (password, salt, iterations), the password itself is not kept.
+    :param maxsize: int  maximum amount of cached keys
+    :param ttl: float  seconds a derived key stays cached
+    :return: LRUCache  with hit/miss counters, call  clear()  to wipe the cached keys
+    """
+    global key_cache
+    disable_key_cache()
+    key_cache = LRUCache(maxsize, ttl)
+    return key_cache
+
+
+def disable_key_cache() -> None:
+    """ Wipe the cached derived keys and stop caching """
+    global key_cache
+    if key_cache is not None:
+        key_cache.clear()
+    key_cache = None
+
+
+def set_kdf_limits(max_memory: int = KDF_MAX_MEMORY, max_iterations: int = KDF_MAX_ITERATIONS) -> None:
+    """
+    Set the most expensive key derivation that is run, for encryption and for the headers of decrypted data
+    A header above the limits raises ValueError before the KDF runs.
+    :param max_memory: int  bytes Scrypt may use, about 128 * r * n
+    :param max_iterations: int  PBKDF2 iterations
+    :return: None
+    """
+    global kdf_max_memory, kdf_max_iterations
+    kdf_max_memory, kdf_max_iterations = max_memory, max_iterations
+
+
+class ScryptParams(int):
+    """
+    KDF parameters made by  scrypt_params, an int so it goes into the header as it is
+    The encrypt functions take an  i  above MAX_PBKDF2_ITERATIONS only as ScryptParams,
+    so PBKDF2 iterations can't turn into Scrypt parameters by accident.
+    Parameters that were stored as an int are passed as  ScryptParams(i).
+    """
+
+
+def scrypt_params(n: int = 2 ** 14, r: int = 8, p: int = 1) -> ScryptParams:
+    """
+    Build the KDF parameters for Scrypt, pass the result as  i  to the encrypt functions
+    :param n: int  CPU/memory cost, a power of 2 up to 2 ** MAX_SCRYPT_LOG_N
+    :param r: int  block size, 1 - 255
+    :param p: int  parallelization, 1 - 255
+    :raises ValueError: if a parameter doesn't fit in the header
+    :return: ScryptParams  4 byte KDF parameters
+    """
+    if n < 2 or n & (n - 1) or n.bit_length() - 1 > MAX_SCRYPT_LOG_N or not 0 < r < 256 or not 0 < p < 256:
+        raise ValueError("Invalid scrypt parameters, n: {0} r: {1} p: {2}".format(n, r, p))
+    return ScryptParams(KDF_SCRYPT << 24 | (n.bit_length() - 1) << 16 | r << 8 | p)
+
+
+def check_kdf_params(i: int) -> int:
+    """
+    Check the  i  given to an encrypt function before it goes into a header
+    :param i: int  PBKDF2 iterations, or ScryptParams from  scrypt_params  or  calibrate_kdf
+    :raises ValueError: if PBKDF2 iterations are out of range or Scrypt parameters are invalid
+    :return: int  i
+    """
+    if isinstance(i, ScryptParams):
+        log_n, r, p = i >> 16 & 0xff, i >> 8 & 0xff, i & 0xff
+        if i >> 24 != KDF_SCRYPT or not 0 < log_n <= MAX_SCRYPT_LOG_N or not r or not p:
+            raise ValueError("Invalid scrypt parameters: {0:#010x}".format(i))
+    elif not 0 < i <= MAX_PBKDF2_ITERATIONS:
+        raise ValueError("PBKDF2 iterations must be between 1 and {0}, use scrypt_params for Scrypt: {1}".format(
+            MAX_PBKDF2_ITERATIONS, i))
+    return i
+
+
+def __get_kdf(zout: bytes, i: int):
+    """ private function that returns the KDF object described by the 4 byte KDF parameters """
+    kdf_id = i >> 24
+    if kdf_id == KDF_PBKDF2 and i > 0:
+        if i > kdf_max_iterations:
+            raise ValueError("PBKDF2 iterations above the limit of {0}, see set_kdf_limits: {1}".format(
+                kdf_max_iterations, i))
+        return PBKDF2HMAC(hashes.SHA256(), 32, zout, i, default_backend())
+    if kdf_id == KDF_SCRYPT and 0 < i >> 16 & 0xff <= MAX_SCRYPT_LOG_N and i >> 8 & 0xff and i & 0xff:
+        n, r, p = 1 << (i >> 16 & 0xff), i >> 8 & 0xff, i & 0xff
+        if 128 * r * n > kdf_max_memory:
+            raise ValueError("Scrypt needs {0} bytes, above the limit of {1}, see set_kdf_limits".format(
+                128 * r * n, kdf_max_memory))
+        return Scrypt(zout, 32, n, r, p, default_backend())
+    raise ValueError("Unknown KDF parameters: {0:#010x}, PBKDF2 iterations must be below {1}".format(
+        i, MAX_PBKDF2_ITERATIONS + 1))
+
+
+def calibrate_kdf(target: float = 0.05, kdf: int = KDF_PBKDF2, rounds: int = 3) -> int:
+    """
+    Benchmark this host and choose KDF parameters that take about  target  seconds to derive
+    :param target: float  seconds a single key derivation should take
+    :param kdf: int  KDF_PBKDF2 or KDF_SCRYPT
+    :param rounds: int  measurements per step, the median is used
+    :return: int  KDF parameters to pass as  i  to the encrypt functions
+    """
+    def measure(i: int) -> float:
+        timings = []
+        for _ in range(rounds):
+            start = time.perf_counter()
+            __get_kdf(bytes(16), i).derive(b'calibration')
+            timings.append(time.perf_counter() - start)
+        return statistics.median(timings)
+
+    if kdf == KDF_PBKDF2:
+        probe = 10_000
+        iterations = int(probe * target / max(measure(probe), 1e-9))
+        return min(max(iterations, 1_000), kdf_max_iterations)
+    if kdf == KDF_SCRYPT:
+        log_n = 10
+        # double n while the doubled cost stays within target, n = 2 ** 20 already takes 1 GiB
+        while log_n < 20 and 128 * 8 << log_n + 1 <= kdf_max_memory and \
+                2 * measure(scrypt_params(1 << log_n)) <= target:
+            log_n += 1
+        return scrypt_params(1 << log_n)
+    raise ValueError("Unknown KDF: {0}".format(kdf))
+
+
+def __derive_raw_key(pwd: bytes, zout: bytes, i: int = 100_000) -> bytes:
+    cache = key_cache
+    if cache is not None:
+        cache_key = hash_key(pwd, zout, i)
+        key = cache.get_copy(cache_key)  # copied under the cache lock, another thread may wipe the cached key
+        if key is not None:
+            return key
+    key = __get_kdf(zout, i).derive(pwd)
+    if cache is not None:
+        cache.put(cache_key, bytearray(key))  # bytearray so clear() can wipe it
+    return key
+
+
+def derive_key(pwd: str, zout: bytes, i: int = 100_000) -> bytes:
+    """
+    Derive the raw 32 byte key of a salt + iterations header, goes through the key cache if enabled
+    For formats built on top of the pwd header.
+    :param pwd: str  password
+    :param zout: bytes  16 byte salt
+    :param i: int  iterations or KDF parameters from  scrypt_params  or  calibrate_kdf
+    :return: bytes  32 byte key
+    """
+    return __derive_raw_key(pwd.encode(), zout, i)
+
+
+def pwd_encrypt(message: (str, bytes), pwd: str, i: int = 100_000, raw: bool = False) -> bytes:
+    """
+    Encrypt a message with a password
+    :param message: str or bytes-like object  the message to encrypt
+    :param pwd: str  password
+    :param i: int  iterations or KDF parameters (scrypt_params, calibrate_kdf) of the key derivation
+    :param raw: bool  False: urlsafe base64 token (Fernet)
+                      True: binary token, RAW_VERSION + salt + iterations + nonce + ChaCha20Poly1305 ciphertext
+                            no base64 is involved, it is 25% smaller and meant for binary files and sockets
+    :raises ValueError: if i is out of range, see check_kdf_params
+    :return: bytes  token
+    """
+    check_kdf_params(i)
     zout = secrets.token_bytes(16)
-    key = __derive_key(pwd.encode(), zout, i)
-    return b64e(b'%b%b%b' % (zout, i.to_bytes(4, 'big'), b64d(Fernet(key).encrypt(message))))
+    return __encrypt_token(message, __derive_raw_key(pwd.encode(), zout, i), zout, i, raw)
 
 
-def pwd_decrypt(token: bytes, pwd: str) -> bytes:
+def pwd_encrypt_many(messages: Iterable[bytes], pwd: str, i: int = 100_000, raw: bool = False) -> list:
+    """
+    Encrypt many messages with a single key derivation, all tokens share one salt
+    Every token still gets its own random IV or nonce.
+    :param messages: iterable of str or bytes  the messages to encrypt
+    :param pwd: str  password
+    :param i: int  iterations or KDF parameters (scrypt_params, calibrate_kdf) of the key derivation
+    :param raw: bool  see  pwd_encrypt
+    :raises ValueError: if i is out of range, see check_kdf_params
+    :return: list  tokens in input order
+    """
+    check_kdf_params(i)
+    zout = secrets.token_bytes(16)
+    key = __derive_raw_key(pwd.encode(), zout, i)
+    return [__encrypt_token(message, key, zout, i, raw) for message in messages]
+
+
+def __encrypt_token(message: (str, bytes), key: bytes, zout: bytes, i: int, raw: bool) -> bytes:
+    """ private function that makes a token with an already derived key """
+    message = message.encode('utf-8') if isinstance(message, str) else message
+    if raw:
+        header = b'%b%b%b' % (RAW_VERSION, zout, i.to_bytes(4, 'big'))
+        nonce = secrets.token_bytes(12)
+        return b'%b%b%b' % (header, nonce, ChaCha20Poly1305(key).encrypt(nonce, message, header))
+    return b64e(b'%b%b%b' % (zout, i.to_bytes(4, 'big'), b64d(Fernet(b64e(key)).encrypt(bytes(message)))))
+
+
+def __split_token(token: bytes) -> (bytes, callable):
+    """ private function that returns the 20 byte KDF header of a token and a decrypt(key, dst=None) callable """
+    if token[:1] == RAW_VERSION:
+        if len(token) < RAW_HEADER_SIZE + 12 + 16:
+            raise InvalidTag("Token is too short")
+        token = memoryview(token)
+        header, nonce, encrypted = token[:RAW_HEADER_SIZE], token[RAW_HEADER_SIZE:RAW_HEADER_SIZE + 12], \
+            token[RAW_HEADER_SIZE + 12:]
+
+        def decrypt_raw(key: bytes, dst=None) -> (bytes, int):
+            if dst is None:
+                return ChaCha20Poly1305(key).decrypt(nonce, encrypted, header)
+            return decrypt_into(ChaCha20Poly1305(key), nonce, encrypted, header, dst)
+        return bytes(header[1:]), decrypt_raw
+
     decoded = b64d(token)
-    zout, _iter, token = decoded[:16], decoded[16:20], b64e(decoded[20:])
-    i = int.from_bytes(_iter, 'big')
-    key = __derive_key(pwd.encode(), zout, i)
-    return Fernet(key).decrypt(token)
+    if len(decoded) <= HEADER_SIZE:
+        raise InvalidToken
+
+    def decrypt_b64(key: bytes, dst=None) -> (bytes, int):
+        data = Fernet(b64e(key)).decrypt(b64e(decoded[HEADER_SIZE:]))
+        if dst is None:
+            return data
+        view = memoryview(dst).cast('B')
+        if len(view) < len(data):
+            raise ValueError("Buffer is too small, {0} bytes are needed".format(len(data)))
+        view[:len(data)] = data
+        return len(data)
+    return decoded[:HEADER_SIZE], decrypt_b64
+
+
+def pwd_decrypt(token: bytes, pwd: str) -> bytes:
+    """
+    Decrypt a token made by  pwd_encrypt, the format (base64 or raw) is detected
+    :param token: bytes  token
+    :param pwd: str  password
+    :raises InvalidToken: if the password is wrong or a base64 token is altered
+    :raises InvalidTag: if the password is wrong or a raw token is altered
+    :return: bytes  the decrypted message
+    """
+    header, decrypt = __split_token(token)
+    return decrypt(__derive_raw_key(pwd.encode(), header[:16], int.from_bytes(header[16:], 'big')))
+
+
+def pwd_encrypt_into(dst, message: bytes, pwd: str, i: int = 100_000) -> int:
+    """
+    Write a raw token (see  pwd_encrypt) into a caller-owned buffer instead of returning new bytes
+    :param dst: writable bytes-like object  at least len(message) + RAW_OVERHEAD bytes
+    :param message: bytes-like object  the message to encrypt
+    :param pwd: str  password
+    :param i: int  iterations or KDF parameters (scrypt_params, calibrate_kdf) of the key derivation
+    :raises ValueError: if dst is too small or i is out of range, see check_kdf_params
+    :return: int  amount of bytes written to the start of dst
+    """
+    view = memoryview(dst).cast('B')
+    if len(view) < len(message) + RAW_OVERHEAD:
+        raise ValueError("Buffer is too small, {0} bytes are needed".format(len(message) + RAW_OVERHEAD))
+    check_kdf_params(i)
+    zout = secrets.token_bytes(16)
+    key = __derive_raw_key(pwd.encode(), zout, i)
+    header = b'%b%b%b' % (RAW_VERSION, zout, i.to_bytes(4, 'big'))
+    nonce = secrets.token_bytes(12)
+    view[:RAW_HEADER_SIZE + 12] = header + nonce
+    return RAW_HEADER_SIZE + 12 + encrypt_into(
+        ChaCha20Poly1305(key), nonce, message, header, view[RAW_HEADER_SIZE + 12:])
+
+
+def pwd_decrypt_into(dst, token: bytes, pwd: str) -> int:
+    """
+    pwd_decrypt  that writes the message into a caller-owned buffer, raw tokens are decrypted in place
+    :param dst: writable bytes-like object  at least len(token) - RAW_OVERHEAD bytes for a raw token
+    :param token: bytes-like object  token
+    :param pwd: str  password
+    :raises ValueError: if dst is too small
+    :raises InvalidToken: if the password is wrong or a base64 token is altered
+    :raises InvalidTag: if the password is wrong or a raw token is altered
+    :return: int  amount of bytes written to the start of dst
+    """
+    header, decrypt = __split_token(token)
+    return decrypt(__derive_raw_key(pwd.encode(), header[:16], int.from_bytes(header[16:], 'big')), dst)
+
+
+def pwd_decrypt_many(tokens: Iterable[bytes], pwd: str, workers: int = None) -> list:
+    """
+    Decrypt many tokens, the key is derived once per distinct salt + iterations header
+    Tokens made in the same session (or with the key cache) share a header and pay a single derivation.
+    :param tokens: iterable of bytes  tokens made by  pwd_encrypt, both formats may be mixed
+    :param pwd: str  password
+    :param workers: int  handle the groups of tokens in a thread pool of this size, None or 1 to run inline
+    :return: list  in input order, the decrypted message or the exception raised for that token
+    """
+    results, groups = [], {}
+    for index, token in enumerate(tokens):
+        results.append(None)
+        try:
+            header, decrypt = __split_token(token)
+        except Exception as error:
+            results[index] = error
+            continue
+        groups.setdefault(header, []).append((index, decrypt))
+
+    def decrypt_group(group: tuple) -> None:
+        header, items = group
+        try:
+            key = __derive_raw_key(pwd.encode(), header[:16], int.from_bytes(header[16:], 'big'))
+        except Exception as error:
+            for index, _ in items:
+                results[index] = error
+            return
+        for index, decrypt in items:
+            try:
+                results[index] = decrypt(key)
+            except Exception as error:
+                results[index] = error
+
+    if workers and workers > 1 and len(groups) > 1:
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            list(executor.map(decrypt_group, groups.items()))
+    else:
+        for group in groups.items():
+            decrypt_group(group)
+    return results
+
+
+def pwd_encrypt_iter(chunks: Iterable[bytes], pwd: str, i: int = 100_000,
+                     chunk_size: int = CHUNK_SIZE) -> Iterator[bytes]:
+    """
+    Encrypt a stream of data with constant memory
+    The output starts with the salt and iterations like  pwd_encrypt  followed by the nonce prefix,
+    then every chunk is encrypted and authenticated on its own.
+    :param chunks: iterable of bytes  the data to encrypt, pieces larger than chunk_size are split
+    :param pwd: str  password
+    :param i: int  iterations or KDF parameters (scrypt_params, calibrate_kdf) of the key derivation
+    :param chunk_size: int  plaintext bytes per authenticated chunk
+    :raises ValueError: if chunk_size is larger than MAX_CHUNK_SIZE or i is out of range, see check_kdf_params
+    :return: iterator of bytes  the encrypted stream
+    """
+    check_chunk_size(chunk_size)
+    check_kdf_params(i)
+    zout = secrets.token_bytes(16)
+    key = __derive_raw_key(pwd.encode(), zout, i)
+    return __encrypt_with_key(chunks, key, zout, i, chunk_size)
+
+
+def __encrypt_with_key(chunks: Iterable[bytes], key: bytes, zout: bytes, i: int,
+                       chunk_size: int) -> Iterator[bytes]:
+    """ private generator that encrypts a stream with an already derived key """
+    prefix = secrets.token_bytes(NONCE_PREFIX_SIZE)
+    header = b'%b%b%b' % (zout, i.to_bytes(4, 'big'), prefix)
+    yield header
+    yield from encrypt_chunks(key, rechunk(chunks, chunk_size), header, prefix)
+
+
+def __decrypt_from(read, derive) -> Iterator[bytes]:
+    """ private generator that decrypts a stream from read(n), derive(zout, i) returns the key """
+    header = read_exact(read, HEADER_SIZE + NONCE_PREFIX_SIZE)
+    if len(header) != HEADER_SIZE + NONCE_PREFIX_SIZE:
+        raise InvalidTag("Stream is truncated")
+    zout, _iter, prefix = header[:16], header[16:HEADER_SIZE], header[HEADER_SIZE:]
+    key = derive(zout, int.from_bytes(_iter, 'big'))
+    yield from decrypt_chunks(key, read, header, prefix)
+
+
+def pwd_decrypt_iter(chunks: Iterable[bytes], pwd: str) -> Iterator[bytes]:
+    """
+    Decrypt a stream made by  pwd_encrypt_iter  or  pwd_encrypt_stream  with constant memory
+    Plaintext is only yielded after the chunk it belongs to is authenticated.
+    :param chunks: iterable of bytes  the encrypted stream, pieces may have any size
+    :param pwd: str  password
+    :raises InvalidTag: if the password is wrong or the stream is altered or truncated
+    :return: iterator of bytes  the decrypted data
+    """
+    return __decrypt_from(IterableReader(chunks).read, lambda zout, i: __derive_raw_key(pwd.encode(), zout, i))
+
+
+def pwd_encrypt_stream(src: BinaryIO, dst: BinaryIO, pwd: str, i: int = 100_000,
+                       chunk_size: int = CHUNK_SIZE) -> int:
+    """
+    Encrypt a file-like object into another file-like object with constant memory
+    :param src: file-like object opened in binary mode to read the data from
+    :param dst: file-like object opened in binary mode to write the encrypted stream to
+    :param pwd: str  password
+    :param i: int  iterations or KDF parameters (scrypt_params, calibrate_kdf) of the key derivation
+    :param chunk_size: int  plaintext bytes per authenticated chunk
+    :raises ValueError: if chunk_size is larger than MAX_CHUNK_SIZE or i is out of range, see check_kdf_params
+    :return: int  amount of bytes written
+    """
+    written = 0
+    for piece in pwd_encrypt_iter(read_chunks(src, chunk_size), pwd, i, chunk_size):
+        written += dst.write(piece)
+    return written
+
+
+def pwd_decrypt_stream(src: BinaryIO, dst: BinaryIO, pwd: str) -> int:
+    """
+    Decrypt a file-like object made by  pwd_encrypt_stream  into another file-like object
+    When the stream turns out to be altered, dst may already contain the authenticated chunks before it.
+    :param src: file-like object opened in binary mode to read the encrypted stream from
+    :param dst: file-like object opened in binary mode to write the data to
+    :param pwd: str  password
+    :raises InvalidTag: if the password is wrong or the stream is altered or truncated
+    :return: int  amount of bytes written
+    """
+    written = 0
+    for piece in __decrypt_from(src.read, lambda zout, i: __derive_raw_key(pwd.encode(), zout, i)):
+        written += dst.write(piece)
+    return written
+
+
+def key_encrypt_stream(src: BinaryIO, dst: BinaryIO, key: bytes, zout: bytes, i: int = 100_000,
+                       chunk_size: int = CHUNK_SIZE) -> int:
+    """
+    Like  pwd_encrypt_stream  with a key from  derive_key, to encrypt many streams with one derivation
+    The nonce prefix stays random per stream, so streams can share the salt and key.
+    :param src: file-like object opened in binary mode to read the data from
+    :param dst: file-like object opened in binary mode to write the encrypted stream to
+    :param key: bytes  derive_key(pwd, zout, i)
+    :param zout: bytes  the 16 byte salt the key was derived with
+    :param i: int  the iterations the key was derived with
+    :param chunk_size: int  plaintext bytes per authenticated chunk
+    :raises ValueError: if chunk_size is larger than MAX_CHUNK_SIZE or i is out of range, see check_kdf_params
+    :return: int  amount of bytes written
+    """
+    check_chunk_size(chunk_size)
+    check_kdf_params(i)
+    written = 0
+    for piece in __encrypt_with_key(read_chunks(src, chunk_size), key, zout, i, chunk_size):
+        written += dst.write(piece)
+    return written
+
+
+def key_decrypt_stream(src: BinaryIO, dst: BinaryIO, key: bytes) -> int:
+    """
+    Like  pwd_decrypt_stream  with a key from  derive_key  for the salt and iterations in the header
+    :param src: file-like object opened in binary mode to read the encrypted stream from
+    :param dst: file-like object opened in binary mode to write the data to
+    :param key: bytes  derive_key(pwd, zout, i)
+    :raises InvalidTag: if the key doesn't belong to the stream or the stream is altered or truncated
+    :return: int  amount of bytes written
+    """
+    written = 0
+    for piece in __decrypt_from(src.read, lambda zout, i: key):
+        written += dst.write(piece)
+    return written
 
 
 if __name__ == '__main__':
+    import sys
+    if len(sys.argv) > 1:  # encrypt-tree / decrypt-tree
+        from .bulk import main
+        sys.exit(main(sys.argv[1:]))
+
     import time
     pwd = str(time.time())
     message = "abcdefghij" * 100_000
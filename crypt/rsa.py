@@ -3,10 +3,33 @@
 # rsa.py
 
 import os
+import queue
+import secrets
+import threading
+import time
+from collections import namedtuple
+from concurrent.futures import Executor, ProcessPoolExecutor
+from typing import BinaryIO, Iterable
 from cryptography.hazmat.primitives.asymmetric import rsa, padding, utils
 from cryptography.hazmat.primitives import serialization, hashes
+from cryptography.hazmat.primitives.ciphers.aead import ChaCha20Poly1305
 from cryptography.hazmat.backends import default_backend
-from cryptography.exceptions import InvalidSignature, InvalidKey
+from cryptography.exceptions import InvalidSignature, InvalidKey, InvalidTag
+
+if __name__ == '__main__' and not __package__:  # python crypt/rsa.py, the imports below are package-relative
+    import sys
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    __package__ = 'crypt'
+
+from .batch import resolve_key, run_batch
+from .cache import load_key_file
+from .keyfile import LoadReport, file_name, load_key_files, load_private_bytes, load_public_bytes, \
+    private_bytes, public_bytes
+from .chunked import CHUNK_SIZE, NONCE_PREFIX_SIZE, check_chunk_size, decrypt_chunks, digest_chunks, \
+    digest_file, encrypt_chunks, read_chunks, read_exact
+
+SEALED_VERSION = b'\x01'  # rsa_seal: version | key length (2) | wrapped key | nonce (12) | ciphertext
+SEALED_STREAM_VERSION = b'\x02'  # rsa_seal_stream: version | key length (2) | wrapped key | nonce prefix | frames
 
 
 def __assure_private_key(private_key: rsa) -> None:
@@ -35,13 +58,124 @@ def __assure_public_key(public_key: rsa) -> None:
         raise InvalidKey("Given key is not a public key")
 
 
-def get_private_key(public_exponent: int = 65537, key_size: int = 4096) -> rsa:
+def _generate_private_der(public_exponent: int, key_size: int) -> bytes:
+    """ worker: generate a private key in another process, keys are passed back as DER """
+    private_key = rsa.generate_private_key(
+            public_exponent=public_exponent,
+            key_size=key_size,
+            backend=default_backend())
+    return private_key.private_bytes(
+        encoding=serialization.Encoding.DER,
+        format=serialization.PrivateFormat.PKCS8,
+        encryption_algorithm=serialization.NoEncryption())
+
+
+PoolStats = namedtuple('PoolStats', ['depth', 'pending', 'generated', 'taken', 'waits', 'wait_time'])
+
+
+class KeyPool:
+    """
+    Pre-generates private keys in background processes up to a watermark
+    Taking a key from a filled pool costs no key generation on the calling thread,
+    when the pool is empty the key is generated inline (the blocking fallback).
+    """
+
+    def __init__(self, size: int = 4, public_exponent: int = 65537, key_size: int = 4096, workers: int = None):
+        """
+        :param size: int  watermark, amount of keys kept ready
+        :param public_exponent: int
+        :param key_size: int
+        :param workers: int  amount of worker processes, None for the amount of cores
+        """
+        self.size = size
+        self.public_exponent = public_exponent
+        self.key_size = key_size
+        self._keys = queue.Queue()
+        self._lock = threading.Lock()
+        self._pending = 0
+        self.generated = 0
+        self.taken = 0
+        self.waits = 0
+        self.wait_time = 0.0
+        self._executor = ProcessPoolExecutor(max_workers=workers)
+        self._refill()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+    def _refill(self) -> None:
+        futures = []
+        with self._lock:
+            if self._executor is None:
+                return
+            while self._keys.qsize() + self._pending < self.size:
+                self._pending += 1
+                futures.append(self._executor.submit(_generate_private_der, self.public_exponent, self.key_size))
+        for future in futures:  # outside the lock, the callback of a finished future runs on this thread
+            future.add_done_callback(self._add_key)
+
+    def _add_key(self, future) -> None:
+        with self._lock:
+            self._pending -= 1
+        if future.cancelled() or future.exception() is not None:
+            return
+        private_key = serialization.load_der_private_key(future.result(), None, default_backend())
+        with self._lock:
+            self.generated += 1
+        self._keys.put(private_key)
+
+    def matches(self, public_exponent: int, key_size: int) -> bool:
+        """ True if the pool makes keys with these parameters """
+        return self.public_exponent == public_exponent and self.key_size == key_size
+
+    def get(self) -> rsa.RSAPrivateKey:
+        """
+        Take a private key from the pool, generate it inline if the pool is empty
+        :return: rsa  private key
+        """
+        try:
+            private_key = self._keys.get_nowait()
+        except queue.Empty:
+            start = time.perf_counter()
+            private_key = rsa.generate_private_key(
+                public_exponent=self.public_exponent,
+                key_size=self.key_size,
+                backend=default_backend())
+            with self._lock:
+                self.waits += 1
+                self.wait_time += time.perf_counter() - start
+        with self._lock:
+            self.taken += 1
+        self._refill()
+        return private_key
+
+    def stats(self) -> PoolStats:
+        """ Return the depth of the pool and how often and how long callers waited for a key """
+        with self._lock:
+            return PoolStats(self._keys.qsize(), self._pending, self.generated,
+                             self.taken, self.waits, self.wait_time)
+
+    def close(self) -> None:
+        """ Stop the worker processes, keys that are ready can still be taken """
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+
+def get_private_key(public_exponent: int = 65537, key_size: int = 4096, pool: KeyPool = None) -> rsa:
     """
     Private helper function to generate a private key
     :param public_exponent:  int
     :param key_size:  int
+    :param pool:  KeyPool  take the key from this pool if it makes keys with these parameters
     :return:  rsa  private key
     """
+    if pool is not None and pool.matches(public_exponent, key_size):
+        return pool.get()
     private_key = rsa.generate_private_key(
             public_exponent=public_exponent,
             key_size=key_size,
@@ -82,7 +216,31 @@ def get_private_pem(private_key: rsa, pwd: bytes = None) -> bytes:
     return pem
 
 
-def generate_keys(directory: str, pwd: bytes = None) -> (rsa.RSAPrivateKey, rsa.RSAPublicKey):
+def get_public_bytes(public_key: rsa, encoding: str = 'der') -> bytes:
+    """
+    Serialize the public key, DER is smaller and faster to load than PEM
+    :param public_key:  the public key made from a private key
+    :param encoding:  str  'pem' or 'der'
+    :return:  bytes
+    """
+    __assure_public_key(public_key)
+    return public_bytes(public_key, encoding)
+
+
+def get_private_bytes(private_key: rsa, pwd: bytes = None, encoding: str = 'der') -> bytes:
+    """
+    Serialize the private key as PKCS8, DER is smaller and faster to load than PEM
+    :param private_key:  the private_key
+    :param pwd: password: if not None, Best available encryption is chosen
+    :param encoding:  str  'pem' or 'der'
+    :return:  bytes
+    """
+    __assure_private_key(private_key)
+    return private_bytes(private_key, pwd, encoding)
+
+
+def generate_keys(directory: str, pwd: bytes = None, pool: KeyPool = None,
+                  name: str = None, encoding: str = 'pem') -> (rsa.RSAPrivateKey, rsa.RSAPublicKey):
     """
     Generate the public and private keys
     Generated keys have a default name, you should rename them
@@ -91,14 +249,18 @@ def generate_keys(directory: str, pwd: bytes = None) -> (rsa.RSAPrivateKey, rsa.
                       overwrite the existing keys
     :param pwd: password: if not None, Best available encryption is chosen
                 and the private key is encrypted with a the password
+    :param pool: KeyPool  take the private key from this pool
+    :param name: str  the files are named <name>_private_key.<encoding>, None for private_key.<encoding>
+    :param encoding: str  'pem' or 'der'
     :return: private, public keys
     """
-    private_key = generate_private_key(directory, pwd)
-    public_key = generate_public_key(directory, private_key)
+    private_key = generate_private_key(directory, pwd, pool, name, encoding)
+    public_key = generate_public_key(directory, private_key, name, encoding)
     return private_key, public_key
 
 
-def generate_private_key(directory: str, pwd: bytes = None) -> rsa.RSAPrivateKey:
+def generate_private_key(directory: str, pwd: bytes = None, pool: KeyPool = None,
+                         name: str = None, encoding: str = 'pem') -> rsa.RSAPrivateKey:
     """
     Generate the private key, this key should not be shared with anyone!
     Generated keys have a default name, you should rename them
@@ -106,76 +268,113 @@ def generate_private_key(directory: str, pwd: bytes = None) -> rsa.RSAPrivateKey
     :param directory: folder where the keys are made
                       overwrite the existing keys
     :param pwd: password: if not None, Best available encryption is chosen
+    :param pool: KeyPool  take the private key from this pool
+    :param name: str  the file is named <name>_private_key.<encoding>, None for private_key.<encoding>
+    :param encoding: str  'pem' or 'der'
     :return: rsa  private key object
     """
     directory = os.path.realpath(directory)
     if not os.path.isdir(directory):
         directory = os.path.dirname(directory)
 
-    # generate private key
-    private_key = get_private_key()
+    # generate private key, or take it from the pool
+    private_key = get_private_key() if pool is None else pool.get()
 
-    private_path = os.path.join(directory, './private_key.pem')
+    private_path = os.path.join(directory, file_name('private', name, encoding))
     with open(private_path, 'wb') as open_file:
-        private_pem = get_private_pem(private_key, pwd)
-        open_file.write(private_pem)
+        open_file.write(get_private_bytes(private_key, pwd, encoding))
     return private_key
 
 
-def generate_public_key(directory: str, private_key: rsa) -> rsa.RSAPublicKey:
+def generate_public_key(directory: str, private_key: rsa,
+                        name: str = None, encoding: str = 'pem') -> rsa.RSAPublicKey:
     """
     Generate the public key, share this key with anyone
     Generated keys have a default name, you should rename them
     This can be done with os.rename()
     :param directory: folder where the keys are made
                       overwrite the existing keys
+    :param name: str  the file is named <name>_public_key.<encoding>, None for public_key.<encoding>
+    :param encoding: str  'pem' or 'der'
     :raises InvalidKey: if given key is invalid
     :return: rsa  private key object
     """
     __assure_private_key(private_key)
     public_key = private_key.public_key()
-    public_path = os.path.join(directory, './public_key.pem')
+    public_path = os.path.join(directory, file_name('public', name, encoding))
     with open(public_path, 'wb') as open_file:
-        public_pem = get_public_pem(public_key)
-        open_file.write(public_pem)
+        open_file.write(get_public_bytes(public_key, encoding))
     return public_key
 
 
-def read_private_key(key_file: str, pwd: bytes = None) -> rsa.RSAPrivateKey:
+def read_private_key(key_file: str, pwd: bytes = None, cached: bool = False) -> rsa.RSAPrivateKey:
     """
     Read and return a private key
     To use with an incoming encrypted message
     :param key_file: str  path to the keyfile
     :param pwd: bytes  if the private key is locked with an password
+    :param cached: bool  reuse the key object while the file is unchanged, see cache.key_file_cache
     :raises FileNotFoundError:  if key_file doesnt exist
     :return: serialization object
     """
+    if cached:
+        return load_key_file(key_file, __load_private_pem, pwd, 'rsa private')
     key_file = os.path.realpath(key_file)
     if not os.path.exists(key_file):
         raise FileNotFoundError("given file doesnt exist: {0}".format(key_file))
     with open(key_file, "rb") as key_file:
-        private_key = serialization.load_pem_private_key(
-            key_file.read(), password=pwd, backend=default_backend())
+        private_key = __load_private_pem(key_file.read(), pwd)
     return private_key
 
 
-def read_public_key(key_file: str) -> rsa.RSAPublicKey:
+def read_public_key(key_file: str, cached: bool = False) -> rsa.RSAPublicKey:
     """
     Read and return a public key
     To use with encrypting an outgoing message
     :param key_file: str
+    :param cached: bool  reuse the key object while the file is unchanged, see cache.key_file_cache
     :raises FileNotFoundError:  if key_file doesnt exist
     :return: serialization object
     """
+    if cached:
+        return load_key_file(key_file, __load_public_pem, None, 'rsa public')
     key_file = os.path.realpath(key_file)
     if not os.path.exists(key_file):
         raise FileNotFoundError("given file doesnt exist: {0}".format(key_file))
     with open(key_file, "rb") as key_file:
-        public_key = serialization.load_pem_public_key(
-            key_file.read(), backend=default_backend())
+        public_key = __load_public_pem(key_file.read())
     return public_key
 
 
+def __load_private_pem(data: bytes, pwd: bytes = None) -> rsa.RSAPrivateKey:
+    """ private function that parses a private key, PEM or DER """
+    return load_private_bytes(data, pwd)
+
+
+def __load_public_pem(data: bytes, pwd: bytes = None) -> rsa.RSAPublicKey:
+    """ private function that parses a public key, PEM or DER, pwd is ignored """
+    return load_public_bytes(data)
+
+
+def load_keys(key_files: Iterable[str], pwd: bytes = None, private: bool = True, validate: bool = True,
+              executor: Executor = None, workers: int = None) -> LoadReport:
+    """
+    Load many key files (PEM or DER) concurrently, e.g. to warm a service within its startup budget
+
+    :param key_files: paths to the key files
+    :param pwd: password of the private keys
+    :param private: True to load private keys, False for public keys
+    :param validate: False skips the consistency check of private keys, much faster, only for trusted files
+    :param executor: thread pool to use, it is not shut down
+    :param workers: size of the thread pool made when no executor is given, 1 to load inline
+    :return: LoadReport  keys and errors per path, seconds and keys_per_second of the load
+    """
+    if private:
+        return load_key_files(key_files, lambda data: load_private_bytes(data, pwd, validate=validate),
+                              executor, workers)
+    return load_key_files(key_files, load_public_bytes, executor, workers)
+
+
 def sign_message(message: bytes, private_key: rsa) -> bytes:
     """
     Sign a message with a private key
@@ -217,17 +416,102 @@ def verify_signed_message(signature: bytes, message: bytes, public_key: rsa) ->
         return True
 
 
+def sign_digest(digest: bytes, private_key: rsa) -> bytes:
+    """
+    Sign a SHA256 digest with a private key, the signature verifies with  verify_signed_message  over the hashed data
+    :param digest: bytes  SHA256 digest of the message
+    :param private_key: rsa
+    :raises InvalidKey: if given key is invalid
+    :return: bytes
+    """
+    __assure_private_key(private_key)
+    signature = private_key.sign(
+        digest, padding.PSS(
+            mgf=padding.MGF1(hashes.SHA256()),
+            salt_length=padding.PSS.MAX_LENGTH),
+        utils.Prehashed(hashes.SHA256()))
+    return signature
+
+
+def verify_signed_digest(signature: bytes, digest: bytes, public_key: rsa) -> bool:
+    """
+    Verify a signature against a SHA256 digest, accepts signatures made by  sign_message  too
+    :param signature: received signature
+    :param digest: SHA256 digest of the incoming message
+    :param public_key: a public key from the source of the message
+    :raises InvalidKey: if given key is invalid
+    :return: bool
+    """
+    __assure_public_key(public_key)
+    try:
+        public_key.verify(signature, digest,
+            padding.PSS(
+                mgf=padding.MGF1(hashes.SHA256()),
+                salt_length=padding.PSS.MAX_LENGTH),
+            utils.Prehashed(hashes.SHA256()))
+    except InvalidSignature:
+        return False
+    else:
+        return True
+
+
+def sign_file(file: (str, BinaryIO), private_key: rsa) -> bytes:
+    """
+    Sign a file of any size with flat memory, the file is hashed incrementally (memory-mapped if possible)
+    :param file: str or file-like object  path or file opened in binary mode
+    :param private_key: rsa
+    :raises InvalidKey: if given key is invalid
+    :return: bytes  signature, verifies with  verify_signed_message  over the same content
+    """
+    return sign_digest(digest_file(file), private_key)
+
+
+def verify_file(signature: bytes, file: (str, BinaryIO), public_key: rsa) -> bool:
+    """
+    Verify a file of any size with flat memory
+    :param signature: received signature
+    :param file: str or file-like object  path or file opened in binary mode
+    :param public_key: a public key from the source of the file
+    :raises InvalidKey: if given key is invalid
+    :return: bool
+    """
+    return verify_signed_digest(signature, digest_file(file), public_key)
+
+
+def sign_chunks(chunks: Iterable[bytes], private_key: rsa) -> bytes:
+    """
+    Sign data that arrives in pieces, the signature verifies with  verify_signed_message  over the joined pieces
+    :param chunks: iterable of bytes
+    :param private_key: rsa
+    :raises InvalidKey: if given key is invalid
+    :return: bytes
+    """
+    return sign_digest(digest_chunks(chunks), private_key)
+
+
+def verify_chunks(signature: bytes, chunks: Iterable[bytes], public_key: rsa) -> bool:
+    """
+    Verify data that arrives in pieces
+    :param signature: received signature
+    :param chunks: iterable of bytes
+    :param public_key: a public key from the source of the data
+    :raises InvalidKey: if given key is invalid
+    :return: bool
+    """
+    return verify_signed_digest(signature, digest_chunks(chunks), public_key)
+
+
 def rsa_encrypt(message: bytes, public_key: rsa) -> bytes:
     """
     Encrypt a message with a public key
-    :param message:  byte string to encrypt
+    :param message:  byte string to encrypt, any bytes-like object
     :param public_key:  key to encrypt the message with
     :raises InvalidKey: if given key is invalid
     :return: bytes  as the encrypted message
     """
     __assure_public_key(public_key)
     encrypted_message = public_key.encrypt(
-        message, padding.OAEP(
+        bytes(message), padding.OAEP(
             mgf=padding.MGF1(algorithm=hashes.SHA256()),
             algorithm=hashes.SHA256(),
             label=None))
@@ -237,20 +521,259 @@ def rsa_encrypt(message: bytes, public_key: rsa) -> bytes:
 def rsa_decrypt(encrypted: bytes, private_key: rsa) -> bytes:
     """
     Decrypt an encrypted message with a private key
-    :param encrypted:  byte string encrypted message
+    :param encrypted:  byte string encrypted message, any bytes-like object
     :param private_key:  key to decrypt the message with
     :raises InvalidKey: if given key is invalid
     :return: bytes  as the decrypted message
     """
     __assure_private_key(private_key)
     decrypted_message = private_key.decrypt(
-        encrypted, padding.OAEP(
+        bytes(encrypted), padding.OAEP(
             mgf=padding.MGF1(algorithm=hashes.SHA256()),
             algorithm=hashes.SHA256(),
             label=None))
     return decrypted_message
 
 
+def __write_into(dst, data: bytes) -> int:
+    """ private function that copies data to the start of a caller-owned buffer """
+    view = memoryview(dst).cast('B')
+    if len(view) < len(data):
+        raise ValueError("Buffer is too small, {0} bytes are needed".format(len(data)))
+    view[:len(data)] = data
+    return len(data)
+
+
+def rsa_encrypt_into(dst, message: bytes, public_key: rsa) -> int:
+    """
+    rsa_encrypt  that writes into a caller-owned buffer
+    OpenSSL has no RSA call that writes into a buffer, the ciphertext (one key size) is copied into dst.
+    :param dst:  writable bytes-like object of at least the key size in bytes
+    :param message:  byte string to encrypt, any bytes-like object
+    :param public_key:  key to encrypt the message with
+    :raises InvalidKey: if given key is invalid
+    :raises ValueError: if dst is too small
+    :return: int  amount of bytes written to the start of dst
+    """
+    return __write_into(dst, rsa_encrypt(message, public_key))
+
+
+def rsa_decrypt_into(dst, encrypted: bytes, private_key: rsa) -> int:
+    """
+    rsa_decrypt  that writes into a caller-owned buffer
+    :param dst:  writable bytes-like object, large enough for the message
+    :param encrypted:  byte string encrypted message, any bytes-like object
+    :param private_key:  key to decrypt the message with
+    :raises InvalidKey: if given key is invalid
+    :raises ValueError: if dst is too small
+    :return: int  amount of bytes written to the start of dst
+    """
+    return __write_into(dst, rsa_decrypt(encrypted, private_key))
+
+
+def __wrap_key(public_key: rsa, version: bytes) -> (bytes, bytes):
+    """ private function that makes a random content key and the header with the key wrapped by OAEP """
+    key = ChaCha20Poly1305.generate_key()
+    wrapped = rsa_encrypt(key, public_key)
+    return key, b'%b%b%b' % (version, len(wrapped).to_bytes(2, 'big'), wrapped)
+
+
+def __unwrap_key(read, private_key: rsa, version: bytes) -> (bytes, bytes):
+    """ private function that reads the header from read(n) and returns the content key and the header """
+    head = read_exact(read, 3)
+    if len(head) != 3 or head[:1] != version:
+        raise ValueError("Given data is not sealed by this function")
+    wrapped = read_exact(read, int.from_bytes(head[1:], 'big'))
+    return rsa_decrypt(wrapped, private_key), head + wrapped
+
+
+def rsa_seal(message: bytes, public_key: rsa) -> bytes:
+    """
+    Encrypt a message of any size with a public key (envelope encryption)
+    A random ChaCha20Poly1305 key encrypts the message, only that key is encrypted with RSA-OAEP.
+    :param message:  byte string to encrypt
+    :param public_key:  key to encrypt the message with
+    :raises InvalidKey: if given key is invalid
+    :return: bytes  as the sealed message
+    """
+    key, header = __wrap_key(public_key, SEALED_VERSION)
+    nonce = secrets.token_bytes(12)
+    return b'%b%b%b' % (header, nonce, ChaCha20Poly1305(key).encrypt(nonce, message, header))
+
+
+def rsa_open(sealed: bytes, private_key: rsa) -> bytes:
+    """
+    Decrypt a message made by  rsa_seal  with a private key
+    :param sealed:  byte string sealed message
+    :param private_key:  key to decrypt the message with
+    :raises InvalidKey: if given key is invalid
+    :raises ValueError: if the key doesn't belong to the message or the data is not sealed
+    :raises InvalidTag: if the message is altered
+    :return: bytes  as the decrypted message
+    """
+    sealed = memoryview(sealed)
+    position = 0
+
+    def read(size: int) -> bytes:
+        nonlocal position
+        data = sealed[position:position + size]
+        position += len(data)
+        return bytes(data)
+
+    key, header = __unwrap_key(read, private_key, SEALED_VERSION)
+    nonce = read(12)
+    return ChaCha20Poly1305(key).decrypt(nonce, sealed[position:], header)
+
+
+def rsa_seal_stream(src: BinaryIO, dst: BinaryIO, public_key: rsa, chunk_size: int = CHUNK_SIZE) -> int:
+    """
+    Encrypt a file-like object of any size with a public key and constant memory
+    One RSA operation per stream, the data is encrypted in authenticated chunks.
+    :param src: file-like object opened in binary mode to read the data from
+    :param dst: file-like object opened in binary mode to write the sealed stream to
+    :param public_key:  key to encrypt the stream with
+    :param chunk_size: int  plaintext bytes per authenticated chunk
+    :raises InvalidKey: if given key is invalid
+    :raises ValueError: if chunk_size is larger than MAX_CHUNK_SIZE
+    :return: int  amount of bytes written
+    """
+    check_chunk_size(chunk_size)
+    key, header = __wrap_key(public_key, SEALED_STREAM_VERSION)
+    header += secrets.token_bytes(NONCE_PREFIX_SIZE)
+    written = dst.write(header)
+    for frame in encrypt_chunks(key, read_chunks(src, chunk_size), header, header[-NONCE_PREFIX_SIZE:]):
+        written += dst.write(frame)
+    return written
+
+
+def rsa_open_stream(src: BinaryIO, dst: BinaryIO, private_key: rsa) -> int:
+    """
+    Decrypt a file-like object made by  rsa_seal_stream  with a private key
+    When the stream turns out to be altered, dst may already contain the authenticated chunks before it.
+    :param src: file-like object opened in binary mode to read the sealed stream from
+    :param dst: file-like object opened in binary mode to write the data to
+    :param private_key:  key to decrypt the stream with
+    :raises InvalidKey: if given key is invalid
+    :raises ValueError: if the key doesn't belong to the stream or the data is not sealed
+    :raises InvalidTag: if the stream is altered or truncated
+    :return: int  amount of bytes written
+    """
+    key, header = __unwrap_key(src.read, private_key, SEALED_STREAM_VERSION)
+    prefix = read_exact(src.read, NONCE_PREFIX_SIZE)
+    if len(prefix) != NONCE_PREFIX_SIZE:
+        raise InvalidTag("Stream is truncated")
+    written = 0
+    for chunk in decrypt_chunks(key, src.read, header + prefix, prefix):
+        written += dst.write(chunk)
+    return written
+
+
+# padding and algorithm objects are immutable, the batch functions share them instead of building them per item
+__PSS = padding.PSS(mgf=padding.MGF1(hashes.SHA256()), salt_length=padding.PSS.MAX_LENGTH)
+__OAEP = padding.OAEP(mgf=padding.MGF1(algorithm=hashes.SHA256()), algorithm=hashes.SHA256(), label=None)
+__SHA256 = hashes.SHA256()
+
+
+def _sign_item(item: tuple) -> bytes:
+    """ worker: (message, private_key) -> signature """
+    message, private_key = item
+    return resolve_key(private_key).sign(message, __PSS, __SHA256)
+
+
+def _verify_item(item: tuple) -> bool:
+    """ worker: (signature, message, public_key) -> bool """
+    signature, message, public_key = item
+    try:
+        resolve_key(public_key).verify(signature, message, __PSS, __SHA256)
+    except InvalidSignature:
+        return False
+    return True
+
+
+def _encrypt_item(item: tuple) -> bytes:
+    """ worker: (message, public_key) -> encrypted message """
+    message, public_key = item
+    return resolve_key(public_key).encrypt(message, __OAEP)
+
+
+def _decrypt_item(item: tuple) -> bytes:
+    """ worker: (encrypted, private_key) -> decrypted message """
+    encrypted, private_key = item
+    return resolve_key(private_key).decrypt(encrypted, __OAEP)
+
+
+def __assure_keys(items: list, position: int, assure) -> list:
+    """ private function that checks every distinct key of a batch once """
+    items = list(items)
+    for key in {id(item[position]): item[position] for item in items}.values():
+        assure(key)
+    return items
+
+
+def sign_many(items: Iterable[tuple], executor: Executor = None, workers: int = None,
+              return_exceptions: bool = False) -> list:
+    """
+    Sign many messages, spread over a thread pool or the given (process) pool
+    :param items: iterable of (message, private_key)
+    :param executor: Executor  thread or process pool to use, keys go to processes as DER once per key
+    :param workers: int  size of the thread pool made when no executor is given, 1 to run inline
+    :param return_exceptions: bool  return the exception of a failed item as its result instead of raising it
+    :raises InvalidKey: if a given key is invalid
+    :raises Exception: the first exception of an item in input order, unless return_exceptions
+    :return: list  signatures in input order, Union[bytes, Exception] with return_exceptions
+    """
+    items = __assure_keys(items, 1, __assure_private_key)
+    return run_batch(_sign_item, items, (1,), executor, workers, return_exceptions)
+
+
+def verify_many(items: Iterable[tuple], executor: Executor = None, workers: int = None,
+                return_exceptions: bool = False) -> list:
+    """
+    Verify many signed messages, spread over a thread pool or the given (process) pool
+    :param items: iterable of (signature, message, public_key)
+    :param executor: Executor  thread or process pool to use, keys go to processes as DER once per key
+    :param workers: int  size of the thread pool made when no executor is given, 1 to run inline
+    :param return_exceptions: bool  return the exception of a failed item as its result instead of raising it
+    :raises InvalidKey: if a given key is invalid
+    :raises Exception: the first exception of an item in input order, unless return_exceptions
+    :return: list  of bool in input order, Union[bool, Exception] with return_exceptions
+    """
+    items = __assure_keys(items, 2, __assure_public_key)
+    return run_batch(_verify_item, items, (2,), executor, workers, return_exceptions)
+
+
+def encrypt_many(items: Iterable[tuple], executor: Executor = None, workers: int = None,
+                 return_exceptions: bool = False) -> list:
+    """
+    Encrypt many messages with RSA-OAEP, spread over a thread pool or the given (process) pool
+    :param items: iterable of (message, public_key)
+    :param executor: Executor  thread or process pool to use, keys go to processes as DER once per key
+    :param workers: int  size of the thread pool made when no executor is given, 1 to run inline
+    :param return_exceptions: bool  return the exception of a failed item as its result instead of raising it
+    :raises InvalidKey: if a given key is invalid
+    :raises Exception: the first exception of an item in input order, unless return_exceptions
+    :return: list  encrypted messages in input order, Union[bytes, Exception] with return_exceptions
+    """
+    items = __assure_keys(items, 1, __assure_public_key)
+    return run_batch(_encrypt_item, items, (1,), executor, workers, return_exceptions)
+
+
+def decrypt_many(items: Iterable[tuple], executor: Executor = None, workers: int = None,
+                 return_exceptions: bool = False) -> list:
+    """
+    Decrypt many RSA-OAEP messages, spread over a thread pool or the given (process) pool
+    :param items: iterable of (encrypted, private_key)
+    :param executor: Executor  thread or process pool to use, keys go to processes as DER once per key
+    :param workers: int  size of the thread pool made when no executor is given, 1 to run inline
+    :param return_exceptions: bool  return the exception of a failed item as its result instead of raising it
+    :raises InvalidKey: if a given key is invalid
+    :raises Exception: the first exception of an item in input order, unless return_exceptions
+    :return: list  decrypted messages in input order, Union[bytes, Exception] with return_exceptions
+    """
+    items = __assure_keys(items, 1, __assure_private_key)
+    return run_batch(_decrypt_item, items, (1,), executor, workers, return_exceptions)
+
+
 if __name__ == '__main__':
     from time import time
     from tempfile import TemporaryDirectory